@@ -1,21 +1,25 @@
 #!/usr/bin/python3
 # coding: utf-8
 
+import os
 import random
 
 import strawb
 from strawb.tools import ShareJobThreads
 
 
-def main(n_files=3):
+def main(n_files=3, process_n=None):
     """ Search for files defined by the pattern and select n_files from those files.
-    It pars each file to the function `parse_one_file` paralysed with ShareJobThreads.
+    It pars each file to the function `parse_one_file` paralysed with ShareJobThreads in processes, i.e. one file
+    per CPU. Each file is exported chunk by chunk, that the memory doesn't grow with the file size.
     PARAMETER
     ---------
     pattern: str, optional
         The search pattern for glob, like in bash
     n_files: None, or int.
         The number of files which are processed. None, means all files found.
+    process_n: None, or int.
+        The number of parallel processes. None, means the number of CPUs.
     """
     # in case execute db.load_onc_db_entirely() to load the entire db
     db = strawb.SyncDBHandler(file_name='Default')  # loads the db
@@ -39,15 +43,18 @@ def main(n_files=3):
         file_list_select = random.sample(file_list, n_files)
         print(f'Out of {len(file_list)} files select {n_files} randomly')
 
-    sjt = ShareJobThreads(unit='files')
+    sjt = ShareJobThreads(thread_n=process_n or os.cpu_count(), unit='files', backend='process')
     sjt.do(parse_one_file, file_list_select)
+    for i, err in sjt.errors.items():
+        print(f'{file_list_select[i]} failed with {err!r}')
 
 
 def parse_one_file(full_path):
     # initialise the FileHandler and Images
     camera = strawb.sensors.Camera(full_path)
 
-    return camera.images.image2png(exclude_invalid=False)
+    # one process per file, the threads overlap reading, demosaicing and encoding the images of the file
+    return camera.images.image2png(exclude_invalid=False, chunk_size=8, thread_n=2)
 
 
 # execute only if run as a script
@@ -0,0 +1,60 @@
+#!/usr/bin/python3
+# coding: utf-8
+
+"""
+WHAT THIS SCRIPT DOES
+---------------------
+1. It measures the time to import modules of the strawb package. Each import runs in a fresh python process, as
+   python caches imported modules.
+2. It lists the heavy third party packages (cv2, onc, scipy, ...) which are imported with each module.
+   >>> python3 benchmark_import_time.py -m strawb strawb.sensors.camera -n 5
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+# third party packages which shouldn't be imported by `import strawb`
+heavy_packages = ['cv2', 'onc', 'shapely', 'healpy', 'scipy', 'matplotlib', 'tqdm', 'pandas']
+
+
+def parser_args():
+    parser = argparse.ArgumentParser(description='Measure the import time of strawb modules.')
+    parser.add_argument('-m', '--modules', type=str, default=['strawb'], nargs='+',
+                        help="The modules to import, e.g. strawb strawb.sensors.camera (default: %(default)s)")
+    parser.add_argument('-n', '--repeat', type=int, default=5,
+                        help="Number of imports per module, each in a fresh process. (default: %(default)s)")
+
+    return parser.parse_args()
+
+
+def import_time(module):
+    """Import the module in a fresh python process and returns the import time in seconds and the list of heavy
+    packages which got imported."""
+    code = ("import sys, time\n"
+            "t_0 = time.perf_counter()\n"
+            f"import {module}\n"
+            "t_1 = time.perf_counter()\n"
+            f"print(t_1 - t_0, *[i for i in {heavy_packages} if i in sys.modules])\n")
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.split()
+    return float(out[0]), out[1:]
+
+
+def main(modules=None, repeat=5):
+    if modules is None:
+        modules = ['strawb']
+
+    for module_i in modules:
+        times, packages = [], []
+        for i in range(repeat):
+            time_i, packages = import_time(module_i)
+            times.append(time_i)
+
+        print(f'{module_i:30s}: median {statistics.median(times) * 1e3:8.1f} ms, '
+              f'min {min(times) * 1e3:8.1f} ms; heavy packages: {", ".join(packages) or "-"}')
+
+
+# execute only if run as a script
+if __name__ == "__main__":
+    args = parser_args()
+    main(modules=args.modules, repeat=args.repeat)
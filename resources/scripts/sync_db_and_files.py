@@ -44,12 +44,18 @@ def parser_args():
     parser.add_argument('-m', '--max', type=int, default=.75e9,
                         help="Defines the minimum file size in Byte which should be synced, e.g.  1e6 [~1MB] "
                              "(default: %(default)s)")
+    parser.add_argument('-p', '--priority', type=str, default=None, nargs='+', metavar='DATAPRODUCTCODE',
+                        help="Defines the dataProductCodes which are downloaded first, in the given order, e.g. "
+                             "PMTSD LIDARSD. Within, the newest and smallest files come first.")
+    parser.add_argument('-b', '--bandwidth', type=float, default=None,
+                        help="Defines the maximum download bandwidth in Byte/s, e.g. 50e6 [~50MB/s] "
+                             "(default: %(default)s, no limit)")
 
     return parser.parse_args()
 
 
 def main(download=False, dev_codes=None, date_from=None, date_to=None,
-         extensions=None, min_file_size=0, max_file_size=.75e9, force=False):
+         extensions=None, min_file_size=0, max_file_size=.75e9, force=False, priority=None, max_bandwidth=None):
     """
     This function downloads all files from the ONC server for the all dev_codes defined in `strawb.dev_codes_deployed`
     It will download it with the following structure:
@@ -62,6 +68,9 @@ def main(download=False, dev_codes=None, date_from=None, date_to=None,
           <strawb.Config.raw_data_dir>/<dev_codes[1]>
           ...
 
+    The files are downloaded by `priority`, a list of dataProductCodes, and small files are downloaded in parallel to
+    large ones, see `strawb.onc_downloader.DownloadScheduler`.
+
     In addition, it saves/updateds the metadata to the local database (DB) with the data from the ONC server for all
     files under: `strawb.Config.pandas_file_sync_db`
     This file DB be imported again with:
@@ -85,7 +94,9 @@ def main(download=False, dev_codes=None, date_from=None, date_to=None,
                            add_dataframe=True,
                            save_db=True,
                            download=download,
-                           extensions=extensions)
+                           download_kwargs=dict(product_priority=priority, max_bandwidth=max_bandwidth),
+                           extensions=extensions,
+                           reconcile=force)  # force: list all files from ONC, not only the delta
 
 
 # execute only if run as a script
@@ -99,5 +110,7 @@ if __name__ == "__main__":
          extensions=args.extensions,
          min_file_size=int(args.min), max_file_size=int(args.max),
          force=args.force,
+         priority=args.priority,
+         max_bandwidth=args.bandwidth,
          )
     print(f'Sync ended: {datetime.datetime.utcnow().isoformat()}')
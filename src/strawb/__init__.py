@@ -1,21 +1,70 @@
 # Author: Kilian Holzapfel <kilian.holzapfel@tum.de>
+import importlib
+
 import h5py
 
 from .config_parser import Config
-from .sync_db_handler import SyncDBHandler, ONCDeviceDB, BaseDBHandler, ImageClusterDB
-from .onc_downloader import ONCDownloader
-from .sensors import *
 from .tools import AsDatetimeWrapper, hdf5_getunsorted
-from .multi_processing import MProcessIterator
-
-from .base_file_handler import BaseFileHandler
-
-from .virtual_hdf5 import VirtualHDF5, DatasetsInGroupSameSize
 
 # add '.asdatetime' to h5py packet
 h5py.Dataset.asdatetime = AsDatetimeWrapper.asdatetime
 h5py.Dataset.getunsorted = hdf5_getunsorted
 
+# Attributes which are loaded lazily on first access, i.e. `strawb.SyncDBHandler` imports the submodule
+# `strawb.sync_db_handler` (and with it the ONC client) only when it's used. {attribute: submodule}
+_lazy_attributes_ = {
+    'SyncDBHandler': '.sync_db_handler',
+    'ONCDeviceDB': '.sync_db_handler',
+    'BaseDBHandler': '.sync_db_handler',
+    'ImageClusterDB': '.sync_db_handler',
+    'ONCDownloader': '.onc_downloader',
+    'Camera': '.sensors',
+    'Module': '.sensors',
+    'Lidar': '.sensors',
+    'PMTSpec': '.sensors',
+    'MiniSpectrometer': '.sensors',
+    'ADCP': '.sensors',
+    'MuonTracker': '.sensors',
+    # sensor submodules, i.e. `strawb.camera` is `strawb.sensors.camera`
+    'camera': '.sensors',
+    'module': '.sensors',
+    'lidar': '.sensors',
+    'pmtspec': '.sensors',
+    'minispec': '.sensors',
+    'adcp': '.sensors',
+    'muontracker': '.sensors',
+    'MProcessIterator': '.multi_processing',
+    'BaseFileHandler': '.base_file_handler',
+    'VirtualHDF5': '.virtual_hdf5',
+    'DatasetsInGroupSameSize': '.virtual_hdf5',
+}
+
+# Submodules which are loaded lazily on first access, i.e. `strawb.sensors.camera` works without an explicit import
+_lazy_submodules_ = ['base_file_handler', 'base_processed_data_store', 'calibration', 'config_parser',
+                     'multi_processing', 'onc_downloader', 'peak_finder', 'sensors', 'sync_db_handler', 'tools',
+                     'trb_tools', 'virtual_hdf5']
+
+__all__ = ['Config', 'AsDatetimeWrapper', 'hdf5_getunsorted', *_lazy_attributes_,
+           'module_onc_id', 'dev_codes', 'dev_codes_deployed']
+
+
+def __getattr__(name):
+    """Import the attribute or submodule on first access and cache it in the module namespace (PEP 562)."""
+    if name in _lazy_attributes_:
+        value = getattr(importlib.import_module(_lazy_attributes_[name], __name__), name)
+    elif name in _lazy_submodules_:
+        value = importlib.import_module(f'.{name}', __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()).union(_lazy_attributes_, _lazy_submodules_))
+
+
 # store some properties
 module_onc_id: dict = {'0000006605b0': {'ip_add': '10.136.117.166', 'dev_code': 'TUMSTANDARDMODULE001'},
                        '000000661e33': {'ip_add': 'XX.XXX.XXX.XXX', 'dev_code': 'TUMSTANDARDMODULE002'},
@@ -1,4 +1,39 @@
 import os
+import threading
+
+
+class LazyClassAttribute:
+    """Decorator for a class attribute which is evaluated at the first access and cached afterwards. It is used to
+    load the calibration datasets (csv files) on demand and not at import time.
+
+    EXAMPLE
+    -------
+    >>> class A:
+    >>>     @LazyClassAttribute
+    >>>     def config_parameters(cls):
+    >>>         return pandas.read_csv(os.path.join(cls.local_path, 'file_name.csv'))
+    >>>
+    >>> A.config_parameters  # loads the csv file, further calls return the cached DataFrame
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+        self._lock_ = threading.Lock()
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        with self._lock_:
+            # another thread could already have replaced the attribute
+            value = owner.__dict__.get(self.name, self)
+            if value is self:
+                value = self.func(owner)
+                # replace the descriptor with the value, further access is a normal class attribute lookup
+                setattr(owner, self.name, value)
+        return value
 
 
 class DatasetHandler:
@@ -13,8 +48,10 @@ class DatasetHandler:
     - define the properties and supply docstrings
     """
     local_path = os.path.abspath(os.path.join(os.path.dirname(__file__)))
-    config_parameters = None  # should be overloaded with: pandas.read_csv(os.path.join(local_path,file_name))
-    available_labels = []  # should be overloaded with: list(config_parameters['label'].unique())
+    # should be overloaded with a LazyClassAttribute which returns: pandas.read_csv(os.path.join(local_path,file_name))
+    config_parameters = None
+    # should be overloaded with a LazyClassAttribute which returns: list(config_parameters['label'].unique())
+    available_labels = []
 
     def __init__(self, label=None):
         # set the label and check if it is a valid label
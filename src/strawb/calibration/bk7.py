@@ -4,6 +4,7 @@ import numpy as np
 import pandas
 
 from strawb.calibration.absorption import Absorption
+from strawb.calibration.base_dataset_handler import LazyClassAttribute
 
 
 class BK7(Absorption):
@@ -115,10 +116,17 @@ class BK7(Absorption):
               [2500.0, 40.831436866953766, 40.796823832628284, 40.866049901279254]])
 
     local_path = os.path.abspath(os.path.join(os.path.dirname(__file__)))
-    config_parameters_thorlabs = pandas.read_csv(os.path.join(local_path, 'bk7_10mm_thorlabs.csv'))
+
+    @LazyClassAttribute
+    def config_parameters_thorlabs(cls):
+        """Absorption of Thorlabs 10mm loaded from 'bk7_10mm_thorlabs.csv'."""
+        return pandas.read_csv(os.path.join(cls.local_path, 'bk7_10mm_thorlabs.csv'))
 
     # set default
-    config_parameters = config_parameters_thorlabs.copy()
+    @LazyClassAttribute
+    def config_parameters(cls):
+        """Default config_parameters, a copy of config_parameters_thorlabs."""
+        return cls.config_parameters_thorlabs.copy()
 
     # Dispersion of BK7
     # SCHOTT N-BK7® 517642.251
@@ -3,6 +3,7 @@ import os
 import pandas
 
 from strawb.calibration.absorption import Absorption
+from strawb.calibration.base_dataset_handler import LazyClassAttribute
 
 
 class CameraRGB(Absorption):
@@ -11,13 +12,21 @@ class CameraRGB(Absorption):
 
     # set default - from the IMX225LQR datasheet
     local_path = os.path.abspath(os.path.join(os.path.dirname(__file__)))
-    config_parameters_all = pandas.read_csv(os.path.join(local_path, 'camera_filter.csv'))
+
+    @LazyClassAttribute
+    def config_parameters_all(cls):
+        """The relative response of all colors loaded from 'camera_filter.csv'."""
+        return pandas.read_csv(os.path.join(cls.local_path, 'camera_filter.csv'))
 
     # config_parameters_all.rename(columns={'wavelength[nm]': 'wavelength'}, inplace=True)
     # config_parameters_all = config_parameters_all[~config_parameters_all.duplicated()]
     # config_parameters_all['absorption'] = Absorption.transmittance2absorption(thickness,
     #                                                                           config_parameters_all.relative_response)
-    config_parameters = config_parameters_all[config_parameters_all['color'] == 'red'].copy()
+
+    @LazyClassAttribute
+    def config_parameters(cls):
+        """Default config_parameters, the color 'red'."""
+        return cls.config_parameters_all[cls.config_parameters_all['color'] == 'red'].copy()
 
     def __init__(self, color='red', config_parameters=None):
         """Base class to calculate the absorption of a material with a thickness.
@@ -2,7 +2,7 @@ import os
 
 import pandas
 
-from strawb.calibration.base_dataset_handler import DatasetHandler
+from strawb.calibration.base_dataset_handler import DatasetHandler, LazyClassAttribute
 
 
 class Laser(DatasetHandler):
@@ -52,8 +52,16 @@ class Laser(DatasetHandler):
     >>> plt.tight_layout()
     """
     local_path = os.path.abspath(os.path.join(os.path.dirname(__file__)))
-    config_parameters = pandas.read_csv(os.path.join(local_path, 'lidar_laser-NPL45B-timeprofile.csv'))
-    available_labels = list(config_parameters['label'].unique())
+
+    @LazyClassAttribute
+    def config_parameters(cls):
+        """The laser emission profiles as DataFrame with the columns: time-ns,optical_power-mW,label"""
+        return pandas.read_csv(os.path.join(cls.local_path, 'lidar_laser-NPL45B-timeprofile.csv'))
+
+    @LazyClassAttribute
+    def available_labels(cls):
+        """All labels of the config_parameters dataset."""
+        return list(cls.config_parameters['label'].unique())
 
     def __init__(self, label=None):
         self._time_ = None
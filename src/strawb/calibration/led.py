@@ -2,7 +2,7 @@ import os
 
 import pandas
 
-from strawb.calibration.base_dataset_handler import DatasetHandler
+from strawb.calibration.base_dataset_handler import DatasetHandler, LazyClassAttribute
 
 
 class LED(DatasetHandler):
@@ -29,8 +29,16 @@ class LED(DatasetHandler):
     Art 1,2,3,4   = 1W,2B        - position: 1W hz, 2B hz
     """
     local_path = os.path.abspath(os.path.join(os.path.dirname(__file__)))
-    config_parameters = pandas.read_csv(os.path.join(local_path, 'strawb_leds.csv'))
-    available_labels = list(config_parameters.label.unique())
+
+    @LazyClassAttribute
+    def config_parameters(cls):
+        """The LED spectra as DataFrame with the columns: label,type,wavelength,relative_radiation"""
+        return pandas.read_csv(os.path.join(cls.local_path, 'strawb_leds.csv'))
+
+    @LazyClassAttribute
+    def available_labels(cls):
+        """All labels of the config_parameters dataset."""
+        return list(cls.config_parameters.label.unique())
 
     def __init__(self, label=None):
         self._wavelength_ = None
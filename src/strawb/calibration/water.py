@@ -2,12 +2,21 @@ import pandas
 import os
 
 from strawb.calibration.absorption import Absorption
+from strawb.calibration.base_dataset_handler import LazyClassAttribute
 
 
 class Water(Absorption):
     local_path = os.path.abspath(os.path.join(os.path.dirname(__file__)))
-    config_parameters_pool = pandas.read_csv(os.path.join(local_path, 'water_data.csv'))
-    publications = pandas.read_csv(os.path.join(local_path, 'water_publication.csv'), index_col='publication')
+
+    @LazyClassAttribute
+    def config_parameters_pool(cls):
+        """Absorption data of all publications loaded from 'water_data.csv'."""
+        return pandas.read_csv(os.path.join(cls.local_path, 'water_data.csv'))
+
+    @LazyClassAttribute
+    def publications(cls):
+        """Details of all publications loaded from 'water_publication.csv'."""
+        return pandas.read_csv(os.path.join(cls.local_path, 'water_publication.csv'), index_col='publication')
 
     def __init__(self, thickness=None, publication='hale73', config_parameters=None):
         """Class to calculate the water absorption based on data (wavelength vs. absorption).
@@ -1,4 +1,5 @@
 import gc
+import itertools
 
 import multiprocessing
 import threading
@@ -10,13 +11,111 @@ import os
 import time
 
 
+# per-process cache registry, holds objects which persist across jobs in the same worker process
+_worker_cache_ = {}
+
+
+def get_worker_cache(key, factory=None, *args, **kwargs):
+    """Get an item from the per-process cache. If the key isn't cached yet and a factory is provided, the item is
+    created with `factory(*args, **kwargs)` and stored. The cache persists across jobs executed by the same worker
+    process, i.e. heavy objects (open files, camera Config, SphereDistortion interpolators, ...) are created only
+    once per process.
+    PARAMETER
+    ---------
+    key: hashable
+        the key of the cached item
+    factory: executable, optional
+        creates the item if it isn't cached, i.e. `factory(*args, **kwargs)`
+    args, kwargs: list, dict, optional
+        parsed to the factory
+    RETURNS
+    -------
+    item: object
+        the cached item or None if the key isn't cached and no factory is provided.
+    """
+    if key not in _worker_cache_ and factory is not None:
+        _worker_cache_[key] = factory(*args, **kwargs)
+    return _worker_cache_.get(key)
+
+
+def clear_worker_cache(key=None):
+    """Remove the item `key` from the per-process cache or all items if key is None. Items with a `close` method,
+    e.g. files, are closed."""
+    keys = list(_worker_cache_) if key is None else [key]
+    for key_i in keys:
+        item = _worker_cache_.pop(key_i, None)
+        if hasattr(item, 'close'):
+            try:
+                item.close()
+            except Exception as exc:
+                logging.getLogger(__name__).exception(f'Error at closing cached item {key_i} with: {exc!r}')
+
+
+def _worker_initializer_(cache_factories=None, initializer=None, initargs=()):
+    """Initializer of each worker process. It fills the per-process cache with the items defined by cache_factories
+    and executes the user initializer afterwards."""
+    if cache_factories is not None:
+        for key, factory in cache_factories.items():
+            args, kwargs = (), {}
+            if isinstance(factory, (tuple, list)):
+                factory, *args_kwargs = factory
+                if len(args_kwargs) > 0:
+                    args = args_kwargs[0]
+                if len(args_kwargs) > 1:
+                    kwargs = args_kwargs[1]
+            get_worker_cache(key, factory, *args, **kwargs)
+
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _run_chunk_(chunk, func, *args, **kwargs):
+    """Executes func(chunk[i], *args, **kwargs) for all items of the chunk in the worker process. Exceptions are
+    captured per item and returned in place of the result."""
+    result = []
+    for item_i in chunk:
+        try:
+            result.append(func(item_i, *args, **kwargs))
+        except Exception as exc:
+            result.append(exc)
+    return result
+
+
 class MProcessIterator:
-    def __init__(self, progress_bar=None, log_sys_keys=None, with_sys_log=False, *args, **kwargs):
+    def __init__(self, progress_bar=None, log_sys_keys=None, with_sys_log=False, *args, cache_factories=None,
+                 chunk_size=1, **kwargs):
+        """Run func(iterable[i]) for all i on multiple processors with a multiprocessing.Pool.
+
+        PARAMETER
+        ---------
+        progress_bar: tqdm-like, optional
+            the progress bar type, e.g. tqdm.tqdm or tqdm.notebook.tqdm
+        log_sys_keys: list, str, optional
+            the keys to log of psutil.Process.as_dict or 'all'
+        with_sys_log: bool, optional
+            if system parameters should be logged
+        cache_factories: dict, optional
+            items for the per-process cache which are created once by the initializer of each worker process. The
+            items are accessible in the jobs with `get_worker_cache(key)`. The dict has the format
+            {key: factory} or {key: (factory, args, kwargs)}, i.e. the item is `factory(*args, **kwargs)`.
+            The factories must be picklable, i.e. functions or classes defined at module level.
+        chunk_size: int, optional
+            the number of items per dispatched job. With chunk_size>1, many tiny tasks are batched and the results
+            are unpacked per item. Default: 1
+        args, kwargs: list, dict, optional
+            parsed to multiprocessing.Pool(*args, **kwargs). A user `initializer` and `initargs` must be
+            parsed as keyword arguments, they are executed after the cache_factories.
+        """
         self.logger = logging.getLogger(type(self).__name__)
 
         self.pool_args = args
         self.pool_kwargs = kwargs
 
+        self.cache_factories = cache_factories
+        self.chunk_size = chunk_size
+        self._chunk_size_ = 1  # the chunk_size of the actual run
+        self._job_len_dict_ = {}  # the number of items per job
+
         self._progress_bar_ = progress_bar
         self.progress_bar = None
 
@@ -128,10 +227,11 @@ class MProcessIterator:
         return res
 
     def __get_sys_log__(self, index, log_type='start'):
-        """Wrapper for get_process_info_w_children which adds index and log_type to sys_log."""
+        """Wrapper for get_process_info_w_children which adds index and log_type to sys_log. The index is converted
+        to the index of the (first) item of the job, i.e. with chunks it's `index * chunk_size`."""
         res = self.get_process_info_w_children()
         for i in range(len(res)):
-            res[i]['index'] = index
+            res[i]['index'] = index * self._chunk_size_
             res[i]['log_type'] = log_type
         return res
 
@@ -144,7 +244,7 @@ class MProcessIterator:
                 self.sys_log.extend(self.__get_sys_log__(index, 'end'))
 
         if self.progress_bar is not None:
-            self.progress_bar.update()
+            self.progress_bar.update(self._job_len_dict_.get(index, 1))
 
     def __get_result__(self, index, job):
         """Return True if job finished."""
@@ -158,6 +258,28 @@ class MProcessIterator:
 
         return result
 
+    def __unpack_result__(self, index, result):
+        """Unpack the result of a job to {index_item: result_item}. With chunks, a job holds several items."""
+        n = self._job_len_dict_.get(index)
+        if self._chunk_size_ == 1 or n is None:
+            return {index: result}
+
+        index_0 = index * self._chunk_size_
+        if isinstance(result, Exception):  # the whole chunk failed, e.g. pickle error
+            return {index_0 + i: result for i in range(n)}
+        return {index_0 + i: result_i for i, result_i in enumerate(result)}
+
+    @staticmethod
+    def __gen_chunks__(iterable, chunk_size):
+        """Split the iterable into a list of chunks (lists) with len(chunk)<=chunk_size."""
+        iterator = iter(iterable)
+        chunks = []
+        chunk = list(itertools.islice(iterator, chunk_size))
+        while chunk:
+            chunks.append(chunk)
+            chunk = list(itertools.islice(iterator, chunk_size))
+        return chunks
+
     def __gen_callback_i__(self, index, callback=None):
         """The callbacks need to include the index for result tracking. Add it here."""
         if callback is None:
@@ -172,6 +294,22 @@ class MProcessIterator:
 
             return f
 
+    def __gen_chunk_callback_i__(self, index, callback=None, error_callback=None):
+        """Same as __gen_callback_i__ but for a chunk. The chunk returns a list of results, where failed items are
+        the exceptions. It logs failed items and executes `callback` or `error_callback` per item."""
+        def f(result):
+            index_0 = index * self._chunk_size_
+            for i, result_i in enumerate(result):
+                if isinstance(result_i, Exception):
+                    self.logger.error(f'Error at job {index_0 + i} with: {result_i!r}')
+                    if error_callback is not None:
+                        error_callback(result_i)
+                elif callback is not None:
+                    callback(result_i)
+            self.__update__(index)
+
+        return f
+
     def __thread_worker__(self, func, iterable, args=(), callback=None, error_callback=None, **kwargs):
         """Function for the worker. It takes care of submitting jobs to the pool and
         PARAMETER
@@ -190,7 +328,8 @@ class MProcessIterator:
         self.logger.debug(f"---- START WORKER THREAD ----")
         self._active_ = True
 
-        self._total_jobs_ = len(iterable)
+        # count items, with chunks a job holds several items
+        self._total_jobs_ = sum(self._job_len_dict_.values()) if self._chunk_size_ > 1 else len(iterable)
 
         try:
             len(args)
@@ -211,7 +350,8 @@ class MProcessIterator:
                     func=func,
                     args=(iterable_i, *args),
                     kwds=kwargs,
-                    callback=self.__gen_callback_i__(i, callback),
+                    callback=(self.__gen_chunk_callback_i__(i, callback, error_callback) if self._chunk_size_ > 1
+                              else self.__gen_callback_i__(i, callback)),
                     error_callback=self.__gen_callback_i__(i, error_callback),
                 )
 
@@ -241,7 +381,7 @@ class MProcessIterator:
                         j = 0
                         with self._threading_lock_:
                             result = self.__get_result__(key_0, self._ready_dict_.pop(key_0))
-                        self._result_dict_.update({key_0: result})
+                        self._result_dict_.update(self.__unpack_result__(key_0, result))
 
                         # clean up RAM
                         gc.get_count(), gc.collect(), gc.get_count()
@@ -257,7 +397,8 @@ class MProcessIterator:
         self.logger.debug(f'---- END OF WORKER THREAD ---- and clean up gc: {c1}, {c2}, {c3}')
 
     # Public
-    def run_async(self, func, iterable, args=(), pbar_kwargs=None, callback=None, error_callback=None, **kwargs):
+    def run_async(self, func, iterable, args=(), pbar_kwargs=None, callback=None, error_callback=None, chunk_size=None,
+                  **kwargs):
         """Run func(iterable[i]) for all i on multiple processors asynchronously (function executes not blocking).
 
         PARAMETER
@@ -273,7 +414,13 @@ class MProcessIterator:
         callback, error_callback: executable
             executables which are executed when a job (res=func(iterable[i], *args, **kwargs)) finished.
             Takes `callback` if func returns normal, and `error_callback` if func raise an exception.
-            Both function must return immediately!
+            Both function must return immediately! With chunk_size>1, both are still executed per item, and failed
+            items are logged the same way as without chunks.
+        chunk_size: int, optional
+            the number of items per dispatched job. Default: None, takes the value from the class initialisation.
+            The results in `result_dict`, `number_total_jobs` and `number_finished_jobs` are always per item,
+            i.e. {index_item: result_item}, while `number_active_jobs` and `number_ready_jobs` count the
+            dispatched jobs (chunks).
         """
         if pbar_kwargs is None:
             pbar_kwargs = {}
@@ -285,14 +432,27 @@ class MProcessIterator:
         if self._progress_bar_ is not None:
             self.progress_bar = self._progress_bar_(iterable, position=0, **pbar_kwargs)
 
-        self.pool = multiprocessing.Pool(*self.pool_args, **self.pool_kwargs)
+        # the worker initializer fills the per-process cache and executes the user initializer afterwards
+        pool_kwargs = self.pool_kwargs.copy()
+        initargs = (self.cache_factories, pool_kwargs.pop('initializer', None), pool_kwargs.pop('initargs', ()))
+        pool_kwargs.update(initializer=_worker_initializer_, initargs=initargs)
+        self.pool = multiprocessing.Pool(*self.pool_args, **pool_kwargs)
 
         # can be done without lock
         self._active_jobs_dict_ = {}
         self._result_dict_ = {}
         self._ready_dict_ = {}
+        self._job_len_dict_ = {}
         self.sys_log = []
 
+        # batch the items to chunks
+        self._chunk_size_ = max(int(self.chunk_size if chunk_size is None else chunk_size), 1)
+        if self._chunk_size_ > 1:
+            iterable = self.__gen_chunks__(iterable, self._chunk_size_)
+            self._job_len_dict_ = {i: len(chunk_i) for i, chunk_i in enumerate(iterable)}
+            args = (func, *(args if isinstance(args, (tuple, list)) else [args]))
+            func = _run_chunk_
+
         self._thread_ = threading.Thread(target=self.__thread_worker__,
                                          kwargs={'func': func,
                                                  'iterable': iterable,
@@ -344,22 +504,22 @@ class MProcessIterator:
 
     @property
     def number_total_jobs(self):
-        """Number of total submitted jobs."""
+        """Number of total submitted jobs, counted in items also with chunks."""
         return self._total_jobs_
 
     @property
     def number_active_jobs(self):
-        """Number of active jobs in the pool."""
+        """Number of active jobs in the pool. With chunks, it counts the chunks."""
         return len(self._active_jobs_dict_)
 
     @property
     def number_ready_jobs(self):
-        """Number of jobs where the result can be collected."""
+        """Number of jobs where the result can be collected. With chunks, it counts the chunks."""
         return len(self._ready_dict_)
 
     @property
     def number_finished_jobs(self):
-        """Number of finished jobs."""
+        """Number of finished jobs, counted in items also with chunks."""
         return len(self._result_dict_)
 
     def sys_log_dataframe(self):
@@ -1,6 +1,5 @@
 # Authors: Kilian Holzapfel <kilian.holzapfel@tum.de>
 import datetime
-import os
 
 import numpy as np
 import pandas
@@ -9,11 +8,13 @@ from onc.util.util import add_docs
 
 import strawb
 from .. import Config
-from ..tools import human_size, ShareJobThreads
+from ..tools import human_size, ShareJobThreads, scandir_files
+from .file_downloader import DownloadScheduler
+from .listing_cache import ListingCache
 
 
 class ONCDownloader(ONC):
-    def __init__(self, token=None, outPath=None, download_threads=None, **kwargs):
+    def __init__(self, token=None, outPath=None, download_threads=None, listing_cache=None, **kwargs):
         """ A wrapper class for the basic ONC module. Which adds: structured_download and the
         Config parameters as default.
 
@@ -26,6 +27,9 @@ class ONCDownloader(ONC):
         download_threads: int, optional
             Defines the number of thread for the download. If None (default) it uses the specified 'threads' form the
             config-file.
+        listing_cache: ListingCache, str or None, optional
+            caches the file listings per device, that repeated listings only query the delta from ONC. A str is the
+            file name of the cache. None (default) doesn't cache the listings.
         kwargs: dict, optional
             parsed to ONC package initialisation.
         """
@@ -40,6 +44,11 @@ class ONCDownloader(ONC):
 
         ONC.__init__(self, token, outPath=outPath, download_threads=download_threads, **kwargs)
 
+        self.download_threads = download_threads
+        self.download_scheduler = None  # the DownloadScheduler of the last `download_files`
+        if isinstance(listing_cache, str):
+            listing_cache = ListingCache(listing_cache)
+        self.listing_cache = listing_cache
         self.result = {}
 
     @add_docs(ONC.getDirectFiles)
@@ -48,15 +57,74 @@ class ONCDownloader(ONC):
                                          overwrite=overwrite,
                                          allPages=allPages)
 
-    def _get_for_dev_code_(self, dev_i, filters):
-        filters['deviceCode'] = dev_i
-        result_i = self.getListByDevice(filters=filters, allPages=True)
-        return result_i
+    def _get_file_url_(self, filename):
+        """The download url of an archived file from ONC."""
+        if hasattr(self, 'getArchivefileUrl'):  # onc >= 2.0
+            return self.getArchivefileUrl(filename)
+        return f'{self.baseUrl}api/archivefiles?method=getFile&filename={filename}&token={self.token}'
+
+    def download_files(self, pd_result, max_bandwidth=None, progress_bar=True, **kwargs):
+        """Download the files with the strawb.onc_downloader.DownloadScheduler. It orders the files by priority,
+        downloads small files in parallel to large ones, resumes interrupted downloads and verifies the file size
+        against 'fileSize' or 'uncompressedFileSize'. The scheduler is kept as `self.download_scheduler` to get the
+        metrics with `self.download_scheduler.progress()`.
+        PARAMETER
+        ---------
+        pd_result: pandas.DataFrame
+            the files to download, with at least the columns: 'filename', 'outPath' and 'fileSize'
+        max_bandwidth: float or None, optional
+            the total bandwidth in bytes/s. None (default) doesn't limit it.
+        progress_bar: bool, optional
+            if a progress bar is shown. Default: True.
+        kwargs: optional
+            parsed to DownloadScheduler, e.g. product_priority, sort_by, small_file_size, max_retries. Default for
+            fast_lane_n is the `download_threads` from the initialisation.
+        RETURNS
+        -------
+        errors: dict
+            {fullPath: exception} of the failed downloads
+        """
+        kwargs.setdefault('fast_lane_n', self.download_threads)
+        kwargs.setdefault('slow_lane_n', max(1, self.download_threads // 2))
+
+        columns = [i for i in ['fileSize', 'dataProductCode', 'dateFrom'] if i in pd_result]
+        pending = pd_result[columns].reset_index(drop=True)
+        pending['url'] = [self._get_file_url_(i) for i in pd_result['filename']]
+        pending['file_name'] = (pd_result['outPath'] + '/' + pd_result['filename']).to_numpy()
+        file_size = [i for i in ['fileSize', 'uncompressedFileSize'] if i in pd_result]
+        pending['file_size'] = list(pd_result[file_size].to_numpy(dtype=np.float64))
+
+        self.download_scheduler = DownloadScheduler(max_bandwidth=max_bandwidth, **kwargs)
+        return self.download_scheduler.download(pending, progress_bar=progress_bar)
+
+    def _get_for_dev_code_(self, dev_i, filters, date_from, date_to, reconcile=False):
+        filters = dict(filters, deviceCode=dev_i)  # a copy per device, as the devices run in parallel
+        if self.listing_cache is None:
+            return self.getListByDevice(filters=filters, allPages=True)
+
+        # list only the delta window from ONC and merge it with the cached files
+        window = self.listing_cache.query_window(dev_i, date_from, date_to, reconcile=reconcile)
+        # and files which are archived late, before the delta window
+        archived = self.listing_cache.query_archived(dev_i, date_from, date_to, reconcile=reconcile)
+
+        result_i = self.getListByDevice(filters=dict(filters, dateFrom=window[0].strftime("%Y-%m-%dT%H:%M:%S.000Z")),
+                                        allPages=True)
+        files = result_i['files']
+        if archived is not None:
+            filters_archived = dict(filters,
+                                    dateFrom=archived[0].strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+                                    dateTo=archived[1].strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+                                    dateArchivedFrom=archived[2].strftime("%Y-%m-%dT%H:%M:%S.000Z"))
+            files = files + self.getListByDevice(filters=filters_archived, allPages=True)['files']
+
+        self.listing_cache.update(dev_i, files, *window, reconcile=reconcile)
+        return {'files': self.listing_cache.get_files(dev_i, date_from, date_to)}
 
     def get_files_for_dev_codes(self, dev_codes: list, date_from: datetime, date_to: datetime,
-                                print_stats: bool = True):
+                                print_stats: bool = True, reconcile: bool = False):
         """
-        Get all available files on the ONC server for the dev_code and the specified date.
+        Get all available files on the ONC server for the dev_code and the specified date. With a
+        `self.listing_cache`, only the files since the last listing are queried from ONC per device.
         Parameters
         ---------
         dev_codes: list(str),
@@ -67,6 +135,9 @@ class ONCDownloader(ONC):
             e.g. datetime.datetime.now(tz=datetime.timezone.utc)
         print_stats: bool, optional
             if the function returns stats
+        reconcile: bool, optional
+            only with a `self.listing_cache`. If True, it lists the full window from ONC and replaces the cached files
+            within the window, e.g. to remove files which were deleted on the server. Default: False.
         Returns
         -------
         result: dict
@@ -84,10 +155,17 @@ class ONCDownloader(ONC):
             'dateTo': date_to.strftime("%Y-%m-%dT%H:%M:%S.999Z"),  # '2021-10-21T00:00:10.000Z',
             'returnOptions': 'all'}
 
-        sjt = ShareJobThreads(thread_n=len(dev_codes), unit='devices')
-        sjt.do(self._get_for_dev_code_, dev_codes, filters=filters)
-
-        for dev_i, result_i in zip(dev_codes, sjt.return_buffer):
+        # ordered: the results match dev_codes, failed devices are None
+        sjt = ShareJobThreads(thread_n=len(dev_codes), unit='devices', ordered=True)
+        sjt.do(self._get_for_dev_code_, dev_codes, filters=filters, date_from=date_from, date_to=date_to,
+               reconcile=reconcile)
+        if self.listing_cache is not None:
+            self.listing_cache.save()
+
+        for i, (dev_i, result_i) in enumerate(zip(dev_codes, sjt.return_buffer)):
+            if result_i is None:
+                print(f' {dev_i}: failed with {sjt.errors.get(i)!r}')
+                continue
             result['files'].extend(result_i['files'])
 
             n_files = len(result_i["files"])
@@ -111,7 +189,7 @@ class ONCDownloader(ONC):
             return abs(d_time)
 
     def get_files_structured(self, dev_codes=None, date_from=None, date_to=None,
-                             extensions=None, min_file_size=0, max_file_size=.75e9):
+                             extensions=None, min_file_size=0, max_file_size=.75e9, reconcile=False):
         """
         This function gets the dataframe with all metadata of files from the onc server for the specified dev_code(s).
         It also adds a path 'fullPath' to each file. The files are organized in different directories by
@@ -146,6 +224,9 @@ class ONCDownloader(ONC):
             defines the minimum file size
         max_file_size: int, float, optional
             defines the maximum file size
+        reconcile: bool, optional
+            only with a `self.listing_cache`. If True, it lists the full window from ONC instead of the delta since the
+            last listing. Default: False.
         """
         # TODO: finalise commented part `data_product_names`
         if dev_codes is None:
@@ -182,7 +263,8 @@ class ONCDownloader(ONC):
             date_to = datetime.datetime.fromisoformat(date_to.rstrip('Z'))
 
         # get all possible files from the devices
-        result = self.get_files_for_dev_codes(dev_codes, date_from=date_from, date_to=date_to, print_stats=False)
+        result = self.get_files_for_dev_codes(dev_codes, date_from=date_from, date_to=date_to, print_stats=False,
+                                              reconcile=reconcile)
 
         # convert the list to a DataFrame for easier modifications
         pd_result = self._convert_results2dataframe_(result)
@@ -196,7 +278,8 @@ class ONCDownloader(ONC):
 
     def download_structured(self, pd_result=None, download=True,
                             extensions=None,
-                            min_file_size=0, max_file_size=.75e9, **kwargs):
+                            min_file_size=0, max_file_size=.75e9, resume=True, max_bandwidth=None, download_kwargs=None,
+                            **kwargs):
         """
         This function syncs files from the onc server for the specified dev_codes. The files are organized in different
         directories by <Config.raw_data_dir>/<dev_code>/<year>_<month>/<file_name>.
@@ -219,9 +302,20 @@ class ONCDownloader(ONC):
             defines the minimum file size. Applied to pd_result.
         max_file_size: int, float, optional
             defines the maximum file size. Applied to pd_result.
+        resume: bool, optional
+            if True (default), download with `download_files`, which schedules the files by priority, resumes
+            interrupted downloads and verifies the file size. If False, it uses the `getDirectFiles` of the onc package.
+        max_bandwidth: float or None, optional
+            only for resume=True, the maximum download rate in bytes per second over all threads. Same as
+            download_kwargs={'max_bandwidth': ...}.
+        download_kwargs: dict or None, optional
+            only for resume=True, parsed to `download_files`, e.g. max_bandwidth, product_priority.
         kwargs: optional
             are parsed to get_files_structured(). Valid options are: dev_codes, date_from, date_to
         """
+        download_kwargs = dict(download_kwargs or {})
+        if max_bandwidth is not None:
+            download_kwargs['max_bandwidth'] = max_bandwidth
 
         if not isinstance(pd_result, pandas.DataFrame):
             pd_result = self.get_files_structured(min_file_size=min_file_size, max_file_size=max_file_size,
@@ -243,7 +337,15 @@ class ONCDownloader(ONC):
         download_size = (pd_result[mask]['fileSize']).sum()
         print(f'In total: {pd_result.shape[0]} files; exclude: {len(mask[~mask])}; '
               f'size to download: {human_size(download_size)}')
-        if download:
+        if download and resume:
+            errors = self.download_files(pd_result[mask], **download_kwargs)
+            if errors:
+                print(f'Download failed for {len(errors)} files')
+
+            # also label the synced files as synced
+            pd_result['synced'] |= mask & ~pd_result['fullPath'].isin(list(errors))
+
+        elif download:
             # reduce it with the mask and the columns to 'filename', 'outPath'
             pd_result_masked = pd_result[mask][['filename', 'outPath']]
             filters_or_result = dict(files=pd_result_masked.to_dict(orient='records'))
@@ -327,6 +429,7 @@ class ONCDownloader(ONC):
         pd_result["fullPath"] = pd_result["outPath"] + '/' + pd_result['filename']
         pd_result.set_index("fullPath", inplace=True, verify_integrity=True, drop=False)
 
-        # mask the files which are already downloaded
-        pd_result['synced'] = np.array([os.path.exists(i) for i in pd_result["fullPath"]], dtype=bool)
+        # mask the files which are already downloaded, with one directory listing per outPath
+        existing = [scandir_files(i, recursive=False, stat=False).index for i in pd_result['outPath'].unique()]
+        pd_result['synced'] = pd_result['fullPath'].isin(pandas.Index([]).append(existing)).to_numpy()
         return pd_result
@@ -4,6 +4,7 @@ import datetime
 import h5py
 import time
 from strawb.onc_downloader import ONCDownloader
+from strawb.tools import HDF5Appender, datetime2float
 
 
 # TODO: get this section updated with the feedback from ONC. Now it doesn't work as download from ONC is very slow.
@@ -60,7 +61,7 @@ class SensorData:
         self.attributes.pop('actualSamples')  # remove the number of data entries
 
     def __get_dataframe__(self, sensor_dict):
-        t = pandas.to_datetime(sensor_dict['data']['sampleTimes'], utc=True, infer_datetime_format=True)
+        t = pandas.to_datetime(sensor_dict['data']['sampleTimes'], utc=True)
         t = t.round(freq='ms')  # round from ms to s happens inplace
 
         df = pandas.DataFrame({  # 'qaqcFlags': self.qaqcFlags,
@@ -149,6 +150,9 @@ class SensorGroup:
 
 
 class ONCDevice:
+    # default for the streaming writer, gzip level 4 is much faster than 9 at almost the same size for scalar data
+    h5py_dataset_options_stream = {'compression': 'gzip', 'compression_opts': 4, 'shuffle': True, 'fletcher32': True}
+
     def __init__(self, result=None, filters=None, onc_downloader=None):
         """Process the data from result=onc.getDirectByDevice(filters). Either the result or the filter can be parsed.
         In addition it distinguish between an ONC miniJB (ONCMJB) and other devices. It separates the data into
@@ -173,7 +177,7 @@ class ONCDevice:
         if filters is not None:  # get data
             print(f'download: {filters}')
             t_0 = time.time()
-            self.result = onc_downloader.getDirectByDevice(filters, allPages=True)
+            self.result = self.onc_downloader.getDirectByDevice(filters, allPages=True)
             print(f'downloaded: {time.time() - t_0:.2f}')
         elif result is not None:
             self.result = result
@@ -250,7 +254,7 @@ class ONCDevice:
                 group = f.create_group(i)
                 # add time as seconds since epoch
                 group.create_dataset('time',
-                                     data=sensor_group_i.dataframe.index.to_numpy(dtype=float),
+                                     data=self._index2float_(sensor_group_i.dataframe.index),
                                      **h5py_dataset_options)
 
                 for sensor_i in sensor_group_i.dataframe:
@@ -258,3 +262,142 @@ class ONCDevice:
                                                    data=sensor_group_i.dataframe[sensor_i],
                                                    **h5py_dataset_options)
                     dataset.attrs.update(sensor_group_i.sensor_dict[sensor_i].attributes)
+
+    @staticmethod
+    def _index2float_(index):
+        """Converts a pandas.DatetimeIndex to seconds (as float) since epoch."""
+        return datetime2float(index.tz_convert(None).to_numpy())
+
+    @staticmethod
+    def iter_pages(onc_downloader, filters):
+        """Yields the result pages of onc_downloader.getDirectByDevice(filters) one by one. The next page is requested
+        with the parameters in result['next'], when the previous page is processed.
+
+        PARAMETER
+        ---------
+        onc_downloader: ONCDownloader
+            the downloader to request the pages
+        filters: dict
+            the filter of the first page, e.g. {'deviceCode': 'ONCMJB016', 'dateFrom': ..., 'dateTo': ...}
+        """
+        filters = dict(filters)
+        while filters:
+            result = onc_downloader.getDirectByDevice(filters, allPages=False)
+            yield result
+            filters = (result.get('next') or {}).get('parameters')
+
+    @classmethod
+    def _page2sensor_groups_(cls, page, device_code):
+        """Splits the sensorData of a result page into sensor groups, like `__init__`.
+
+        RETURNS
+        -------
+        sensor_groups: dict
+            {group: [SensorData, ...]}
+        """
+        sensor_groups = {}
+        for i in page['sensorData'] or []:
+            if 'ONCMJB' in device_code:
+                group, sensor_name = cls.mini_jb_split_port(i['sensorCode'])
+            else:
+                group, sensor_name = 'data', i['sensorCode']
+            sensor_groups.setdefault(group, []).append(SensorData(i, sensor_name))
+        return sensor_groups
+
+    @classmethod
+    def stream_to_hdf5(cls, filters=None, pages=None, file_name: str = None, onc_downloader=None,
+                       h5py_dataset_options: dict = None, buffer_size=2 ** 16):
+        """Download device data page by page and append each page directly to a hdf5 file, with the same layout as
+        `to_hdf5`: each sensor group gets its own group with a dataset 'time' (seconds since epoch) and one dataset per
+        sensor. In contrast to `ONCDevice(filters=filters).to_hdf5()`, only one page is kept in memory. The sensors of a
+        group are aligned on the time across pages, i.e. a sensor which is missing in a page, or appears in a later
+        page, is filled with NaN.
+
+        PARAMETER
+        ---------
+        filters: dict, optional
+            a filter parsed to onc_downloader.getDirectByDevice(filters=filters). One of `filters` or `pages` have to
+            be not None.
+        pages: iterable of dict, optional
+            the result pages of getDirectByDevice, e.g. recorded pages. If None (default), the pages are requested
+            with `ONCDevice.iter_pages(onc_downloader, filters)`.
+        file_name: str, optional
+            the file name of the resulting hdf5 file. If None (default), use the original ONC file naming.
+            <device_code>_<date_from>.h5
+        onc_downloader: ONCDownloader, optional
+            the downloader for the pages. If None (default), it creates one.
+        h5py_dataset_options: None, optional
+            dictionary for h5py.create_dataset. If None (default) it takes `ONCDevice.h5py_dataset_options_stream`:
+            {'compression': 'gzip', 'compression_opts': 4, 'shuffle': True, 'fletcher32': True}
+        buffer_size: int, optional
+            the number of samples per dataset, which are buffered before they are written. Default: 2**16.
+
+        RETURNS
+        -------
+        file_name: str
+            the file name of the hdf5 file
+
+        EXAMPLE
+        -------
+        >>> filters = {'deviceCode': 'ONCMJB016', 'dateFrom': '2021-10-01T00:00:00.000Z',
+        >>>            'dateTo': '2021-11-01T00:00:00.000Z'}
+        >>> ONCDevice.stream_to_hdf5(filters=filters)
+        """
+        if pages is None:
+            if filters is None:
+                raise ValueError('One of `filters` or `pages` have to be not None.')
+            if onc_downloader is None:
+                onc_downloader = ONCDownloader(showInfo=False, timeout=120)
+            pages = cls.iter_pages(onc_downloader, filters)
+
+        if h5py_dataset_options is None:
+            h5py_dataset_options = cls.h5py_dataset_options_stream
+
+        pages = iter(pages)
+        page = next(pages, None)
+        if page is None:
+            raise ValueError('Got no result page.')
+
+        device_code = page['parameters']['deviceCode']
+        if file_name is None:
+            date_from = page['parameters']['dateFrom']
+            date_from = date_from.replace(':', '').replace('-', '')
+            file_name = f"{device_code}_{date_from}.hdf5"
+
+        # {group: {'length': number of written samples, 'attributes': {sensor: attributes}}}
+        group_dict = {}
+        with h5py.File(file_name, 'w') as f:
+            f.attrs.update({'file_start': convert_str2timestamp(page['parameters']['dateFrom']),
+                            'file_end': convert_str2timestamp(page['parameters']['dateTo']),
+                            'deviceCode': device_code})
+
+            with HDF5Appender(f, buffer_size=buffer_size, **h5py_dataset_options) as appender:
+                while page is not None:
+                    for group, sensor_list in cls._page2sensor_groups_(page, device_code).items():
+                        group_i = group_dict.setdefault(group, {'length': 0, 'attributes': {}})
+                        for sensor_i in sensor_list:
+                            if sensor_i.sensor not in group_i['attributes']:
+                                group_i['attributes'][sensor_i.sensor] = sensor_i.attributes
+                                # a new sensor, fill the samples of the previous pages
+                                appender.append(f'/{group}/{sensor_i.sensor}', np.full(group_i['length'], np.nan))
+
+                        # align the sensors on the time, ONC can list the same sample twice
+                        dataframe = pandas.concat([i.dataframe[~i.dataframe.index.duplicated()] for i in sensor_list],
+                                                  axis=1).sort_index()
+                        appender.append(f'/{group}/time', cls._index2float_(dataframe.index))
+                        for sensor_i in group_i['attributes']:
+                            if sensor_i in dataframe:
+                                data = pandas.to_numeric(dataframe[sensor_i], errors='coerce').to_numpy(dtype=float)
+                            else:
+                                data = np.full(len(dataframe), np.nan)
+                            appender.append(f'/{group}/{sensor_i}', data)
+                        group_i['length'] += len(dataframe)
+
+                    page = next(pages, None)
+
+            for group, group_i in group_dict.items():
+                for sensor_i, attributes in group_i['attributes'].items():
+                    if f'{group}/{sensor_i}' in f:
+                        f[f'{group}/{sensor_i}'].attrs.update({k: v for k, v in attributes.items() if v is not None})
+
+        return file_name
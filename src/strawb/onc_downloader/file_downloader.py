@@ -0,0 +1,370 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pandas
+import requests
+
+from ..tools import ShareJobThreads
+
+
+class BandwidthLimiter:
+    def __init__(self, max_bandwidth=None):
+        """Limits the total bandwidth of all threads which share the instance. Each thread calls `consume(n)` after it
+        received n bytes and sleeps until the n bytes fit in the budget.
+
+        PARAMETER
+        ---------
+        max_bandwidth: float or None, optional
+            the maximum bandwidth in bytes/s. None (default) doesn't limit the bandwidth.
+        """
+        self.max_bandwidth = max_bandwidth
+        self._lock_ = threading.Lock()
+        self._next_time_ = 0.  # time.monotonic() when the budget is free again
+
+    def consume(self, n_bytes):
+        """Consume n_bytes from the budget, i.e. sleep until they are in the budget."""
+        if not self.max_bandwidth:
+            return
+        with self._lock_:
+            now = time.monotonic()
+            self._next_time_ = max(self._next_time_, now) + n_bytes / self.max_bandwidth
+            delay = self._next_time_ - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class FileDownloader:
+    part_suffix = '.part'
+
+    def __init__(self, thread_n=4, max_bandwidth=None, max_retries=5, backoff=1., timeout=60., chunk_size=2 ** 16,
+                 headers=None):
+        """A download engine for large files over unreliable connections. Files are written to '<file_name>.part'
+        and renamed once they are complete and their size is verified. An existing '.part' file is resumed with a HTTP
+        range request, e.g. after a dropped connection or an interrupted sync, and failed downloads are retried with an
+        exponential backoff.
+
+        PARAMETER
+        ---------
+        thread_n: int, optional
+            the number of parallel downloads in `download_list`. Default: 4.
+        max_bandwidth: float or None, optional
+            the total bandwidth in bytes/s of all downloads. None (default) doesn't limit it.
+        max_retries: int, optional
+            the number of retries per file, before the download fails. Default: 5.
+        backoff: float, optional
+            the waiting time in seconds before the first retry, which doubles with each retry. Default: 1.
+        timeout: float, optional
+            the timeout in seconds for the connection and between received bytes. Default: 60.
+        chunk_size: int, optional
+            the size in bytes of the chunks written to the file. A dropped connection loses at most the last chunk.
+            Default: 64kiB.
+        headers: dict or None, optional
+            additional HTTP headers for all requests
+
+        EXAMPLE
+        -------
+        >>> downloader = FileDownloader(thread_n=4, max_bandwidth=50e6)  # 50MB/s
+        >>> downloader.download('https://.../file.hdf5', '/path/to/file.hdf5', file_size=1234)
+        >>> errors = downloader.download_list([{'url': 'https://...', 'file_name': '/path/to/file.hdf5'}, ...])
+        """
+        self.thread_n = thread_n
+        self.bandwidth_limiter = BandwidthLimiter(max_bandwidth)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.headers = headers or {}
+
+        self._local_ = threading.local()  # one requests.Session per thread
+
+    @property
+    def session(self):
+        """The requests.Session of the current thread."""
+        if getattr(self._local_, 'session', None) is None:
+            self._local_.session = requests.Session()
+        return self._local_.session
+
+    @staticmethod
+    def _expected_sizes_(file_size):
+        """The valid file sizes as a set of int, or None if there is no valid size."""
+        if file_size is None:
+            return None
+        file_size = np.atleast_1d(np.asarray(file_size, dtype=np.float64))
+        file_size = file_size[np.isfinite(file_size)]
+        if file_size.size == 0:
+            return None
+        return set(file_size.astype(np.int64).tolist())
+
+    def download(self, url, file_name, file_size=None):
+        """Download a file, resume it if a '.part' file exists, and rename it to file_name once it is complete.
+
+        PARAMETER
+        ---------
+        url: str
+            the url of the file
+        file_name: str
+            the path where the file is saved. The directory is created if it doesn't exist.
+        file_size: int, list of int or None, optional
+            the valid file size(s) in bytes, e.g. [fileSize, uncompressedFileSize] from ONC. If the downloaded file has
+            a different size, it is deleted and downloaded again. None (default) only checks the size the server
+            reports.
+
+        RETURNS
+        -------
+        file_name: str
+            the path of the downloaded file
+
+        RAISES
+        ------
+        requests.RequestException or IOError
+            if the download fails after `max_retries` retries
+        """
+        expected_sizes = self._expected_sizes_(file_size)
+        part_name = file_name + self.part_suffix
+        directory = os.path.dirname(file_name)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        for retry in range(self.max_retries + 1):
+            try:
+                self.__download__(url, part_name, expected_sizes)
+                break
+            except (requests.RequestException, IOError):
+                if retry == self.max_retries:
+                    raise
+                time.sleep(self.backoff * 2 ** retry)
+
+        os.replace(part_name, file_name)  # atomic, the file_name exists only if it is complete
+        return file_name
+
+    def __download__(self, url, part_name, expected_sizes):
+        """Download or resume url into part_name and verify the size. Raises IOError if it isn't complete."""
+        position = os.path.getsize(part_name) if os.path.exists(part_name) else 0
+        if expected_sizes is not None and position > max(expected_sizes):
+            position = 0  # can't be resumed
+
+        headers = dict(self.headers)
+        if position:
+            headers['Range'] = f'bytes={position}-'
+
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 416:  # range not satisfiable, i.e. the '.part' file is already complete
+                if expected_sizes is None or position in expected_sizes:
+                    return
+                os.remove(part_name)
+                raise IOError(f'Range not satisfiable for {position} bytes of {url}')
+
+            response.raise_for_status()
+            if response.status_code != 206:  # the server sends the entire file
+                position = 0
+
+            total_size = response.headers.get('Content-Length')
+            if total_size is not None:
+                total_size = int(total_size) + position
+
+            with open(part_name, 'ab' if position else 'wb') as f:
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    f.write(chunk)
+                    self.bandwidth_limiter.consume(len(chunk))
+
+        size = os.path.getsize(part_name)
+        if total_size is not None and size < total_size:  # keep the '.part' file to resume it
+            raise IOError(f'Incomplete download, got {size} of {total_size} bytes: {url}')
+        if expected_sizes is not None and size not in expected_sizes:
+            os.remove(part_name)
+            raise IOError(f'File size mismatch, got {size} bytes, expected {sorted(expected_sizes)}: {url}')
+
+    def __download_item__(self, item):
+        return self.download(item['url'], item['file_name'], file_size=item.get('file_size'))
+
+    def download_list(self, items, progress_bar=True):
+        """Download a list of files with `thread_n` parallel downloads.
+
+        PARAMETER
+        ---------
+        items: list of dict
+            the files with the keys: 'url', 'file_name' and optional 'file_size', see `download`.
+        progress_bar: bool, optional
+            if a progress bar is shown. Default: True.
+
+        RETURNS
+        -------
+        errors: dict
+            {file_name: exception} of the failed downloads
+        """
+        sjt = ShareJobThreads(thread_n=self.thread_n, unit='files', fmt='{file_name}', progress_bar=progress_bar)
+        sjt.do(self.__download_item__, items)
+        return {items[i]['file_name']: err for i, err in sjt.errors.items()}
+
+
+class DownloadScheduler:
+    lanes = ['fast', 'slow']
+
+    def __init__(self, sort_by=('priority', 'recency', 'size'), product_priority=None, small_file_size=50e6,
+                 fast_lane_n=4, slow_lane_n=2, max_bandwidth=None, **kwargs):
+        """Schedules the downloads of a pending set of files. The files are ordered by `sort_by` and small files run
+        on a fast lane in parallel to the large files on a slow lane, i.e. large camera or hld files don't block the
+        small SDAQ files. Both lanes share the bandwidth budget. The progress and throughput is available with
+        `progress()`, also while `download` runs in another thread.
+
+        PARAMETER
+        ---------
+        sort_by: tuple of str, optional
+            the order of the sort keys, any of:
+            - 'priority': by `product_priority` of the 'dataProductCode'
+            - 'recency': the newest 'dateFrom' first
+            - 'size': the smallest 'fileSize' first
+            Default: ('priority', 'recency', 'size')
+        product_priority: dict, list or None, optional
+            the priority of a dataProductCode, lower values first, e.g. {'PMTSD': 0, 'LIDARSD': 0, 'MSSCD': 1}.
+            A list gives the priority by the position, e.g. ['PMTSD', 'LIDARSD']. Not listed products come last.
+            None (default), all products have the same priority.
+        small_file_size: float, optional
+            files with fileSize <= small_file_size run on the fast lane. Default: 50e6 (50MB)
+        fast_lane_n, slow_lane_n: int, optional
+            the number of parallel downloads on the fast and slow lane. Default: 4 and 2.
+        max_bandwidth: float or None, optional
+            the total bandwidth in bytes/s of both lanes. None (default) doesn't limit it.
+        kwargs: optional
+            parsed to FileDownloader, e.g. max_retries, backoff, timeout.
+
+        EXAMPLE
+        -------
+        >>> scheduler = DownloadScheduler(product_priority=['PMTSD', 'LIDARSD'], max_bandwidth=50e6)
+        >>> # pending: pandas.DataFrame with the columns 'url', 'file_name', 'fileSize' and optional
+        >>> # 'file_size', 'dataProductCode', 'dateFrom'
+        >>> threading.Thread(target=scheduler.download, args=(pending,)).start()
+        >>> scheduler.progress()['total']  # {'files': ..., 'bytes_done': ..., 'throughput': ...}
+        """
+        for i in sort_by:
+            if i not in ['priority', 'recency', 'size']:
+                raise ValueError(f"sort_by must be any of 'priority', 'recency', 'size'. Got: {i}")
+        self.sort_by = sort_by
+        if isinstance(product_priority, (list, tuple)):
+            product_priority = {j: i for i, j in enumerate(product_priority)}
+        self.product_priority = product_priority or {}
+        self.small_file_size = small_file_size
+
+        bandwidth_limiter = BandwidthLimiter(max_bandwidth)
+        self.downloader = {'fast': FileDownloader(thread_n=fast_lane_n, **kwargs),
+                           'slow': FileDownloader(thread_n=slow_lane_n, **kwargs)}
+        for i in self.downloader.values():
+            i.bandwidth_limiter = bandwidth_limiter
+
+        self._lock_ = threading.Lock()
+        self.metrics = {}  # {lane: {'files': ..., 'files_done': ..., ...}}, see progress()
+
+    def order(self, pending):
+        """Sort the pending files by `sort_by`. Keys with missing columns are skipped.
+        PARAMETER
+        ---------
+        pending: pandas.DataFrame
+            the files to download
+        RETURNS
+        -------
+        pending: pandas.DataFrame
+            the sorted dataframe
+        """
+        columns = {'priority': 'dataProductCode', 'recency': 'dateFrom', 'size': 'fileSize'}
+        sort_by = [i for i in self.sort_by if columns[i] in pending]
+        if not sort_by:
+            return pending
+
+        keys = {}
+        if 'priority' in sort_by:
+            keys['priority'] = pending['dataProductCode'].astype(object).map(self.product_priority).fillna(
+                len(self.product_priority)).to_numpy()
+        if 'recency' in sort_by:
+            keys['recency'] = pending['dateFrom'].to_numpy()
+        if 'size' in sort_by:
+            keys['size'] = pending['fileSize'].to_numpy()
+
+        keys = pandas.DataFrame(keys)
+        positions = keys.sort_values(sort_by, ascending=[i != 'recency' for i in sort_by], kind='stable').index
+        return pending.iloc[positions.to_numpy()]
+
+    def progress(self):
+        """The progress and throughput per lane and in total.
+        RETURNS
+        -------
+        progress: dict
+            {'fast': {...}, 'slow': {...}, 'total': {...}} with: 'files', 'files_done', 'files_failed', 'bytes',
+            'bytes_done', 'elapsed' in seconds and 'throughput' in bytes/s.
+        """
+        with self._lock_:
+            progress = {i: dict(j) for i, j in self.metrics.items()}
+
+        now = time.monotonic()
+        total = {'files': 0, 'files_done': 0, 'files_failed': 0, 'bytes': 0, 'bytes_done': 0, 'elapsed': 0.}
+        for lane_i in progress.values():
+            lane_i['elapsed'] = (lane_i.pop('time_stop') or now) - lane_i.pop('time_start')
+            lane_i['throughput'] = lane_i['bytes_done'] / lane_i['elapsed'] if lane_i['elapsed'] > 0 else 0.
+            for i in total:
+                total[i] = max(total[i], lane_i[i]) if i == 'elapsed' else total[i] + lane_i[i]
+        total['throughput'] = total['bytes_done'] / total['elapsed'] if total['elapsed'] > 0 else 0.
+        progress['total'] = total
+        return progress
+
+    def __download_item__(self, item, lane):
+        try:
+            self.downloader[lane].download(item['url'], item['file_name'], file_size=item.get('file_size'))
+        except Exception:
+            with self._lock_:
+                self.metrics[lane]['files_failed'] += 1
+            raise
+
+        with self._lock_:
+            self.metrics[lane]['files_done'] += 1
+            self.metrics[lane]['bytes_done'] += os.path.getsize(item['file_name'])
+
+    def __run_lane__(self, lane, items, errors):
+        sjt = ShareJobThreads(thread_n=self.downloader[lane].thread_n, unit='files', progress_bar=False)
+        sjt.do(self.__download_item__, items, lane=lane)
+        with self._lock_:
+            errors.update({items[i]['file_name']: err for i, err in sjt.errors.items()})
+            self.metrics[lane]['time_stop'] = time.monotonic()
+
+    def download(self, pending, progress_bar=True):
+        """Download the pending files in the scheduled order on both lanes.
+        PARAMETER
+        ---------
+        pending: pandas.DataFrame
+            the files to download with the columns 'url', 'file_name', 'fileSize' and optional 'file_size' (the valid
+            sizes, see FileDownloader.download), 'dataProductCode' and 'dateFrom' for the order.
+        progress_bar: bool, optional
+            if a progress bar of the downloaded bytes is shown. Default: True.
+        RETURNS
+        -------
+        errors: dict
+            {file_name: exception} of the failed downloads
+        """
+        import tqdm
+
+        pending = self.order(pending)
+        columns = [i for i in ['url', 'file_name', 'file_size'] if i in pending]
+        mask_small = (pending['fileSize'] <= self.small_file_size).to_numpy()
+
+        errors = {}
+        thread_list = []
+        time_start = time.monotonic()
+        for lane, mask in zip(self.lanes, [mask_small, ~mask_small]):
+            items = pending.loc[mask, columns].to_dict('records')
+            with self._lock_:
+                self.metrics[lane] = {'files': len(items), 'files_done': 0, 'files_failed': 0,
+                                      'bytes': float(pending.loc[mask, 'fileSize'].sum()), 'bytes_done': 0,
+                                      'time_start': time_start, 'time_stop': None}
+            thread_list.append(threading.Thread(target=self.__run_lane__, args=(lane, items, errors), daemon=True))
+            thread_list[-1].start()
+
+        with tqdm.tqdm(total=float(pending['fileSize'].sum()), unit='B', unit_scale=True, smoothing=0,
+                       disable=not progress_bar) as bar:
+            while any(i.is_alive() for i in thread_list):
+                for i in thread_list:
+                    i.join(timeout=.5)
+                progress = self.progress()
+                bar.update(progress['total']['bytes_done'] - bar.n)
+                bar.set_postfix({i: f"{progress[i]['files_done']}/{progress[i]['files']}" for i in self.lanes})
+
+        return errors
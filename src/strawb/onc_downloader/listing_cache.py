@@ -0,0 +1,207 @@
+import gzip
+import os
+import pickle
+import threading
+
+import pandas
+
+from ..tools import pd_timestamp_convert
+
+
+class ListingCache:
+    def __init__(self, file_name=None, overlap=pandas.Timedelta('1D')):
+        """A persistent cache of the ONC file listings (`getListByDevice`) per deviceCode. For each device it stores
+        the listed files, the covered time window and the high-water marks, i.e. the latest 'dateTo' and
+        'archivedDate' of the listed files. A repeated listing only queries ONC from the 'dateTo' high-water mark minus
+        `overlap` (`query_window`), and the window before only for files archived since the 'archivedDate'
+        high-water mark minus `overlap` (`query_archived`). The result is merged into the cached files, instead of
+        listing the whole window again.
+
+        PARAMETER
+        ---------
+        file_name: str or None, optional
+            the file where the cache is stored, e.g. next to the sync DB. The cache is loaded from the file on the
+            first access. None (default) keeps the cache only in memory.
+        overlap: pandas.Timedelta, optional
+            the time before the high-water marks which is listed again. Default: 1 day.
+
+        EXAMPLE
+        -------
+        >>> onc_downloader = strawb.ONCDownloader()
+        >>> onc_downloader.listing_cache = ListingCache('onc_listing.pkl.gz')
+        >>> onc_downloader.get_files_structured(date_from='strawb_all')  # first call: lists the whole window
+        >>> onc_downloader.get_files_structured(date_from='strawb_all')  # afterwards: lists only the delta
+        """
+        self.file_name = file_name
+        self.overlap = pandas.Timedelta(overlap)
+
+        self._devices_ = None  # {deviceCode: entry}, loaded on the first access, see `self.devices`
+        self._lock_ = threading.RLock()
+
+    @property
+    def devices(self):
+        """The cache per deviceCode as dict. Each entry is a dict with the keys:
+        'date_from', 'date_to' (the covered window), 'dateTo', 'archivedDate' (the high-water marks) and
+        'files' ({filename: file dict as returned by ONC})."""
+        with self._lock_:
+            if self._devices_ is None:
+                self.load()
+            return self._devices_
+
+    def load(self):
+        """Load the cache from `self.file_name`. If the file doesn't exist, the cache is empty."""
+        with self._lock_:
+            self._devices_ = {}
+            if self.file_name is not None and os.path.exists(self.file_name):
+                with gzip.open(self.file_name, 'rb') as f:
+                    self._devices_ = pickle.load(f)
+
+    def save(self):
+        """Save the cache to `self.file_name`. The file is written to a temporary file first and replaced at once,
+        that an interrupted sync doesn't leave a broken cache."""
+        if self.file_name is None or self._devices_ is None:
+            return
+        with self._lock_:
+            tmp_file_name = self.file_name + '.tmp'
+            with gzip.open(tmp_file_name, 'wb') as f:
+                pickle.dump(self._devices_, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file_name, self.file_name)
+
+    def clear(self, dev_code=None):
+        """Remove the cache of the dev_code, or of all devices if dev_code is None (default)."""
+        with self._lock_:
+            if dev_code is None:
+                self._devices_ = {}
+            else:
+                self.devices.pop(dev_code, None)
+
+    def query_window(self, dev_code, date_from, date_to, reconcile=False):
+        """Returns the window (date_from, date_to) which has to be listed from ONC for the dev_code. That's the full
+        window if the device isn't cached, if the window starts before the cached window, or if reconcile is True.
+        Otherwise, it starts at the high-water mark minus `self.overlap`.
+
+        PARAMETER
+        ---------
+        dev_code: str
+            the ONC deviceCode
+        date_from, date_to: str, datetime, pandas.Timestamp
+            the requested window
+        reconcile: bool, optional
+            if True, the full window is listed. Default: False.
+
+        RETURNS
+        -------
+        date_from, date_to: pandas.Timestamp
+            the window to list, with tz UTC
+        """
+        date_from, date_to = pd_timestamp_convert(date_from), pd_timestamp_convert(date_to)
+
+        with self._lock_:
+            entry = self.devices.get(dev_code)
+            if reconcile or entry is None or date_from < entry['date_from']:
+                return date_from, date_to
+
+            high_water = entry['date_to']
+            if entry['dateTo'] is not None:
+                high_water = min(high_water, entry['dateTo'])
+            return max(date_from, min(high_water - self.overlap, date_to)), date_to
+
+    def query_archived(self, dev_code, date_from, date_to, reconcile=False):
+        """Returns the window (date_from, date_to) and the archive date (archived_from), which has to be listed from
+        ONC for the dev_code in addition to `query_window`. That's the part of the window before the delta window,
+        listed only for files archived since the 'archivedDate' high-water mark minus `self.overlap`, i.e. files
+        which are archived late. It is None, if `query_window` lists the full window or there is no high-water mark.
+
+        PARAMETER
+        ---------
+        dev_code: str
+            the ONC deviceCode
+        date_from, date_to: str, datetime, pandas.Timestamp
+            the requested window
+        reconcile: bool, optional
+            if True, the full window is listed by `query_window`. Default: False.
+
+        RETURNS
+        -------
+        date_from, date_to, archived_from: pandas.Timestamp or None
+            the window and the archive date to list (ONC filter 'dateArchivedFrom'), with tz UTC, or None
+        """
+        date_from = pd_timestamp_convert(date_from)
+        window_from, _ = self.query_window(dev_code, date_from, date_to, reconcile=reconcile)
+
+        with self._lock_:
+            entry = self.devices.get(dev_code)
+            if window_from <= date_from or entry is None or entry['archivedDate'] is None:
+                return None
+            return date_from, window_from, entry['archivedDate'] - self.overlap
+
+    def update(self, dev_code, files, date_from, date_to, reconcile=False):
+        """Merge the listed files of the window into the cache of the dev_code. Files with the same 'filename' are
+        replaced. With reconcile=True, cached files within the window which aren't listed anymore, are removed.
+
+        PARAMETER
+        ---------
+        dev_code: str
+            the ONC deviceCode
+        files: list[dict]
+            the files from the ONC listing, i.e. `getListByDevice(...)['files']` with 'returnOptions': 'all'
+        date_from, date_to: str, datetime, pandas.Timestamp
+            the listed window
+        reconcile: bool, optional
+            if the listing is a full reconcile of the window. Default: False.
+        """
+        date_from, date_to = pd_timestamp_convert(date_from), pd_timestamp_convert(date_to)
+
+        with self._lock_:
+            entry = self.devices.get(dev_code)
+            if entry is None:
+                entry = {'date_from': date_from, 'date_to': date_to, 'dateTo': None, 'archivedDate': None,
+                         'files': {}}
+                self.devices[dev_code] = entry
+
+            elif reconcile:
+                mask = self._mask_window_(entry['files'].values(), date_from, date_to)
+                entry['files'] = {k: v for (k, v), m_i in zip(entry['files'].items(), mask) if not m_i}
+
+            entry['files'].update({i['filename']: i for i in files})
+            entry['date_from'] = min(entry['date_from'], date_from)
+            entry['date_to'] = max(entry['date_to'], date_to)
+
+            # the high-water marks over all cached files
+            for key_i in ['dateTo', 'archivedDate']:
+                times = pandas.to_datetime([i.get(key_i) for i in entry['files'].values()], utc=True)
+                entry[key_i] = None if times.isna().all() else times.max()
+
+    def get_files(self, dev_code, date_from, date_to):
+        """Returns the cached files of the dev_code which overlap with the window [date_from, date_to].
+
+        PARAMETER
+        ---------
+        dev_code: str
+            the ONC deviceCode
+        date_from, date_to: str, datetime, pandas.Timestamp
+            the window
+
+        RETURNS
+        -------
+        files: list[dict]
+            the files as dict like the ONC listing returns them
+        """
+        with self._lock_:
+            entry = self.devices.get(dev_code)
+            if entry is None:
+                return []
+
+            files = list(entry['files'].values())
+            mask = self._mask_window_(files, pd_timestamp_convert(date_from), pd_timestamp_convert(date_to))
+            return [i for i, m_i in zip(files, mask) if m_i]
+
+    @staticmethod
+    def _mask_window_(files, date_from, date_to):
+        """A mask of the files (list of dicts) which overlap with the window [date_from, date_to]."""
+        files = list(files)
+        if not files:
+            return []
+        file_from = pandas.to_datetime([i['dateFrom'] for i in files], utc=True)
+        file_to = pandas.to_datetime([i['dateTo'] for i in files], utc=True)
+        return (file_to >= date_from) & (file_from <= date_to)
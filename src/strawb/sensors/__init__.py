@@ -1,10 +1,38 @@
-from .camera import Camera
-from .module import Module
-from .lidar import Lidar
-from .pmtspec import PMTSpec
-from .minispec import MiniSpectrometer
-from .adcp import ADCP
-from .muontracker import MuonTracker
+import importlib
+
+# Sensor classes are loaded lazily on first access, i.e. `strawb.sensors.Camera` imports cv2, shapely, healpy, ...
+# only when it's used. {attribute: submodule}
+_lazy_attributes_ = {
+    'Camera': '.camera',
+    'Module': '.module',
+    'Lidar': '.lidar',
+    'PMTSpec': '.pmtspec',
+    'MiniSpectrometer': '.minispec',
+    'ADCP': '.adcp',
+    'MuonTracker': '.muontracker',
+}
+
+# Submodules which are loaded lazily on first access, i.e. `strawb.sensors.camera` works without an explicit import
+_lazy_submodules_ = ['adcp', 'camera', 'lidar', 'minispec', 'module', 'muontracker', 'pmtspec', 'sdom']
+
+__all__ = list(_lazy_attributes_)
+
+
+def __getattr__(name):
+    """Import the attribute or submodule on first access and cache it in the module namespace (PEP 562)."""
+    if name in _lazy_attributes_:
+        value = getattr(importlib.import_module(_lazy_attributes_[name], __name__), name)
+    elif name in _lazy_submodules_:
+        value = importlib.import_module(f'.{name}', __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()).union(_lazy_attributes_, _lazy_submodules_))
 
 
 # class BaseSensor:
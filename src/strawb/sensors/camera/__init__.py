@@ -4,6 +4,7 @@ from typing import Union
 from .file_handler import FileHandler
 from .images import Images
 from .find_cluster import FindCluster
+from .pixel_statistic import PixelStatistic
 from .tools import *
 from .config import Config
 from .distortion import SphereDistortion
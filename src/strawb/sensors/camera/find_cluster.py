@@ -1,3 +1,5 @@
+import concurrent.futures
+
 import numpy as np
 import scipy.ndimage
 import cv2
@@ -5,11 +7,12 @@ import pandas as pd
 import tqdm.notebook
 
 from strawb.tools import asdatetime
+from .pixel_statistic import PixelStatistic
 
 
 class FindCluster:
     def __init__(self, camera, min_std=3, min_size_cluster=3, max_gaps=2,
-                 pixel_mean=None, pixel_std=None, images=None, eff_margin=True):
+                 pixel_mean=None, pixel_std=None, images=None, eff_margin=True, pixel_statistic=None):
         """
         Parameters
         ----------
@@ -25,9 +28,12 @@ class FindCluster:
             Array of all available images. If None, create arrays at initialisation.
             Or provide the data, can speed things up.
         pixel_mean, pixel_std: numpy.ndarray, optional
-            If None, create arrays at initialisation. Or provide the data, can speed things up.
+            If None, take them from `pixel_statistic`. Or provide the data, can speed things up.
         eff_margin: bool, optional
             if pixel should be cut by the effective margin. Default, True.
+        pixel_statistic: PixelStatistic, optional
+            the statistic for pixel_mean and pixel_std, e.g. loaded with `PixelStatistic.load` for a device and month.
+            If None, it's calculated from the images, where the frames are streamed in chunks from the file.
         """
 
         self.camera = camera
@@ -41,8 +47,12 @@ class FindCluster:
         # mean brightness & standard deviation per pixel averaged over all available pictures
         self._pixel_mean_ = pixel_mean
         self._pixel_std_ = pixel_std
+        self._pixel_statistic_ = pixel_statistic
 
         self._pixel_rgb_mask_ = None
+        self._pixel_color_id_ = None  # 0: red, 1: green, 2: blue per pixel, see `_get_label_sums_`
+        self._pixel_coordinates_ = None  # the pixel x and y index, flattened, see `get_features`
+        self._pixel_inv_std_ = None  # 1 / pixel_std, and 1 where pixel_std == 0, see `_get_label_sums_`
 
     def __del__(self):
         """Remove links to other classes to prevent deadlock."""
@@ -50,16 +60,15 @@ class FindCluster:
         del self._images_
         del self._pixel_mean_
         del self._pixel_std_
+        del self._pixel_statistic_
 
     @property
     def pixel_rgb_mask(self):
         if self._pixel_rgb_mask_ is None:
-            self._pixel_rgb_mask_ = [self.camera.images.get_raw_rgb_mask(self.images.shape[1:], 'red',
-                                                                         eff_margin=self.eff_margin),
-                                     self.camera.images.get_raw_rgb_mask(self.images.shape[1:], 'green',
-                                                                         eff_margin=self.eff_margin),
-                                     self.camera.images.get_raw_rgb_mask(self.images.shape[1:], 'blue',
-                                                                         eff_margin=self.eff_margin)
+            shape = np.shape(self.pixel_mean)  # doesn't load the images
+            self._pixel_rgb_mask_ = [self.camera.images.get_raw_rgb_mask(shape, 'red', eff_margin=self.eff_margin),
+                                     self.camera.images.get_raw_rgb_mask(shape, 'green', eff_margin=self.eff_margin),
+                                     self.camera.images.get_raw_rgb_mask(shape, 'blue', eff_margin=self.eff_margin)
                                      ]
         return self._pixel_rgb_mask_
 
@@ -75,11 +84,30 @@ class FindCluster:
     def pixel_blue_mask(self):
         return self.pixel_rgb_mask[2]
 
+    @property
+    def pixel_statistic(self):
+        """Mean and standard deviation per pixel over all available pictures as PixelStatistic. If the images aren't
+        loaded, the frames are streamed in chunks from the file."""
+        if self._pixel_statistic_ is None:
+            if self._images_ is not None:
+                self._pixel_statistic_ = PixelStatistic().add(self._images_)
+            else:
+                self._pixel_statistic_ = self.camera.images.cal_pixel_statistic(eff_margin=self.eff_margin)
+        return self._pixel_statistic_
+
+    @pixel_statistic.setter
+    def pixel_statistic(self, value):
+        """Setter for the PixelStatistic, resets pixel_mean and pixel_std."""
+        self._pixel_statistic_ = value
+        self._pixel_mean_ = None
+        self._pixel_std_ = None
+        self._pixel_inv_std_ = None
+
     @property
     def pixel_mean(self):
         """Mean brightness per pixel averaged over all available pictures"""
         if self._pixel_mean_ is None:
-            self._pixel_mean_ = np.mean(self.images, axis=0)
+            self._pixel_mean_ = self.pixel_statistic.mean
         return self._pixel_mean_
 
     @pixel_mean.setter
@@ -91,13 +119,14 @@ class FindCluster:
     def pixel_std(self):
         """Standard deviation per pixel averaged over all available pictures"""
         if self._pixel_std_ is None:
-            self._pixel_std_ = np.std(self.images, axis=0)
+            self._pixel_std_ = self.pixel_statistic.std
         return self._pixel_std_
 
     @pixel_std.setter
     def pixel_std(self, value):
         """Setter for standard deviation per pixel averaged over all available pictures"""
         self._pixel_std_ = value
+        self._pixel_inv_std_ = None
 
     @property
     def images(self):
@@ -143,33 +172,71 @@ class FindCluster:
             min_size_cluster = self.min_size_cluster
         if max_gaps is None:
             max_gaps = self.max_gaps
+        mask_mounting = self._get_mask_mounting_(mask_mounting)
+
+        # create a map with values True if the deviation from mean in sigma is >= min_std, else False
+        z = self.images[pic_index] >= self.get_threshold(min_std)
+
+        if mask_mounting is not None:
+            # all mask_mounting==False should be set to False in dev
+            z[~mask_mounting] = 0
+
+        return self.label_cluster(z, min_size_cluster=min_size_cluster, max_gaps=max_gaps)
+
+    def _get_mask_mounting_(self, mask_mounting):
+        """Converts the mask_mounting parameter, see `get_cluster`, into a ndarray or None."""
         if isinstance(mask_mounting, bool):
             if mask_mounting:
-                if len(self.camera.config.mask_mounting.shape) == len(self.images[0].shape) and \
-                        np.all(np.array(self.camera.config.mask_mounting.shape) == np.array(self.images[0].shape)):
+                shape = np.shape(self.pixel_mean)  # doesn't load the images
+                if self.camera.config.mask_mounting.shape == shape:
                     mask_mounting = self.camera.config.mask_mounting
                 else:
                     print(f'Provided mask_mounting (shape: {self.camera.config.mask_mounting.shape}) has incompatible ',
-                          f'shape to image (shape: {self.images[0].shape})')
+                          f'shape to image (shape: {shape})')
                     mask_mounting = None
             else:
                 mask_mounting = None
-        elif isinstance(mask_mounting, np.ndarray):
-            pass
+        return mask_mounting
+
+    def get_threshold(self, min_std=None):
+        """The brightness per pixel from which a pixel is considered as bright, i.e. pixel_mean + min_std * pixel_std.
+        A pixel with a deviation from mean in sigma >= min_std is bright, if `image >= threshold`. Pixel with
+        pixel_std == 0 are never bright, unless min_std <= 0.
 
-        # create 2d-array with the deviation from mean in sigma for the selected picture
-        dev = np.zeros_like(self.images[0], dtype=np.float64)
-        mask = self.pixel_std != 0
-        dev[mask] = (self.images[pic_index, mask] - self.pixel_mean[mask]) / self.pixel_std[mask]
+        Parameters
+        ----------
+        min_std : int, optional
+            Minimum multiple of the standard deviation for a pixel to be considered as bright. If None, take from init.
 
-        # create a map with values True if the deviation is >= min_std, else False
-        z = dev >= min_std
-        del dev
+        Returns
+        -------
+        numpy.ndarray
+            the threshold per pixel as float32
+        """
+        if min_std is None:
+            min_std = self.min_std
+        threshold = (self.pixel_mean + min_std * self.pixel_std).astype(np.float32)
+        threshold[self.pixel_std == 0] = -np.inf if min_std <= 0 else np.inf
+        return threshold
 
-        if mask_mounting is not None:
-            # all mask_mounting==False should be set to False in dev
-            z[~mask_mounting] = 0
+    @staticmethod
+    def label_cluster(z, min_size_cluster=3, max_gaps=2):
+        """Label the clusters of bright pixels in a bool image.
 
+        Parameters
+        ----------
+        z : numpy.ndarray
+            2d bool array with True for bright pixels.
+        min_size_cluster : int, optional
+            Minimum number of adjoining pixels to be considered a cluster.
+        max_gaps: int, optional
+            the maximum gap size within one cluster
+
+        Returns
+        -------
+        numpy.ndarray
+            Array in which all pixels of the same cluster are labeled with the same number.
+        """
         # create structure to fill gaps according to max_distance.
         # scipy.ndimage.measurements.label can only detect direct neighbours
         # if max_gaps == 0:
@@ -190,16 +257,14 @@ class FindCluster:
         labeled_cluster, num_clusters = scipy.ndimage.label(z_dil, structure=s)
         labeled_cluster[z == 0] = 0  # add all False in z to background (label 0)
 
-        counts = np.bincount(labeled_cluster.astype(np.int64).flatten())
-        counts = counts[labeled_cluster.astype(np.int64)].reshape((labeled_cluster.shape[0],
-                                                                   labeled_cluster.shape[1]))
+        counts = np.bincount(labeled_cluster.ravel())
 
         # add too small cluster to label 0, in other words, remove the cluster and set is as background
-        labeled_cluster[counts < min_size_cluster] = 0
+        labeled_cluster[counts[labeled_cluster] < min_size_cluster] = 0
         return labeled_cluster
 
     @staticmethod
-    def get_box(mask_cluster):
+    def get_box(mask_cluster=None, points=None):
         """Calculates the minimum box features of a 2D bool array covering all True values.
         The parameters returned are: box_center, box_size_x, box_size_y, and angle.
 
@@ -207,6 +272,8 @@ class FindCluster:
         ---------
         mask_cluster: ndarray
             2d bool array. The box represents the minimum box around all True values.
+        points: ndarray, optional
+            the indexes of the True values, i.e. np.argwhere(mask_cluster), instead of mask_cluster.
 
         EXAMPLE
         -------
@@ -216,7 +283,9 @@ class FindCluster:
         >>>                         (box_dict['box_size_x'], box_dict['box_size_y']),
         >>>                         box_dict['angle']))
         """
-        box = cv2.minAreaRect(np.argwhere(mask_cluster))
+        if points is None:
+            points = np.argwhere(mask_cluster)
+        box = cv2.minAreaRect(points)
         return {'angle': float(box[2]),
                 **{f'box_center_{l}': box[0][i] for i, l in enumerate(['x', 'y'])},
                 **{f'box_size_{l}': box[1][i] for i, l in enumerate(['x', 'y'])},
@@ -284,12 +353,12 @@ class FindCluster:
 
         return mean_abs_dev, sigma_dev
 
-    def get_cluster_specs(self, pic_index, labels, index, color=None):
+    def get_cluster_specs(self, pic_index, labels, index, color=None, image=None):
         """
         Parameters
         ----------
         pic_index : ndarray
-            Index of the image in images.
+            Index of the image in images. Ignored, if image is provided.
         labels : array_like, optional
             Array of labels of same shape, or broadcastable to the same shape as
             `image`. All elements sharing the same label form one region over
@@ -301,55 +370,61 @@ class FindCluster:
         color: None or str, optional
             allowed inputs are None or one strings of ['red', 'green', 'blue']. If a color is specified the statistic is
              computed for the pixel with the color, only.
+        image: ndarray, optional
+            the image, e.g. if it isn't in images. If None (default), it takes images[pic_index].
         """
-        color_mask = None
-        if color == 'red':
-            color_mask = self.pixel_red_mask
-        elif color == 'green':
-            color_mask = self.pixel_green_mask
-        elif color == 'blue':
-            color_mask = self.pixel_blue_mask
-
-        labels_c = labels[color_mask]
-        index_present = np.unique(labels_c)  # unique labels which are present in labels (because of masking)
-        _, ind, _ = np.intersect1d(index,  # all unique labels
-                                   index_present,  # unique labels which are present in labels (because of masking)
-                                   return_indices=True,  # returns the indexes of input arrays (here: ind, _)
-                                   assume_unique=True)
-        image = self.images[pic_index][color_mask]
+        if image is None:
+            image = self.images[pic_index]
 
-        # absolute deviation from mean for each pixel
-        # abs_dev = np.abs(self.images[pic_index].astype(np.float64) - self.pixel_mean)
-        abs_dev = image.astype(np.float64) - self.pixel_mean[color_mask]
+        sums = self._get_label_sums_(image, labels, np.asarray(index))
+        return self._get_specs_(sums, color=color)
 
-        # mean absolute deviation for the cluster
-        # np.nan if the label isn't in labels (because of masking)
-        mean_abs_dev = np.zeros_like(index, dtype=float) + np.nan
-        mean_abs_dev[ind] = scipy.ndimage.mean(abs_dev, labels=labels_c, index=index_present)
+    def _get_label_sums_(self, image, labels, index):
+        """The number of pixel and the sums of the pixel values per label and color, with one np.bincount per
+        quantity for all colors. The label and the color of a pixel are combined to one bin: label * 3 + color.
 
-        abs_dev = abs_dev / np.ma.masked_equal(self.pixel_std[color_mask], 0)
-        sigma_dev = np.zeros_like(index, dtype=float) + np.nan
-        sigma_dev[ind] = scipy.ndimage.mean(abs_dev, labels=labels_c, index=index_present)
-
-        # mean_abs_dev, sigma_dev = self.get_sigma_deviation(pic_index=pic_index,
-        #                                                    labels=labels,
-        #                                                    index=index,
-        #                                                    color=color)
-
-        n_pixel = np.zeros_like(index, dtype=int)
-        n_pixel[ind] = scipy.ndimage.sum(np.ones_like(image, dtype=np.uint32),
-                                         labels=labels_c,
-                                         index=index_present)
+        RETURNS
+        -------
+        dict
+            {quantity: ndarray} with the shape [len(index), 4], where the columns are: all, red, green, blue
+        """
+        if self._pixel_color_id_ is None:
+            color_id = np.zeros(np.shape(self.pixel_mean), dtype=np.intp)
+            color_id[self.pixel_green_mask] = 1
+            color_id[self.pixel_blue_mask] = 2
+            self._pixel_color_id_ = color_id.ravel()
+        if self._pixel_inv_std_ is None:
+            pixel_std = np.asarray(self.pixel_std, dtype=np.float64)
+            self._pixel_inv_std_ = np.divide(1., pixel_std, out=np.ones_like(pixel_std),
+                                             where=pixel_std != 0).ravel()
+
+        n_labels = int(max(labels.max(), np.max(index, initial=0))) + 1
+        bins = labels.ravel().astype(np.intp) * 3 + self._pixel_color_id_
+
+        def sum_per_color(weights=None):
+            sums = np.bincount(bins, weights=weights, minlength=3 * n_labels).reshape(n_labels, 3)[index]
+            return np.column_stack([sums.sum(axis=1), sums])
+
+        pixel_mean = np.ravel(self.pixel_mean)
+        image = image.ravel().astype(np.float64)
+        deviation = image - pixel_mean
+        return {'n_pixel': sum_per_color(),
+                'noise': sum_per_color(pixel_mean),
+                'charge_with_noise': sum_per_color(image),
+                'deviation': sum_per_color(deviation),
+                'deviation_sigma': sum_per_color(deviation * self._pixel_inv_std_)}
 
-        noise = np.zeros_like(index, dtype=float)
-        noise[ind] = scipy.ndimage.sum(self.pixel_mean[color_mask],
-                                       labels=labels_c,
-                                       index=index_present)
+    @staticmethod
+    def _get_specs_(sums, color=None):
+        """The cluster specs, see `get_cluster_specs`, from the sums of `_get_label_sums_` for a color."""
+        column = [None, 'red', 'green', 'blue'].index(color)
+        n_pixel = sums['n_pixel'][:, column]
+        present = n_pixel > 0  # labels which are present in the color
 
-        charge_with_noise = np.zeros_like(index, dtype=float) + np.nan
-        charge_with_noise[ind] = scipy.ndimage.sum(image,
-                                                   labels=labels_c,
-                                                   index=index_present)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # mean absolute deviation for the cluster, np.nan if the label isn't in labels (because of masking)
+            mean_abs_dev = np.where(present, sums['deviation'][:, column] / n_pixel, np.nan)
+            sigma_dev = np.where(present, sums['deviation_sigma'][:, column] / n_pixel, np.nan)
 
         color_str = ""
         if color is not None:
@@ -358,8 +433,8 @@ class FindCluster:
         # sn: signal-to-noise
         specs_dict = {
             f'n_pixel{color_str}': n_pixel.astype(np.int32),
-            f'noise{color_str}': noise,
-            f'charge_with_noise{color_str}': charge_with_noise,
+            f'noise{color_str}': sums['noise'][:, column],
+            f'charge_with_noise{color_str}': np.where(present, sums['charge_with_noise'][:, column], np.nan),
             f'sn_mean_deviation{color_str}': mean_abs_dev,
             f'sn_mean_deviation_sigma{color_str}': sigma_dev,
         }
@@ -401,65 +476,170 @@ class FindCluster:
                                   min_size_cluster=min_size_cluster,
                                   max_gaps=max_gaps,
                                   mask_mounting=mask_mounting)
-        index = np.unique(labels)
-
-        data_dict = self.get_cluster_specs(pic_index, labels, index, color=None)
-        data_dict.update(self.get_cluster_specs(pic_index, labels, index, color='red'))
-        data_dict.update(self.get_cluster_specs(pic_index, labels, index, color='green'))
-        data_dict.update(self.get_cluster_specs(pic_index, labels, index, color='blue'))
-
-        # center_of_mass = np.array(scipy.ndimage.measurements.center_of_mass(
-        center_of_mass = np.array(scipy.ndimage.center_of_mass(
-            self.images[pic_index] - self.pixel_mean,
-            labels=labels,
-            index=index))
-        # center_of_pix = np.array(scipy.ndimage.measurements.center_of_mass(
-        center_of_pix = np.array(scipy.ndimage.center_of_mass(
-            np.ones_like(labels),
-            labels=labels,
-            index=index))
-
-        df = pd.DataFrame(
-            data={'time': asdatetime(self.camera.file_handler.time[pic_index]),
-                  'label': index,
-                  **{f'center_of_mass_{l}': center_of_mass[:, i] for i, l in enumerate(['x', 'y'])},
-                  **{f'center_of_pix_{l}': center_of_pix[:, i] for i, l in enumerate(['x', 'y'])},
-                  **data_dict,
-                  })
-
-        df_box = pd.json_normalize([self.get_box(labels == i) for i in index])
-        df = df.merge(df_box, left_index=True, right_index=True)
-        return df
 
-    def df_all(self, pic_index=None, progressbar=None, tqdm_kwargs=None, *args, **kwargs):
-        """Detect Cluster in multiple pictures.
+        return pd.DataFrame(data={'time': asdatetime(self.camera.file_handler.time[pic_index]),
+                                  **self.get_features(self.images[pic_index], labels)})
+
+    def get_features(self, image, labels):
+        """
+        Get the properties of all clusters in a picture, incl. the background (label 0).
+
+        Parameters
+        ----------
+        image : numpy.ndarray
+            the picture
+        labels : numpy.ndarray
+            the labels of the clusters in the picture, see `get_cluster`
+
+        Returns
+        -------
+        dict
+            {property: numpy.ndarray} with one entry per label
+        """
+        # all labels, present in the picture, without sorting all pixel (np.unique)
+        index = np.flatnonzero(np.bincount(labels.ravel()))
+
+        sums = self._get_label_sums_(image, labels, index)
+        data_dict = {}
+        for color in [None, 'red', 'green', 'blue']:
+            data_dict.update(self._get_specs_(sums, color=color))
+
+        # center of mass with the weights (image - pixel_mean) and of the pixel, from the sums of the coordinates
+        if self._pixel_coordinates_ is None:
+            self._pixel_coordinates_ = [i.ravel().astype(np.float64) for i in np.indices(np.shape(labels))]
+        labels_flat = labels.ravel()
+        weights = image.ravel() - np.ravel(self.pixel_mean)
+        minlength = index[-1] + 1
+        weights_sum = np.bincount(labels_flat, weights=weights, minlength=minlength)[index]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            center_of_mass = [np.bincount(labels_flat, weights=weights * i, minlength=minlength)[index] / weights_sum
+                              for i in self._pixel_coordinates_]
+            center_of_pix = [np.bincount(labels_flat, weights=i, minlength=minlength)[index] / sums['n_pixel'][:, 0]
+                             for i in self._pixel_coordinates_]
+
+        # the minimum box per cluster, only within the bounding box (slice) of each cluster
+        slices = scipy.ndimage.find_objects(labels)
+        box_list = []
+        for i in index:
+            if i == 0:  # background
+                points = np.argwhere(labels == 0)
+            else:
+                slice_x, slice_y = slices[i - 1]
+                points = np.argwhere(labels[slice_x, slice_y] == i) + [slice_x.start, slice_y.start]
+            box_list.append(self.get_box(points=points.astype(np.int32)))
+
+        return {'label': index,
+                **{f'center_of_mass_{l}': center_of_mass[i] for i, l in enumerate(['x', 'y'])},
+                **{f'center_of_pix_{l}': center_of_pix[i] for i, l in enumerate(['x', 'y'])},
+                **data_dict,
+                **{key_i: np.array([i[key_i] for i in box_list]) for key_i in box_list[0]},
+                }
+
+    def _load_images_(self, pic_index):
+        """Load the images of pic_index. If the images aren't loaded, only the requested frames are read from the
+        file."""
+        if self._images_ is not None:
+            return self._images_[pic_index]
+
+        images = self.camera.file_handler.raw.getunsorted(pic_index)
+        if self.eff_margin:
+            images = self.camera.images.cut2effective_pixel(images, axis=1)
+        return images
+
+    def __frame_features__(self, image, z, min_size_cluster, max_gaps):
+        """Label the clusters in a thresholded frame and get their properties."""
+        labels = self.label_cluster(z, min_size_cluster=min_size_cluster, max_gaps=max_gaps)
+        return self.get_features(image, labels)
+
+    def df_batch(self, pic_index=None, min_std=None, min_size_cluster=None, max_gaps=None, mask_mounting=False,
+                 batch_size=16, thread_n=4, progressbar=True, tqdm_kwargs=None):
+        """Detect Cluster in multiple pictures, batch by batch. Each batch of pictures is loaded and thresholded at
+        once, the clusters are labeled and their properties are extracted per picture in a thread pool, while the next
+        batch is loaded. The result is one DataFrame like `df_picture` for all pictures.
+
         PARAMETERS
         ----------
         pic_index: list, ndarray, optional
-            the indexes of the pictures to detect teh cluster. If None, take all
+            the indexes of the pictures to detect the cluster. If None, take all
+        min_std, min_size_cluster, max_gaps, mask_mounting: optional
+            see `df_picture`
+        batch_size: int, optional
+            the number of pictures which are loaded at once. Default: 16.
+        thread_n: int, optional
+            the number of threads. Default: 4.
         progressbar: bool, optional
-            if the loop should print a progressbar.
-            It supports module tqdm: i.e. progressbar=tqdm.notebook.tqdm, or progressbar=tqdm.tqdm
+            if a progressbar is shown. Default: True.
         tqdm_kwargs: dict, optional
-            kwargs for tqdm.notebook
-        *args, **kwargs: list, dict, optional
-            parsed to df_picture(...,*args, **kwargs)
-        """
-        if tqdm_kwargs is None:
-            tqdm_kwargs = {}
+            kwargs for tqdm.tqdm
 
-        df = pd.DataFrame()
+        Returns
+        -------
+        data frame
+            Table with all clusters in the pictures and their properties.
+        """
+        # in case it's not specified, take the default from init
+        if min_size_cluster is None:
+            min_size_cluster = self.min_size_cluster
+        if max_gaps is None:
+            max_gaps = self.max_gaps
+        mask_mounting = self._get_mask_mounting_(mask_mounting)
 
         if pic_index is None:
-            pic_index = np.arange(self.images.shape[0])
+            n_frames = self._images_.shape[0] if self._images_ is not None else self.camera.file_handler.raw.shape[0]
+            pic_index = np.arange(n_frames)
+        pic_index = np.atleast_1d(pic_index)
+
+        threshold = self.get_threshold(min_std)
+
+        # the properties per picture, in the order of pic_index
+        feature_list = [None] * len(pic_index)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=thread_n) as executor, \
+                tqdm.tqdm(total=len(pic_index), disable=not progressbar, **(tqdm_kwargs or {})) as bar:
+            futures = []
+            for start in range(0, len(pic_index), int(batch_size)):
+                images = self._load_images_(pic_index[start:start + int(batch_size)])
+                z = images >= threshold  # threshold the entire batch at once
+                if mask_mounting is not None:
+                    z &= mask_mounting
+
+                # collect the previous batch, while this batch is processed
+                self.__collect__(futures, feature_list, bar)
+                futures = [(start + i, executor.submit(self.__frame_features__, image_i, z_i,
+                                                       min_size_cluster, max_gaps))
+                           for i, (image_i, z_i) in enumerate(zip(images, z))]
+            self.__collect__(futures, feature_list, bar)
+
+        if not feature_list:
+            return pd.DataFrame()
+
+        # one DataFrame from all pictures
+        n_cluster = [len(i['label']) for i in feature_list]
+        time = asdatetime(np.asarray(self.camera.file_handler.time[:])[pic_index])
+        return pd.DataFrame(data={'time': np.repeat(time, n_cluster),
+                                  **{key_i: np.concatenate([i[key_i] for i in feature_list])
+                                     for key_i in feature_list[0]}})
+
+    @staticmethod
+    def __collect__(futures, feature_list, bar):
+        """Write the results of the futures [(position, future)] into feature_list."""
+        for position, future in futures:
+            feature_list[position] = future.result()
+            bar.update()
 
-        iterator = pic_index
+    def df_all(self, pic_index=None, progressbar=None, tqdm_kwargs=None, *args, **kwargs):
+        """Detect Cluster in multiple pictures, see `df_batch`.
+        PARAMETERS
+        ----------
+        pic_index: list, ndarray, optional
+            the indexes of the pictures to detect teh cluster. If None, take all
+        progressbar: bool, optional
+            if the loop should print a progressbar. None (default) shows it.
+        tqdm_kwargs: dict, optional
+            kwargs for tqdm.tqdm
+        *args, **kwargs: list, dict, optional
+            parsed to df_batch(...,*args, **kwargs), e.g. min_std, min_size_cluster, max_gaps, mask_mounting,
+            batch_size, thread_n
+        """
         if progressbar is None:
-            iterator = tqdm.tqdm(iterator, **tqdm_kwargs)
-        elif not progressbar:
-            iterator = progressbar(iterator, **tqdm_kwargs)
-
-        # loop with or without progress bar
-        for pic_i in iterator:
-            df = df.append(self.df_picture(pic_index=pic_i, *args, **kwargs), ignore_index=True)
-        return df
+            progressbar = True
+        return self.df_batch(pic_index, *args, progressbar=bool(progressbar), tqdm_kwargs=tqdm_kwargs, **kwargs)
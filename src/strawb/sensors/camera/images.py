@@ -1,10 +1,11 @@
+import concurrent.futures
 import os
-import shutil
 
 import cv2
 import numpy as np
 
 from .file_handler import FileHandler
+from .pixel_statistic import PixelStatistic
 from ...config_parser import Config
 
 
@@ -53,8 +54,7 @@ class Images:
     @property
     def integrated_raw(self):
         if self._integrated_raw is None:
-            self._integrated_raw = np.sum(self.file_handler.raw,
-                                          axis=(1, 2))  # sum over all pixels per image
+            self.cal_raw_statistic()  # sum over all pixels per image
 
         return self._integrated_raw
 
@@ -72,17 +72,30 @@ class Images:
             self.create_valid_mask()
         return self._valid_mask
 
-    def create_valid_mask(self, limit=None):
-        """Detect which images are corrupt if the integrated_raw is above the limit.
-        With limit=None it takes:
+    def get_valid_limit(self, limit=None):
+        """The limit of integrated_raw for the valid_mask. With limit=None it takes:
         For gain=50 end exposure time= ~60s: limit = 2e10
         For gain=30 end exposure time= ~60s: limit = 4e9
+        Otherwise, it returns None.
         """
         if limit is None and np.unique(self.file_handler.gain)[0] == 30.:
             limit = 4e9
         elif limit is None and np.unique(self.file_handler.gain)[0] == 50.:
             limit = 2e10
-        self._valid_mask = self.integrated_raw > limit
+        return limit
+
+    def create_valid_mask(self, limit=None):
+        """Detect which images are corrupt if the integrated_raw is above the limit.
+        With limit=None it takes:
+        For gain=50 end exposure time= ~60s: limit = 2e10
+        For gain=30 end exposure time= ~60s: limit = 4e9
+        """
+        valid_mask = self.integrated_raw > self.get_valid_limit(limit)
+        if self._valid_mask is not None and np.any(valid_mask != self._valid_mask):
+            # the dark frame depends on the valid frames
+            self._raw_dark_frame = None
+            self._integrated_minus_dark = None
+        self._valid_mask = valid_mask
 
     @property
     def raw_dark_frame(self):
@@ -93,27 +106,114 @@ class Images:
     def load_raw(self, index=None, exclude_invalid=True):
         """exclude_invalid only works with index=None"""
         index = self.get_index(index=index, exclude_invalid=exclude_invalid)
-        raw = self.file_handler.raw.getunsorted(index)
-        return raw[np.argsort(np.argsort(index))]  # revert sort
+        return self.file_handler.raw.getunsorted(index)  # in the order of index
 
-    def cal_integrated_minus_dark(self, ):
-        raw = self.load_raw(exclude_invalid=False)  # exclude_invalid=False as the length hast to match
-        raw = raw - self.raw_dark_frame  # subtract the dark frame
-        raw = self.cut2effective_pixel(raw, axis=1)
-        raw[raw < 4e4] = 0  # cut the noise
-        raw = raw ** 2  # Chi**2
-        return np.average(raw.reshape((raw.shape[0], -1)), axis=-1)
+    def cal_raw_statistic(self, n=None, limit=None, chunk_size=16):
+        """Reads the raw frames once in chunks and calculates in this pass: integrated_raw, valid_mask and the
+        raw_dark_frame from the 'n' most dim pictures, where valid pictures come first. Only the chunk and the 'n' dark
+        frame candidates are in memory.
+        PARAMETER
+        ---------
+        n: int, optional
+            the number of pictures for the dark frame. None (default) takes 10.
+        limit: float, optional
+            the limit for the valid_mask, see `create_valid_mask`.
+        chunk_size: int, optional
+            the number of frames per chunk. Default: 16.
+        """
+        if n is None:
+            n = 10
+        n = int(n)
+        limit = self.get_valid_limit(limit)
+
+        raw = self.file_handler.raw
+        integrated_raw = np.zeros(raw.shape[0], dtype=np.uint64)
+
+        # the candidates for the dark frame, sorted by (invalid, integrated_raw)
+        dark_key = np.zeros((0, 2))
+        dark_frames = np.zeros((0, *raw.shape[1:]), dtype=raw.dtype)
+        for i in range(0, raw.shape[0], int(chunk_size)):
+            chunk = raw[i:i + int(chunk_size)]
+            integrated_raw[i:i + len(chunk)] = np.sum(chunk, axis=(1, 2))  # sum over all pixels per image
+            if limit is None:
+                continue
+
+            key = np.column_stack([integrated_raw[i:i + len(chunk)] <= limit, integrated_raw[i:i + len(chunk)]])
+            dark_key = np.concatenate([dark_key, key])
+            dark_frames = np.concatenate([dark_frames, chunk])
+            order = np.lexsort(dark_key.T[::-1])[:n]  # keep the n darkest
+            dark_key, dark_frames = dark_key[order], dark_frames[order]
+
+        self._integrated_raw = integrated_raw
+        self._integrated_minus_dark = None
+        if limit is not None:
+            self._valid_mask = integrated_raw > limit
+            self._raw_dark_frame = np.average(dark_frames, axis=0)
+
+    def cal_integrated_minus_dark(self, chunk_size=16):
+        """The mean of (raw - raw_dark_frame)**2 per picture over the effective pixels, where differences below 4e4
+        are noise and set to 0. The raw frames are read in chunks with float32 temporaries.
+        PARAMETER
+        ---------
+        chunk_size: int, optional
+            the number of frames per chunk. Default: 16.
+        """
+        raw = self.file_handler.raw
+        raw_dark_frame = self.raw_dark_frame.astype(np.float32)
+
+        integrated_minus_dark = np.zeros(raw.shape[0], dtype=np.float64)
+        for i in range(0, raw.shape[0], int(chunk_size)):
+            chunk = raw[i:i + int(chunk_size)].astype(np.float32)
+            chunk -= raw_dark_frame  # subtract the dark frame
+            chunk = self.cut2effective_pixel(chunk, axis=1)
+            chunk[chunk < 4e4] = 0  # cut the noise
+            np.square(chunk, out=chunk)  # Chi**2
+            integrated_minus_dark[i:i + len(chunk)] = np.mean(chunk, axis=(1, 2), dtype=np.float64)
+        return integrated_minus_dark
 
     def cal_raw_dark_frame(self, n=None):
-        """Takes the 'n' most dim pictures in the series to calculate the dark frame"""
+        """Takes the 'n' most dim pictures in the series to calculate the dark frame. If integrated_raw isn't known,
+        it's calculated together with the dark frame in one pass, see `cal_raw_statistic`."""
         self._integrated_minus_dark = None
 
         if n is None:
             n = 10
         n = int(n)
-        integrated_raw_masked = np.ma.array(self.integrated_raw, mask=~self.valid_mask)
-        index = np.ma.argsort(integrated_raw_masked)  # masked items count as greatest
-        self._raw_dark_frame = np.average(self.load_raw(index[:n]), axis=0)  # n=10
+        if self._integrated_raw is None:
+            self.cal_raw_statistic(n=n)
+            if self._raw_dark_frame is not None:
+                return
+
+        # the most dim valid pictures, filled up with the most dim invalid ones
+        index = np.lexsort((self.integrated_raw, ~self.valid_mask))
+        self._raw_dark_frame = np.average(self.load_raw(index[:n], exclude_invalid=False), axis=0)  # n=10
+
+    def cal_pixel_statistic(self, index=None, exclude_invalid=False, eff_margin=False, chunk_size=16):
+        """Mean and standard deviation per pixel of the raw frames. The frames are read in chunks of `chunk_size`
+        frames, that only one chunk is in memory.
+        PARAMETER
+        ---------
+        index: List[int] or None, optional
+            the index of the frames. None (Default) takes all frames in the file.
+        exclude_invalid: bool, optional
+            if invalid frames, see `valid_mask`, are excluded. Default, False.
+        eff_margin: bool, list, ndarray, optional
+            if the frames are cut by the effective margin, see `cut2effective_pixel`. Default, False.
+        chunk_size: int, optional
+            the number of frames per chunk. Default: 16.
+        RETURNS
+        -------
+        pixel_statistic: PixelStatistic
+            with the properties `mean` and `std` per pixel
+        """
+        index = self.get_index(index=index, exclude_invalid=exclude_invalid)
+        pixel_statistic = PixelStatistic(device_code=self.file_handler.deviceCode)
+        for i in range(0, len(index), int(chunk_size)):
+            raw = self.file_handler.raw.getunsorted(index[i:i + int(chunk_size)])
+            if eff_margin is not False:
+                raw = self.cut2effective_pixel(raw, axis=1, eff_margin=eff_margin)
+            pixel_statistic.add(raw, chunk_size=chunk_size)
+        return pixel_statistic
 
     def get_index(self, index=None, exclude_invalid=True):
         if index is None:
@@ -171,9 +271,9 @@ class Images:
         RETURN
         ------
         reduced_rgb:
-            the rgb array with cut margins
+            the rgb array with cut margins, as view if rgb is a ndarray
         """
-        rgb = np.array(rgb)
+        rgb = np.asarray(rgb)
 
         if len(rgb.shape) < 2:
             raise ValueError(f'Array needs at leas 2 dimensions. Got shape: {rgb.shape}')
@@ -190,7 +290,7 @@ class Images:
         slices = (*[slice(None)] * axis,
                   slice(eff_margin[0], -eff_margin[1] if eff_margin[1] != 0 else None),
                   slice(eff_margin[2], -eff_margin[3] if eff_margin[3] != 0 else None))
-        return np.array(rgb)[slices]
+        return rgb[slices]
 
     def shift_effective_pixel(self, position, eff_margin=None, inverse=False):
         """
@@ -276,21 +376,91 @@ class Images:
         bgr = cv2.cvtColor(frame_raw.astype(np.uint16), self.bayer_pattern)  # cv2 exports BGR
         return bgr  # [:,:,::-1] BGR -> RGB
 
-    def load_rgb(self, index=None, subtract_dark=True, **kwargs):
+    def frames_raw_to_rgb(self, raw_arr, out=None, subtract_dark=True, executor=None, buffer=None,
+                          buffer_uint16=None):
+        """Demosaic multiple raw frames into RGB, like `frame_raw_to_rgb` per frame, but without a copy of the frames
+        per frame.
+        PARAMETER
+        ---------
+        raw_arr: ndarray
+            the raw frames, shape: [images, pix_x, pix_y]
+        out: ndarray, optional
+            the np.uint16 output buffer with the shape [images, pix_x, pix_y, RGB]. None (default), creates it.
+        subtract_dark: bool, optional
+            if the raw_dark_frame is subtracted and negative values are set to 0. Default: True.
+        executor: concurrent.futures.Executor, optional
+            if provided, cv2.cvtColor runs per frame in the executor, i.e. in parallel with a ThreadPoolExecutor as
+            cv2 releases the GIL.
+        buffer, buffer_uint16: ndarray, optional
+            a np.float32 and a np.uint16 buffer with at least the shape of raw_arr, to subtract the dark frame without
+            allocations.
+        RETURNS
+        -------
+        out: ndarray
+            the RGB frames as np.uint16 with the shape [images, pix_x, pix_y, RGB]
+        """
+        if out is None:
+            out = np.empty((*raw_arr.shape, 3), dtype=np.uint16)
 
-        raw_arr = self.load_raw(index, **kwargs)
+        if subtract_dark:
+            if buffer is None:
+                buffer = np.empty(raw_arr.shape, dtype=np.float32)
+            if buffer_uint16 is None:
+                buffer_uint16 = np.empty(raw_arr.shape, dtype=np.uint16)
+            buffer, buffer_uint16 = buffer[:raw_arr.shape[0]], buffer_uint16[:raw_arr.shape[0]]
+
+            np.subtract(raw_arr, self.raw_dark_frame.astype(np.float32), out=buffer, casting='unsafe')
+            np.maximum(buffer, 0, out=buffer)  # correct for negative entries
+            np.copyto(buffer_uint16, buffer, casting='unsafe')
+            raw_arr = buffer_uint16
+
+        raw_arr = raw_arr.astype(np.uint16, copy=False)
+        if executor is None:
+            for raw_i, out_i in zip(raw_arr, out):
+                cv2.cvtColor(raw_i, self.bayer_pattern, dst=out_i)  # cv2 exports BGR
+        else:
+            list(executor.map(lambda i: cv2.cvtColor(raw_arr[i], self.bayer_pattern, dst=out[i]),
+                              range(raw_arr.shape[0])))
+        return out
 
+    def load_rgb(self, index=None, subtract_dark=True, chunk_size=16, thread_n=4, **kwargs):
+        """Load the frames as RGB, cut to the effective pixels. The raw frames are read and demosaiced in chunks into
+        one preallocated np.uint16 array, with cv2.cvtColor in a thread pool.
+        PARAMETER
+        ---------
+        index: ndarray, optional
+            the indexes of the frames, see `get_index`. None (default), takes all.
+        subtract_dark: bool, optional
+            if the raw_dark_frame is subtracted. Default: True.
+        chunk_size: int, optional
+            the number of frames per chunk. Default: 16.
+        thread_n: int, optional
+            the number of threads for cv2.cvtColor. Default: 4.
+        **kwargs: optional
+            parsed to `get_index`, e.g. exclude_invalid
+        RETURNS
+        -------
+        image_arr: ndarray
+            the RGB frames as np.uint16, axes are: [images, pix_x, pix_y, RGB]. It's a view of the full frames.
+        """
+        index = self.get_index(index, **kwargs)
+        chunk_size = int(chunk_size)
+
+        shape = self.file_handler.raw.shape[1:]
+        image_arr = np.empty((len(index), *shape, 3), dtype=np.uint16)
+        buffer, buffer_uint16 = None, None
         if subtract_dark:
-            raw_arr = raw_arr - self.raw_dark_frame
+            buffer = np.empty((min(chunk_size, len(index)), *shape), dtype=np.float32)
+            buffer_uint16 = np.empty(buffer.shape, dtype=np.uint16)
 
-        image_list = []
-        for i, raw_i in enumerate(raw_arr):
-            image_list.append(self.frame_raw_to_rgb(raw_i))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=thread_n) as executor:
+            for i in range(0, len(index), chunk_size):
+                raw_arr = self.file_handler.raw.getunsorted(index[i:i + chunk_size])
+                self.frames_raw_to_rgb(raw_arr, out=image_arr[i:i + chunk_size], subtract_dark=subtract_dark,
+                                       executor=executor, buffer=buffer, buffer_uint16=buffer_uint16)
 
         # axes are: [images, pix_x, pix_y, RGB]
-        image_arr = self.cut2effective_pixel(image_list, axis=1)
-
-        return image_arr
+        return self.cut2effective_pixel(image_arr, axis=1)
 
     @staticmethod
     def normalize_rgb(image_arr, bit_out=0, bit_in=None):
@@ -371,7 +541,8 @@ class Images:
     #     print([np.issubdtype(x.astype(j).dtype, i) for i in [np.floating, np.unsignedinteger, np.signedinteger]])
 
     def image2png(self, f_name_formatter='{datetime}', directory='{proc_data_dir}/{module_lower}',
-                  bit=8, index=None, overwrite=False, file_name_iterator=None, ending='.png', **kwargs):
+                  bit=8, index=None, overwrite=False, file_name_iterator=None, ending='.png', chunk_size=16,
+                  thread_n=4, **kwargs):
         """f_name has to include at least on of the formatter_dict.keys
 
         PARAMETER
@@ -394,53 +565,134 @@ class Images:
         file_name_iterator: list or None, optional
             Has to match with the 'index' length. Each element is replaced with the '{i}' placeholder in
             'f_name_formatter', e.g., f_name_formatter='file_{i}', file_name_iterator=[1,2,3] -> file_1, file_2, file_3
+        chunk_size, thread_n: int, optional
+            see `export_png`
+        RETURNS
+        -------
+        file_name_list: list[str]
+            the full paths of the images, including existing ones which are skipped
         """
-
-        if not f_name_formatter.endswith(ending):
-            f_name_formatter += ending
-
         index = self.get_index(index=index, **kwargs)
+        file_name_list = self.get_png_file_names(index, f_name_formatter=f_name_formatter, directory=directory,
+                                                 file_name_iterator=file_name_iterator, ending=ending)
 
-        image_arr = self.load_rgb(index=index, **kwargs)
-
-        # get bit's right, default is 16bit
-        bit = int(bit)
-        bit_dict = {8: np.uint8, 16: np.uint16}
-        if bit == 8:
-            image_arr = image_arr / 2 ** 16 * 2 ** 8  # - 1
+        self.export_png(index, file_name_list, bit=bit, overwrite=overwrite, ending=ending, chunk_size=chunk_size,
+                        thread_n=thread_n)
+        return file_name_list
 
-        image_arr[image_arr == 2 ** bit] = image_arr[image_arr == 2 ** bit] - 1
-        image_arr = image_arr.astype(bit_dict[bit])
+    def get_png_file_names(self, index, f_name_formatter='{datetime}', directory='{proc_data_dir}/{module_lower}',
+                           file_name_iterator=None, ending='.png'):
+        """The full paths of the images for the index, see `image2png` for the parameters."""
+        if not f_name_formatter.endswith(ending):
+            f_name_formatter += ending
 
-        # prepare directory
         directory = os.path.abspath(directory.format(proc_data_dir=Config.proc_data_dir,
                                                      module=self.file_handler.module,
                                                      module_lower=self.file_handler.module.lower()))
-        os.makedirs(directory, exist_ok=True)
+
+        # read the time of all images at once, not one by one
+        date = self.file_handler.time.getunsorted(index).astype('datetime64[s]')
 
         file_name_list = []
         for i, index_i in enumerate(index):
             # prepare file name, get time to correct format
-            date_i = self.file_handler.time.getunsorted([index_i]).astype('datetime64[s]')[0]
-            str_date_i = str(date_i).replace(':', '_').replace('.', '_').replace('-', '_').replace('T', '_')
+            str_date_i = str(date[i]).replace(':', '_').replace('.', '_').replace('-', '_').replace('T', '_')
 
             formatter_dict = {'datetime': str_date_i, 'index': index_i, 'i': i}
             if file_name_iterator is not None:
                 formatter_dict['i'] = file_name_iterator[i]
 
-            f_name_i = f_name_formatter.format(**formatter_dict)
-            f_name_target_i = os.path.join(directory, f_name_i)
-            if os.path.exists(f_name_target_i) and overwrite:
-                pass
-                # print('skip:', f_name_target_i)
-            else:
-                # print('save:', f_name_target_i)
-                cv2.imwrite(f_name_i, image_arr[i, :, :, ::-1])  # [:,:,::-1] as cv2 takes BGR and not RGB
-                shutil.move(os.path.join(os.path.abspath('.'), f_name_i), f_name_target_i)  # move file
-
-            file_name_list.append(f_name_target_i)
+            file_name_list.append(os.path.join(directory, f_name_formatter.format(**formatter_dict)))
         return file_name_list
 
+    def export_png(self, index, file_name_list, bit=8, overwrite=False, ending='.png', subtract_dark=True,
+                   chunk_size=16, thread_n=4):
+        """Save the frames of index as RGB images to the file names. The frames are loaded and demosaiced chunk by
+        chunk and the images are encoded and written in a thread pool, while the next chunk is loaded. Each image is
+        written to a temporary file next to the target and renamed, that an interrupted export doesn't leave broken
+        images.
+        PARAMETER
+        ---------
+        index: ndarray
+            the indexes of the frames in the file
+        file_name_list: list[str]
+            the full paths of the images, one per index
+        bit: int, optional
+            either 8 (default) or 16 bit per color
+        overwrite: bool, optional
+            If False (Default) existing files are skipped, without loading the frames.
+        ending: str, optional
+            the image format, i.e. '.png' (default) or '.jpg'.
+        subtract_dark: bool, optional
+            if the raw_dark_frame is subtracted. Default: True.
+        chunk_size: int, optional
+            the number of frames per chunk. Default: 16.
+        thread_n: int, optional
+            the number of threads. Default: 4.
+        RETURNS
+        -------
+        file_name_list: list[str]
+            the full paths of the images which are written
+        """
+        bit = int(bit)
+        if bit not in [8, 16]:
+            raise ValueError(f'bit must be 8 or 16. Got: {bit}')
+        chunk_size = int(chunk_size)
+
+        index = np.atleast_1d(index)
+        file_name_list = list(file_name_list)
+        if len(index) != len(file_name_list):
+            raise ValueError(f'index and file_name_list must have the same length. Got: {len(index)} and '
+                             f'{len(file_name_list)}')
+
+        # list each directory only once
+        existing = {}
+        for directory_i in {os.path.dirname(i) for i in file_name_list}:
+            os.makedirs(directory_i, exist_ok=True)
+            existing[directory_i] = set() if overwrite else set(os.listdir(directory_i))
+        mask = np.array([os.path.basename(i) not in existing[os.path.dirname(i)] for i in file_name_list], dtype=bool)
+        index, file_name_list = index[mask], [i for i, m_i in zip(file_name_list, mask) if m_i]
+
+        shape = self.file_handler.raw.shape[1:]
+        buffer, buffer_uint16 = None, None
+        if subtract_dark:
+            buffer = np.empty((min(chunk_size, len(index)), *shape), dtype=np.float32)
+            buffer_uint16 = np.empty(buffer.shape, dtype=np.uint16)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=thread_n) as executor:
+            futures = []
+            for i in range(0, len(index), chunk_size):
+                raw_arr = self.file_handler.raw.getunsorted(index[i:i + chunk_size])
+                image_arr = self.frames_raw_to_rgb(raw_arr, subtract_dark=subtract_dark, executor=executor,
+                                                   buffer=buffer, buffer_uint16=buffer_uint16)
+                image_arr = self.cut2effective_pixel(image_arr, axis=1)
+
+                # wait for the previous chunk, that at most two chunks are in memory
+                for future_i in futures:
+                    future_i.result()
+                futures = [executor.submit(self.__write_image__, image_i, f_name_i, bit, ending)
+                           for image_i, f_name_i in zip(image_arr, file_name_list[i:i + chunk_size])]
+            for future_i in futures:
+                future_i.result()
+
+        return file_name_list
+
+    @staticmethod
+    def __write_image__(image, file_name, bit=8, ending='.png'):
+        """Encode a np.uint16 RGB image and write it to a temporary file, which is renamed to file_name."""
+        if bit == 8:
+            image = np.right_shift(image, 8).astype(np.uint8)  # the same as image / 2**16 * 2**8 as int
+
+        # [:,:,::-1] as cv2 takes BGR and not RGB
+        success, buffer = cv2.imencode(ending, np.ascontiguousarray(image[:, :, ::-1]))
+        if not success:
+            raise IOError(f'Failed to encode the image as {ending}: {file_name}')
+
+        file_name_tmp = file_name + '.tmp'
+        with open(file_name_tmp, 'wb') as f:
+            f.write(buffer.tobytes())
+        os.replace(file_name_tmp, file_name)
+
     def get_lucifer_mask(self, mode_list=None):
         """ mode_list is something like [2, 0, 15, 7] or [1, 1, 15, -125] ([mode, addr, current, duration])"""
         if mode_list is None:
@@ -454,22 +706,43 @@ class Images:
 
         return mode_list, mask_list
 
-    def image2png_lucifer(self, **kwargs):
+    def image2png_lucifer(self, directory='{proc_data_dir}/{module_lower}', f_name_formatter='{datetime}', bit=8,
+                          overwrite=False, ending='.png', chunk_size=16, thread_n=4, **kwargs):
+        """Save the images with lucifer, i.e. flash or torch, in a subdirectory per lucifer mode,
+        '<directory>/<mode>_<address>_<current>_<duration>'. All modes are exported in one pass over the frames.
+        PARAMETER
+        ---------
+        directory, f_name_formatter, bit, overwrite, ending, chunk_size, thread_n: optional
+            see `image2png`
+        **kwargs: optional
+            parsed to `get_index`, e.g. exclude_invalid
+        RETURNS
+        -------
+        process_dict: dict
+            {str(mode): file_name_list}, the full paths of the images per lucifer mode
+        """
         mode_dict = {-125: 'OFF', 0: 'OFF', 1: 'TORCH', 2: 'FLASH'}
-        index = self.get_index()
+        index = self.get_index(**kwargs)
 
         mode_list, mask_list = self.get_lucifer_mask()
 
         process_dict = {}
+        index_list, file_name_list = [], []
         for mode_i, mask_i in zip(mode_list, mask_list):
             out_str = [mode_dict[mode_i[0]].lower()]  # the mode
             for i_i in mode_i[1:]:
                 if i_i != -125:
                     out_str.append(str(i_i))  # the settings; address, [current, [duration]]
             out_str = '_'.join(out_str)  # <mode>_<address>_<current>_<duration>
-            file_name_list = self.image2png(index=index[mask_i],
-                                            directory='{proc_data_dir}/{module_lower}/' + out_str,
-                                            **kwargs)
-            process_dict[str(mode_i)] = file_name_list
+
+            index_i = index[mask_i[index]]
+            process_dict[str(mode_i)] = self.get_png_file_names(index_i, f_name_formatter=f_name_formatter,
+                                                                directory=f'{directory}/{out_str}', ending=ending)
+            index_list.append(index_i)
+            file_name_list.extend(process_dict[str(mode_i)])
+
+        if index_list:
+            self.export_png(np.concatenate(index_list), file_name_list, bit=bit, overwrite=overwrite, ending=ending,
+                            chunk_size=chunk_size, thread_n=thread_n)
 
         return process_dict
@@ -0,0 +1,203 @@
+import os
+
+import numpy as np
+
+from ...config_parser import Config
+from ...tools import ShareJobThreads
+
+
+class PixelStatistic:
+    def __init__(self, device_code=None, period=None):
+        """Per pixel mean and standard deviation over many frames, accumulated with Welford's (Chan's parallel)
+        algorithm. Frames are added in chunks (`add`), that only one chunk is in memory, and statistics of different
+        files, e.g. from parallel jobs, or periods can be merged (`merge`). The statistic can be saved and loaded per
+        device and period.
+
+        PARAMETER
+        ---------
+        device_code: str, optional
+            the deviceCode of the camera, used for the default file name
+        period: str, optional
+            the period which is covered, e.g. '2021_10' for a month like the raw data directories. Used for the default
+            file name.
+
+        EXAMPLE
+        -------
+        >>> pixel_statistic = PixelStatistic.from_files(file_list, device_code='TUMPMTSPECTROMETER001', period='2021_10')
+        >>> pixel_statistic.save()  # to '<proc_data_dir>/tumpmtspectrometer001/pixel_statistic_2021_10.npz'
+        >>> find_cluster = camera.FindCluster(cam, pixel_mean=pixel_statistic.mean, pixel_std=pixel_statistic.std)
+        """
+        self.device_code = device_code
+        self.period = period
+
+        self.count = 0  # number of frames
+        self._mean_ = None  # mean per pixel as float64
+        self._m2_ = None  # sum of squares of differences from the mean per pixel as float64
+
+    @property
+    def mean(self):
+        """Mean per pixel."""
+        return self._mean_
+
+    @property
+    def var(self):
+        """Variance per pixel, like np.var(frames, axis=0)."""
+        if self._m2_ is None:
+            return None
+        return self._m2_ / self.count
+
+    @property
+    def std(self):
+        """Standard deviation per pixel, like np.std(frames, axis=0)."""
+        if self._m2_ is None:
+            return None
+        return np.sqrt(self.var)
+
+    def add(self, frames, chunk_size=16):
+        """Add frames to the statistic. The frames are read and processed in chunks of `chunk_size` frames, with
+        float32 temporaries.
+        PARAMETER
+        ---------
+        frames: ndarray, h5py.Dataset
+            the frames with the shape [frames, pixel_x, pixel_y]. A h5py.Dataset is read chunk by chunk.
+        chunk_size: int, optional
+            the number of frames per chunk. Default: 16.
+        RETURNS
+        -------
+        self: PixelStatistic
+        """
+        chunk_size = int(chunk_size)
+        for i in range(0, frames.shape[0], chunk_size):
+            self.__add_chunk__(np.asarray(frames[i:i + chunk_size]))
+        return self
+
+    def __add_chunk__(self, chunk):
+        """Add a chunk of frames, which is in memory."""
+        count = chunk.shape[0]
+        if count == 0:
+            return
+
+        mean = np.mean(chunk, axis=0, dtype=np.float64)
+        diff = chunk.astype(np.float32)
+        diff -= mean.astype(np.float32)
+        np.square(diff, out=diff)
+        m2 = np.sum(diff, axis=0, dtype=np.float64)
+
+        self.__merge__(count, mean, m2)
+
+    def __merge__(self, count, mean, m2):
+        """Merge the statistic of count frames with the mean and m2 into the statistic."""
+        if self.count == 0:
+            self.count, self._mean_, self._m2_ = count, mean, m2
+            return
+
+        count_total = self.count + count
+        delta = mean - self._mean_
+        self._mean_ = self._mean_ + delta * (count / count_total)
+        self._m2_ = self._m2_ + m2 + delta ** 2 * (self.count * count / count_total)
+        self.count = count_total
+
+    def merge(self, other):
+        """Merge the statistic of another PixelStatistic with the same frame shape, e.g. from another file.
+        RETURNS
+        -------
+        self: PixelStatistic
+        """
+        if other.count == 0:
+            return self
+        if self.count != 0 and self._mean_.shape != other._mean_.shape:
+            raise ValueError(f'Both PixelStatistic must have the same shape. Got: {self._mean_.shape} and '
+                             f'{other._mean_.shape}')
+
+        self.__merge__(other.count, other._mean_.copy(), other._m2_.copy())
+        return self
+
+    # ---- persistence ----
+    @staticmethod
+    def get_file_name(device_code, period, directory=None):
+        """The default file name for the device and period: '<directory>/<device_code>/pixel_statistic_<period>.npz'.
+        If directory is None (default), it takes strawb.Config.proc_data_dir."""
+        if directory is None:
+            directory = Config.proc_data_dir
+        return os.path.join(directory, device_code.lower(), f'pixel_statistic_{period}.npz')
+
+    def save(self, file_name=None):
+        """Save the statistic to a npz-file. If file_name is None (default), it takes
+        `PixelStatistic.get_file_name(self.device_code, self.period)`.
+        RETURNS
+        -------
+        file_name: str
+            the file name of the saved statistic
+        """
+        if file_name is None:
+            file_name = self.get_file_name(self.device_code, self.period)
+        os.makedirs(os.path.dirname(os.path.abspath(file_name)), exist_ok=True)
+
+        np.savez(file_name, count=self.count, mean=self._mean_, m2=self._m2_,
+                 device_code=self.device_code or '', period=self.period or '')
+        return file_name
+
+    @classmethod
+    def load(cls, file_name=None, device_code=None, period=None):
+        """Load a statistic from a npz-file. If file_name is None (default), it takes
+        `PixelStatistic.get_file_name(device_code, period)`."""
+        if file_name is None:
+            file_name = cls.get_file_name(device_code, period)
+
+        with np.load(file_name, allow_pickle=False) as f:
+            pixel_statistic = cls(device_code=str(f['device_code']) or None, period=str(f['period']) or None)
+            pixel_statistic.count = int(f['count'])
+            if pixel_statistic.count:
+                pixel_statistic._mean_ = f['mean']
+                pixel_statistic._m2_ = f['m2']
+        return pixel_statistic
+
+    # ---- multiple files ----
+    @classmethod
+    def _from_file_(cls, file_name, eff_margin=True, exclude_invalid=False, chunk_size=16):
+        """The statistic of a single camera file."""
+        from .file_handler import FileHandler
+        from .images import Images
+
+        file_handler = FileHandler(file_name)
+        try:
+            return Images(file_handler).cal_pixel_statistic(eff_margin=eff_margin, exclude_invalid=exclude_invalid,
+                                                            chunk_size=chunk_size)
+        finally:
+            file_handler.close()
+
+    @classmethod
+    def from_files(cls, file_names, device_code=None, period=None, eff_margin=True, exclude_invalid=False,
+                   chunk_size=16, thread_n=4, backend='process'):
+        """Calculate the statistic over all frames of multiple camera files, e.g. a month. The files are processed in
+        parallel and the statistics are merged.
+        PARAMETER
+        ---------
+        file_names: list[str]
+            the camera files
+        device_code, period: str, optional
+            see PixelStatistic
+        eff_margin: bool, optional
+            if the frames are cut by the effective margin. Default, True.
+        exclude_invalid: bool, optional
+            if invalid frames, see `Images.valid_mask`, are excluded. Default, False.
+        chunk_size: int, optional
+            the number of frames per chunk. Default: 16.
+        thread_n: int, optional
+            the number of parallel workers. Default: 4.
+        backend: str, optional
+            'process' (default) or 'thread', see strawb.tools.ShareJobThreads
+        RETURNS
+        -------
+        pixel_statistic: PixelStatistic
+        """
+        sjt = ShareJobThreads(thread_n=thread_n, unit='files', backend=backend)
+        sjt.do(cls._from_file_, file_names, eff_margin=eff_margin, exclude_invalid=exclude_invalid,
+               chunk_size=chunk_size)
+        for i, err in sjt.errors.items():
+            print(f'WARNING: {file_names[i]} failed with {err!r}')
+
+        pixel_statistic = cls(device_code=device_code, period=period)
+        for i in sjt.return_buffer:
+            pixel_statistic.merge(i)
+        return pixel_statistic
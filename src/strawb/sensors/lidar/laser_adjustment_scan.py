@@ -1,5 +1,4 @@
 import numpy as np
-from scipy.stats import binned_statistic
 import strawb.sensors.lidar
 
 
@@ -169,17 +168,12 @@ class LaserAdjustmentScan:
         abs_timestamp_middle = (self.lidar.file_handler.counts_time[:-1]
                                 + self.lidar.file_handler.counts_time[1:]) * 0.5
 
-        bin_counts_pmt, bin_edges, binnumber = binned_statistic(
-            abs_timestamp_middle,
-            self.lidar.trb_rates.dcounts_pmt,
-            statistic='sum',
-            bins=self.lidar.file_handler.measurement_time)
-
-        bin_counts_laser, bin_edges, binnumber = binned_statistic(
-            abs_timestamp_middle,
-            self.lidar.trb_rates.dcounts_laser,
-            statistic='sum',
-            bins=self.lidar.file_handler.measurement_time)
+        # sum the counts of PMT and laser in one pass
+        binned_statistic = strawb.tools.BinnedStatistic(bins=self.lidar.file_handler.measurement_time,
+                                                        statistics=['sum'])
+        binned_statistic.add(abs_timestamp_middle,
+                             [self.lidar.trb_rates.dcounts_pmt, self.lidar.trb_rates.dcounts_laser])
+        bin_counts_pmt, bin_counts_laser = binned_statistic.sum
 
         bin_counts_pmt = bin_counts_pmt[::2]  # every second to not count data from between steps
         bin_counts_laser = bin_counts_laser[::2]
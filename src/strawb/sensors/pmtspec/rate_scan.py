@@ -1,5 +1,4 @@
 import numpy as np
-import scipy.stats
 from matplotlib import pyplot as plt
 import strawb
 
@@ -103,15 +102,9 @@ class RateScan:
         t, r, a = self.trb_rates.interpolate_rate(time_probe=time_padiwa - t_0)
 
         # count how often the channel is active
-        active, b, n = scipy.stats.binned_statistic(self.trb_rates.file_handler.counts_time,
-                                                    self.trb_rates.active_read,
-                                                    statistic='sum',
-                                                    bins=time_padiwa)
-        reads, b, n = scipy.stats.binned_statistic(self.trb_rates.file_handler.counts_time,
-                                                   None,
-                                                   statistic='count',
-                                                   bins=time_padiwa)
-        active_ratio = active / reads
+        binned_statistic = strawb.tools.BinnedStatistic(bins=time_padiwa, statistics=['sum'])
+        binned_statistic.add(self.trb_rates.file_handler.counts_time, self.trb_rates.active_read)
+        active_ratio = binned_statistic.sum / binned_statistic.count
 
         # Starting Threshold
         # get the starting threshold of the scan to which the offset applies.
@@ -3,6 +3,8 @@ import os
 
 import pandas
 
+from .db_storage import get_db_storage
+
 
 class BaseDBHandler:
     # set defaults
@@ -36,8 +38,13 @@ class BaseDBHandler:
         >>> db = strawb.BaseDBHandler(load_db=False)  # loads the db
         >>> db.dataframe = ...
         >>> db.save_db()
+
+        With a partitioned DB file, i.e. '*.parquet', load only the rows and columns you need
+        >>> db = strawb.BaseDBHandler(file_name='db.parquet', load_db=False)
+        >>> db.load_db(device_code='TUMPMTSPECTROMETER001', time_from='2021-09-01', time_to='2021-09-08')
         """
         self.dataframe = None  # stores the db in a pandas data frame
+        self._partial_db_ = {}  # if only some columns or rows are loaded, see load_db
 
         # handle file_name or try to find it.
         self.file_name = None
@@ -80,30 +87,70 @@ class BaseDBHandler:
             if update:
                 self.update()
 
-    def load_db(self):
-        """Loads the DB file into a pandas.DataFrame from the file provided at the initialisation."""
+    @property
+    def storage(self):
+        """The storage backend of the DB file, based on the file name, see `db_storage.get_db_storage`."""
+        if self.file_name is None:
+            raise ValueError(f"File_name is None. There is no storage.")
+        return get_db_storage(self.file_name)
+
+    def load_db(self, columns=None, device_code=None, time_from=None, time_to=None):
+        """Loads the DB file into a pandas.DataFrame from the file provided at the initialisation.
+        With a partitioned storage, e.g. '*.parquet', only the requested partitions and columns are read.
+        PARAMETER
+        ---------
+        columns: list, optional
+            the columns to load. None (default) loads all.
+        device_code: str or list of str, optional
+            only load rows of these deviceCode(s). None (default) loads all.
+        time_from, time_to: datetime-like, str, int, float, optional
+            only load rows where 'dateFrom' and 'dateTo' overlap with the time range. None (default) loads all.
+        """
         #  if self.file_name is not None:
         if self.file_name is None:
             raise ValueError(f"File_name is None. Can't load the file.")
         elif not os.path.exists(self.file_name):
             raise FileNotFoundError(f"{self.file_name} doesn't exist -> See the doc-string how to initialise it.")
         else:
-            self.dataframe = pandas.read_pickle(self.file_name)
+            self.dataframe = self.storage.load(columns=columns, device_code=device_code,
+                                               time_from=time_from, time_to=time_to)
+            # a partial DB can't overwrite the DB, see save_db
+            self._partial_db_ = {'columns': columns is not None,
+                                 'rows': device_code is not None or time_from is not None or time_to is not None}
 
     def save_db(self):
-        """Saves the DB file into a pandas.DataFrame to the file provided at the initialisation."""
+        """Saves the DB file into a pandas.DataFrame to the file provided at the initialisation. If only some rows
+        or columns are loaded (see load_db), the loaded rows and columns are updated in the DB (see append_db) instead
+        of overwriting it."""
         # store information in a pandas-file
         if self.file_name is None:
             raise ValueError(f"File_name is None -> save_db can't be executed")
         if self.dataframe is not None:  # only save it, when there is something stored in the dataframe
-            # check if the directory exits, if not create it
-            os.makedirs(os.path.dirname(self.file_name), exist_ok=True)  # exist_ok, doesn't raise an error if it exists
-
-            # if self.file_name is None:  # in case, set the default file name
-            #     self.file_name = Config.pandas_file_sync_db
-            self.dataframe.to_pickle(self.file_name,
-                                     protocol=4,  # protocol=4 compatible with python>=3.4
-                                     )
+            if self._partial_db_.get('columns'):
+                self.storage.upsert(self.dataframe, columns=list(self.dataframe.columns))
+            elif self._partial_db_.get('rows'):
+                self.storage.upsert(self.dataframe)
+            else:
+                self.storage.save(self.dataframe)
+
+    def append_db(self, dataframe=None, columns=None):
+        """Adds the rows to the DB file without loading it (upsert), rows with the same index are replaced.
+        With a partitioned storage, e.g. '*.parquet', only the partitions of the new rows are rewritten, with SQLite,
+        e.g. '*.sqlite', only the rows are written.
+        PARAMETER
+        ---------
+        dataframe: pandas.DataFrame, optional
+            the rows to add. If None (default) it takes the internal dataframe.
+        columns: list, optional
+            only replace these columns of existing rows, the other columns are kept. None (default) replaces the
+            entire rows.
+        """
+        if self.file_name is None:
+            raise ValueError(f"File_name is None -> append_db can't be executed")
+        if dataframe is None:
+            dataframe = self.dataframe
+        if dataframe is not None:
+            self.storage.upsert(dataframe, columns=columns)
 
     def optimize_dataframe(self, exclude_columns=None, include_columns=None):
         """Optimize the dataframe to reduce the size, manly RAM but also on disc.
@@ -0,0 +1,659 @@
+import contextlib
+import json
+import os
+import pickle
+import shutil
+import sqlite3
+import urllib.parse
+
+import numpy as np
+import pandas
+
+from ..tools import pd_timestamp_convert, pd_timestamp_mask_between, _pd_datetime2int_
+
+
+def get_db_storage(file_name):
+    """Returns the storage backend for the DB file based on the file name:
+    - '*.parquet' or an existing directory: ParquetDBStorage
+    - '*.sqlite', '*.sqlite3' or '*.db': SQLiteDBStorage
+    - else: PickleDBStorage
+    """
+    if file_name.endswith('.parquet') or os.path.isdir(file_name):
+        return ParquetDBStorage(file_name)
+    if os.path.splitext(file_name)[1] in ['.sqlite', '.sqlite3', '.db']:
+        return SQLiteDBStorage(file_name)
+    return PickleDBStorage(file_name)
+
+
+def filter_dataframe(dataframe, columns=None, device_code=None, time_from=None, time_to=None):
+    """Select rows and columns of a DB dataframe.
+    PARAMETER
+    ---------
+    dataframe: pandas.DataFrame
+        the DB
+    columns: list, optional
+        the columns to keep. None (default) keeps all.
+    device_code: str or list of str, optional
+        only rows of these deviceCode(s). None (default) keeps all.
+    time_from, time_to: datetime-like, str, int, float, optional
+        only rows where 'dateFrom' and 'dateTo' overlap with the time range, see
+        `strawb.tools.pd_timestamp_mask_between`. If one of both is None, it's open on this side.
+    """
+    mask = np.ones(len(dataframe), dtype=bool)
+    if device_code is not None:
+        mask &= dataframe.deviceCode.isin(np.atleast_1d(device_code)).to_numpy()
+    if time_from is not None or time_to is not None:
+        time_from = pandas.Timestamp.min if time_from is None else time_from
+        time_to = pandas.Timestamp.max if time_to is None else time_to
+        mask &= pd_timestamp_mask_between(dataframe.dateFrom, dataframe.dateTo, time_from, time_to).to_numpy()
+
+    if not np.all(mask):
+        dataframe = dataframe[mask]
+    if columns is not None:
+        dataframe = dataframe[[i for i in columns if i in dataframe]]
+    return dataframe
+
+
+def concat_dataframes(dataframe_list, **kwargs):
+    """Like pandas.concat, but keeps 'category' columns. pandas.concat falls back to dtype object if the categories
+    differ or a column is missing in one of the dataframes, which multiplies the RAM usage of the DB.
+    PARAMETER
+    ---------
+    dataframe_list: list of pandas.DataFrame
+        the dataframes to concatenate, None entries are skipped
+    kwargs: optional
+        parsed to pandas.concat, e.g. verify_integrity
+    """
+    dataframe_list = [i for i in dataframe_list if i is not None]
+
+    # the union of the categories (and values) per 'category' column
+    categories = {}
+    for dataframe in dataframe_list:
+        for i, dtype in dataframe.dtypes.items():
+            if isinstance(dtype, pandas.CategoricalDtype):
+                categories[i] = None
+    for i in categories:
+        index_list = []
+        for dataframe in dataframe_list:
+            if i not in dataframe:
+                continue
+            if isinstance(dataframe[i].dtype, pandas.CategoricalDtype):
+                index_list.append(dataframe[i].cat.categories)
+            else:
+                index_list.append(pandas.Index(dataframe[i].dropna().unique()))
+        categories[i] = pandas.CategoricalDtype(index_list[0].append(index_list[1:]).unique())
+
+    if categories:
+        for j, dataframe in enumerate(dataframe_list):
+            columns = {}
+            for i, dtype in categories.items():
+                if i in dataframe:
+                    columns[i] = dataframe[i].astype(dtype)
+                else:  # missing column, add it as all missing values
+                    columns[i] = pandas.Categorical.from_codes(np.full(len(dataframe), -1), dtype=dtype)
+            dataframe_list[j] = dataframe.assign(**columns)
+
+    return pandas.concat(dataframe_list, **kwargs)
+
+
+def set_values(series, positions, values):
+    """Set values at positions of a Series in one step and return the new Series. Other than `.iloc[] = `, it adds
+    missing categories to 'category' columns and falls back to dtype object, if the values don't fit the dtype.
+    PARAMETER
+    ---------
+    series: pandas.Series
+        the series to update, it isn't modified
+    positions: ndarray
+        the integer positions to set
+    values: ndarray
+        the values to set, with the same length as positions
+    """
+    series = series.copy()
+    if isinstance(series.dtype, pandas.CategoricalDtype):
+        new_categories = pandas.Index(pandas.Series(values, dtype=object).dropna().unique())
+        new_categories = new_categories.difference(series.cat.categories)
+        if len(new_categories):
+            series = series.cat.add_categories(new_categories)
+    try:
+        series.iloc[positions] = values
+    except (TypeError, ValueError):  # the values don't fit the dtype, e.g. missing values in a bool column
+        series = series.astype(object)
+        series.iloc[positions] = values
+        series = series.infer_objects()
+    return series
+
+
+def upsert_dataframe(dataframe, dataframe2add, columns=None):
+    """Adds the rows of dataframe2add to dataframe, rows with the same index are replaced by the ones of
+    dataframe2add.
+    PARAMETER
+    ---------
+    dataframe, dataframe2add: pandas.DataFrame
+        the existing rows and the rows to add
+    columns: list, optional
+        only replace these columns of existing rows, the other columns are kept. New rows have missing values in the
+        other columns. None (default) replaces the entire rows.
+    """
+    if dataframe is None or len(dataframe) == 0:
+        return dataframe2add
+    if columns is not None:
+        mask = dataframe2add.index.isin(dataframe.index)
+        updated = dataframe.loc[dataframe2add.index[mask]].copy()
+        for i in columns:
+            if i in dataframe2add:
+                updated[i] = dataframe2add.loc[mask, i]
+        dataframe2add = concat_dataframes([updated, dataframe2add.loc[~mask]])
+    dataframe = dataframe[~dataframe.index.isin(dataframe2add.index)]
+    return concat_dataframes([dataframe, dataframe2add])
+
+
+class PickleDBStorage:
+    def __init__(self, file_name):
+        """Stores the entire DB as one pickled `pandas.DataFrame`. Loading always reads all rows and columns, the
+        selection (columns, device_code, time_from, time_to) is applied afterwards."""
+        self.file_name = file_name
+
+    def exists(self):
+        return os.path.exists(self.file_name)
+
+    def load(self, columns=None, device_code=None, time_from=None, time_to=None):
+        """Loads the DB, for the parameters see `filter_dataframe`."""
+        dataframe = pandas.read_pickle(self.file_name)
+        return filter_dataframe(dataframe, columns=columns, device_code=device_code,
+                                time_from=time_from, time_to=time_to)
+
+    def save(self, dataframe):
+        """Saves the dataframe, overwrites the existing DB."""
+        # check if the directory exits, if not create it
+        os.makedirs(os.path.dirname(self.file_name), exist_ok=True)  # exist_ok, doesn't raise an error if it exists
+        dataframe.to_pickle(self.file_name,
+                            protocol=4,  # protocol=4 compatible with python>=3.4
+                            )
+
+    def upsert(self, dataframe, columns=None):
+        """Adds the rows to the DB, rows with the same index are replaced. With `columns`, only these columns of
+        existing rows are replaced, see `upsert_dataframe`."""
+        if self.exists():
+            dataframe = upsert_dataframe(pandas.read_pickle(self.file_name), dataframe, columns=columns)
+        self.save(dataframe)
+
+    def append(self, dataframe):
+        """Adds the rows to the DB, rows with the same index are replaced."""
+        self.upsert(dataframe)
+
+
+class ParquetDBStorage:
+    _none_partition_ = '__none__'  # partition name for missing values
+
+    def __init__(self, file_name, partition_by=('deviceCode', 'month'), time_column='dateFrom'):
+        """Stores the DB as Parquet files in a directory, partitioned by deviceCode and month (of 'dateFrom'), i.e.
+        `<file_name>/deviceCode=<deviceCode>/month=<YYYY-MM>/part-0.parquet`. Loading reads only the partitions and
+        columns which are requested and appending rewrites only the partitions which have new rows.
+        Columns with python objects, e.g. the dicts in 'h5_attrs', are stored pickled.
+        PARAMETER
+        ---------
+        file_name: str
+            the directory of the DB, e.g. '~/strawb_db.parquet'
+        partition_by: tuple, optional
+            the columns to partition the DB. 'month' is generated from `time_column`. Columns which don't exist in
+            the dataframe are skipped.
+        time_column: str, optional
+            the column which defines the 'month' partition
+        """
+        self.file_name = file_name
+        self.partition_by = list(partition_by)
+        self.time_column = time_column
+
+    @property
+    def _schema_file_name_(self):
+        return os.path.join(self.file_name, '_common_metadata')
+
+    def exists(self):
+        return os.path.exists(self._schema_file_name_)
+
+    def __read_schema__(self):
+        """Returns the schema of the stored DB and the stored metadata or None, {} if the DB doesn't exist."""
+        import pyarrow.parquet
+
+        if not self.exists():
+            return None, {}
+        schema = pyarrow.parquet.read_schema(self._schema_file_name_)
+        return schema, json.loads(schema.metadata[b'strawb'])
+
+    def __partition_path__(self, values):
+        """The directory of a partition from the partition values."""
+        path = self.file_name
+        for key_i, value_i in zip(self.partition_by, values):
+            value_i = self._none_partition_ if pandas.isna(value_i) else str(value_i)
+            path = os.path.join(path, f'{key_i}={urllib.parse.quote(value_i, safe="")}')
+        return path
+
+    def __add_month__(self, dataframe):
+        if 'month' in self.partition_by and self.time_column in dataframe:
+            dataframe = dataframe.assign(month=dataframe[self.time_column].dt.strftime('%Y-%m'))
+        return dataframe
+
+    def __to_table__(self, dataframe, schema=None, metadata=None):
+        """Converts the dataframe to a pyarrow.Table, where objects are pickled and categories are converted to the
+        values. If a schema is provided, the table is converted to this schema."""
+        import pyarrow
+
+        index_name = dataframe.index.name
+        dataframe = dataframe.reset_index() if index_name is not None else dataframe.reset_index(drop=True)
+
+        pickled = set() if metadata is None else set(metadata.get('pickled', []))
+        for i in dataframe.columns:
+            column = dataframe[i]
+            if isinstance(column.dtype, pandas.CategoricalDtype):
+                column = column.astype(column.cat.categories.dtype if len(column.cat.categories) else object)
+            if column.dtype == object:
+                values = column.dropna()
+                if i in pickled or not values.map(lambda x: isinstance(x, str)).all():
+                    pickled.add(i)
+                    column = column.map(lambda x: None if x is None else pickle.dumps(x, protocol=4))
+            dataframe[i] = column
+
+        table = pyarrow.Table.from_pandas(dataframe, preserve_index=False)
+        if schema is not None:
+            schema = pyarrow.unify_schemas([schema.remove_metadata(), table.schema])
+            table = pyarrow.Table.from_arrays(
+                [table[i.name].cast(i.type) if i.name in table.column_names else pyarrow.nulls(len(table), i.type)
+                 for i in schema],
+                schema=schema)
+
+        metadata = {'index': index_name, 'pickled': sorted(pickled), 'partition_by': self.partition_by}
+        return table.replace_schema_metadata({b'strawb': json.dumps(metadata).encode()}), metadata
+
+    def __write_partitions__(self, dataframe, schema=None, metadata=None):
+        """Writes each partition of the dataframe to its own file and returns the schema of the files and the
+        metadata."""
+        import pyarrow.parquet
+
+        dataframe = self.__add_month__(dataframe)
+        partition_by = [i for i in self.partition_by if i in dataframe]
+        self.partition_by = partition_by
+
+        table, metadata = self.__to_table__(dataframe, schema=schema, metadata=metadata)
+        file_schema = table.drop(partition_by).schema  # partition columns are stored in the path
+
+        if partition_by:
+            keys = dataframe[partition_by].astype(object).fillna(self._none_partition_)
+            groups = keys.groupby(partition_by, sort=False).indices
+        else:
+            groups = {(): np.arange(len(dataframe))}
+
+        for values, positions in groups.items():
+            values = values if isinstance(values, tuple) else (values,)
+            values = [None if i == self._none_partition_ else i for i in values]
+            path = self.__partition_path__(values)
+            os.makedirs(path, exist_ok=True)
+            file_name = os.path.join(path, 'part-0.parquet')
+            pyarrow.parquet.write_table(table.take(positions).drop(partition_by).cast(file_schema),
+                                        file_name + '.tmp')
+            os.replace(file_name + '.tmp', file_name)
+
+        return file_schema, metadata
+
+    def __write_schema__(self, schema, metadata):
+        import pyarrow.parquet
+
+        schema = schema.with_metadata({b'strawb': json.dumps(metadata).encode()})
+        pyarrow.parquet.write_metadata(schema, self._schema_file_name_ + '.tmp')
+        os.replace(self._schema_file_name_ + '.tmp', self._schema_file_name_)
+
+    def load(self, columns=None, device_code=None, time_from=None, time_to=None):
+        """Loads the DB, for the parameters see `filter_dataframe`. Only the partitions of the device_code and of the
+        months in [time_from - 1 month, time_to] are read, as well as only the requested columns."""
+        import pyarrow
+        import pyarrow.dataset
+
+        schema, metadata = self.__read_schema__()
+        if schema is None:
+            raise FileNotFoundError(f"{self.file_name} doesn't exist -> See the doc-string how to initialise it.")
+        partition_by = metadata.get('partition_by', [])
+        self.partition_by = partition_by
+
+        partitioning = pyarrow.dataset.partitioning(pyarrow.schema([(i, pyarrow.string()) for i in partition_by]),
+                                                    flavor='hive')
+        dataset =pyarrow.dataset.dataset(self.file_name, format='parquet', partitioning=partitioning,
+                                          schema=pyarrow.unify_schemas([schema.remove_metadata(),
+                                                                        partitioning.schema]))
+
+        # partition pruning
+        expression = None
+        if device_code is not None and 'deviceCode' in partition_by:
+            expression = pyarrow.dataset.field('deviceCode').isin(list(np.atleast_1d(device_code)))
+        if 'month' in partition_by and (time_from is not None or time_to is not None):
+            # a file can start in the month before time_from
+            month_expression = pyarrow.dataset.field('month') != self._none_partition_
+            if time_from is not None:
+                month_from = (pd_timestamp_convert(time_from).tz_localize(None).to_period('M') - 1).strftime('%Y-%m')
+                month_expression &= pyarrow.dataset.field('month') >= month_from
+            if time_to is not None:
+                month_to = pd_timestamp_convert(time_to).tz_localize(None).to_period('M').strftime('%Y-%m')
+                month_expression &= pyarrow.dataset.field('month') <= month_to
+            expression = month_expression if expression is None else expression & month_expression
+
+        # column projection, the columns for the filter and the index are always read
+        read_columns = None
+        if columns is not None:
+            read_columns = [i for i in dataset.schema.names if i in columns or i == metadata['index']]
+            if time_from is not None or time_to is not None:
+                read_columns += [i for i in ['dateFrom', 'dateTo'] if i not in read_columns]
+            if device_code is not None and 'deviceCode' not in read_columns:
+                read_columns.append('deviceCode')
+
+        dataframe = dataset.to_table(columns=read_columns, filter=expression).to_pandas()
+
+        for i in metadata['pickled']:
+            if i in dataframe:
+                dataframe[i] = dataframe[i].map(lambda x: None if x is None else pickle.loads(x))
+        if metadata['index'] is not None and metadata['index'] in dataframe:
+            dataframe = dataframe.set_index(metadata['index'])
+        if 'month' in dataframe and (columns is None or 'month' not in columns):
+            dataframe = dataframe.drop(columns='month')
+
+        return filter_dataframe(dataframe, columns=columns, device_code=device_code,
+                                time_from=time_from, time_to=time_to)
+
+    def save(self, dataframe):
+        """Saves the dataframe, overwrites the existing DB."""
+        if os.path.exists(self.file_name):
+            shutil.rmtree(self.file_name)
+        os.makedirs(self.file_name)
+        schema, metadata = self.__write_partitions__(dataframe)
+        self.__write_schema__(schema, metadata)
+
+    def append(self, dataframe):
+        """Adds the rows to the DB, rows with the same index are replaced, see `upsert`."""
+        self.upsert(dataframe)
+
+    def upsert(self, dataframe, columns=None):
+        """Adds the rows to the DB and rewrites only the partitions of the new rows. Rows with the same index are
+        replaced. Rows are only replaced within the same partition, i.e. if deviceCode or month doesn't change.
+        With `columns`, only these columns of existing rows are replaced, see `upsert_dataframe`. The dataframe
+        must have the partition columns in any case."""
+        schema, metadata = self.__read_schema__()
+        if schema is None:
+            return self.save(dataframe)
+        self.partition_by = metadata.get('partition_by', [])
+
+        dataframe = self.__add_month__(dataframe)
+        if metadata['index'] is not None:
+            dataframe = dataframe.rename_axis(metadata['index'])
+        partition_by = [i for i in self.partition_by if i in dataframe]
+        if partition_by != self.partition_by:
+            raise KeyError(f'dataframe must have the partition columns: {self.partition_by}')
+
+        # merge the existing rows of each partition with the new rows
+        partition_list = []
+        keys = dataframe[partition_by].astype(object).fillna(self._none_partition_)
+        for values, positions in keys.groupby(partition_by, sort=False).indices.items():
+            values = values if isinstance(values, tuple) else (values,)
+            dataframe_i = dataframe.iloc[positions].drop(columns=[i for i in ['month'] if i in dataframe])
+            path = self.__partition_path__([None if i == self._none_partition_ else i for i in values])
+            if os.path.exists(os.path.join(path, 'part-0.parquet')):
+                existing = self.__read_partition__(path, schema, metadata)
+                dataframe_i = upsert_dataframe(existing, dataframe_i, columns=columns)
+            partition_list.append(dataframe_i)
+
+        schema, metadata = self.__write_partitions__(pandas.concat(partition_list), schema=schema, metadata=metadata)
+        self.__write_schema__(schema, metadata)
+
+    def __read_partition__(self, path, schema, metadata):
+        """Reads a single partition as a dataframe, with partition and pickled columns restored."""
+        import pyarrow.parquet
+
+        table = pyarrow.parquet.read_table(os.path.join(path, 'part-0.parquet'))
+        dataframe = table.to_pandas()
+        for i in metadata['pickled']:
+            if i in dataframe:
+                dataframe[i] = dataframe[i].map(lambda x: None if x is None else pickle.loads(x))
+
+        # restore the partition columns from the path
+        for part_i in os.path.relpath(path, self.file_name).split(os.sep):
+            key, value = part_i.split('=', 1)
+            if key != 'month':
+                value = urllib.parse.unquote(value)
+                dataframe[key] = None if value == self._none_partition_ else value
+        if metadata['index'] is not None:
+            dataframe = dataframe.set_index(metadata['index'])
+        return dataframe
+
+
+class SQLiteDBStorage:
+    _table_ = 'db'
+    _meta_table_ = 'strawb_meta'
+    # columns which get an index, if they exist
+    index_columns = ['deviceCode', 'dataProductCode', 'dateFrom', 'dateTo']
+
+    def __init__(self, file_name, timeout=60.):
+        """Stores the DB in a SQLite file. The index of the dataframe (e.g. 'fullPath') is the primary key and the
+        `index_columns` have an index, so that only the requested rows and columns are read. The file uses the
+        write-ahead log (WAL), i.e. many processes can read while one process writes. Writing rows is an upsert,
+        i.e. existing rows (same index) are updated and new rows are inserted.
+        Datetime columns are stored as int64 in ns (UTC), columns with python objects, e.g. the dicts in
+        'h5_attrs', are stored pickled.
+        PARAMETER
+        ---------
+        file_name: str
+            the SQLite file, e.g. '~/strawb_db.sqlite'
+        timeout: float, optional
+            seconds to wait for a lock of another process, before an error is raised
+        """
+        self.file_name = file_name
+        self.timeout = timeout
+
+    def exists(self):
+        if not os.path.exists(self.file_name):
+            return False
+        with self.__connect__() as con:
+            return self.__read_meta__(con) is not None
+
+    @contextlib.contextmanager
+    def __connect__(self):
+        """Opens a connection in WAL mode and closes it at the end."""
+        if os.path.dirname(self.file_name):
+            os.makedirs(os.path.dirname(self.file_name), exist_ok=True)
+        con = sqlite3.connect(self.file_name, timeout=self.timeout, isolation_level=None)  # manual transactions
+        try:
+            con.execute('PRAGMA journal_mode=WAL')
+            con.execute('PRAGMA synchronous=NORMAL')
+            yield con
+        finally:
+            con.close()
+
+    @contextlib.contextmanager
+    def __transaction__(self):
+        """Opens a connection with a write transaction, which is committed at the end or rolled back on errors."""
+        with self.__connect__() as con:
+            con.execute('BEGIN IMMEDIATE')
+            try:
+                yield con
+            except BaseException:
+                con.execute('ROLLBACK')
+                raise
+            con.execute('COMMIT')
+
+    def __read_meta__(self, con):
+        """Returns {'index': <index name>, 'kinds': {<column>: <kind>}} or None if the DB doesn't exist."""
+        try:
+            row = con.execute(f'SELECT value FROM "{self._meta_table_}" WHERE key = ?', ('meta',)).fetchone()
+        except sqlite3.OperationalError:  # no such table
+            return None
+        return None if row is None else json.loads(row[0])
+
+    @staticmethod
+    def __column_kind__(column):
+        """The kind of a column, which defines the conversion to and from SQLite."""
+        types = pandas.api.types
+        if isinstance(column.dtype, pandas.DatetimeTZDtype):
+            return 'datetime_utc'
+        if types.is_datetime64_dtype(column.dtype):
+            return 'datetime'
+        if isinstance(column.dtype, pandas.CategoricalDtype):
+            return 'category'
+        if types.is_bool_dtype(column.dtype):
+            return 'bool'
+        if types.is_integer_dtype(column.dtype):
+            return 'int'
+        if types.is_float_dtype(column.dtype):
+            return 'float'
+        if column.dropna().map(lambda x: isinstance(x, str)).all():
+            return 'str'
+        return 'pickle'
+
+    _sql_types_ = {'datetime_utc': 'INTEGER', 'datetime': 'INTEGER', 'bool': 'INTEGER', 'int': 'INTEGER',
+                   'float': 'REAL', 'category': 'TEXT', 'str': 'TEXT', 'pickle': 'BLOB'}
+
+    @staticmethod
+    def __to_sql__(column, kind):
+        """Converts a pandas.Series to a list of python values for SQLite, missing values are None."""
+        if kind in ['datetime_utc', 'datetime']:
+            values = _pd_datetime2int_(column).astype(object)
+            values[column.isna().to_numpy()] = None
+            return values.tolist()
+        if kind == 'pickle':
+            return [None if i is None else pickle.dumps(i, protocol=4) for i in column]
+        values = column.astype(object).where(column.notna(), None)
+        if kind == 'bool':
+            return [None if i is None else int(i) for i in values]
+        return values.tolist()
+
+    @staticmethod
+    def __from_sql__(column, kind):
+        """Converts a column read from SQLite back to the pandas dtype."""
+        if kind == 'datetime_utc':
+            return pandas.to_datetime(column, unit='ns', utc=True)
+        if kind == 'datetime':
+            return pandas.to_datetime(column, unit='ns')
+        if kind == 'bool':
+            return column.astype(bool) if column.notna().all() else column.map(
+                lambda x: None if pandas.isna(x) else bool(x))
+        if kind == 'category':
+            return column.astype('category')
+        if kind == 'pickle':
+            return column.map(lambda x: None if x is None else pickle.loads(x))
+        return column
+
+    def __prepare_table__(self, con, dataframe):
+        """Creates the table and indexes or adds new columns. Returns the metadata and the dataframe with the index
+        as column."""
+        meta = self.__read_meta__(con)
+        index_name = dataframe.index.name or 'index'
+        dataframe = dataframe.rename_axis(index_name).reset_index()
+
+        if meta is None:
+            meta = {'index': index_name, 'kinds': {}}
+            con.execute(f'CREATE TABLE IF NOT EXISTS "{self._meta_table_}" (key TEXT PRIMARY KEY, value TEXT)')
+            kind = self.__column_kind__(dataframe[index_name])
+            meta['kinds'][index_name] = kind
+            con.execute(f'CREATE TABLE "{self._table_}" '
+                        f'({_quote_(index_name)} {self._sql_types_[kind]} PRIMARY KEY)')
+        elif meta['index'] != index_name:
+            raise KeyError(f'The index of the dataframe must be {meta["index"]}, got: {index_name}')
+
+        # add new columns
+        for i in dataframe.columns:
+            if i not in meta['kinds']:
+                kind = self.__column_kind__(dataframe[i])
+                meta['kinds'][i] = kind
+                con.execute(f'ALTER TABLE "{self._table_}" ADD COLUMN {_quote_(i)} {self._sql_types_[kind]}')
+                if i in self.index_columns:
+                    con.execute(f'CREATE INDEX IF NOT EXISTS "idx_{i}" ON "{self._table_}" ({_quote_(i)})')
+
+        # time range queries per device run on the index only
+        if all(i in meta['kinds'] for i in ['deviceCode', 'dateFrom', 'dateTo']):
+            con.execute(f'CREATE INDEX IF NOT EXISTS "idx_deviceCode_dateTo" ON "{self._table_}" '
+                        f'("deviceCode", "dateTo", "dateFrom")')
+            con.execute(f'CREATE INDEX IF NOT EXISTS "idx_deviceCode_dateFrom" ON "{self._table_}" '
+                        f'("deviceCode", "dateFrom", "dateTo")')
+
+        con.execute(f'INSERT OR REPLACE INTO "{self._meta_table_}" (key, value) VALUES (?, ?)',
+                    ('meta', json.dumps(meta)))
+        return meta, dataframe
+
+    def load(self, columns=None, device_code=None, time_from=None, time_to=None):
+        """Loads the DB, for the parameters see `filter_dataframe`. Only the requested rows and columns are read."""
+        with self.__connect__() as con:
+            meta = self.__read_meta__(con)
+            if meta is None:
+                raise FileNotFoundError(f"{self.file_name} doesn't exist -> See the doc-string how to initialise it.")
+            kinds = meta['kinds']
+
+            read_columns = list(kinds)
+            if columns is not None:
+                read_columns = [i for i in kinds if i in columns or i == meta['index'] or
+                                (i in ['dateFrom', 'dateTo'] and (time_from is not None or time_to is not None))]
+
+            where, parameter = [], []
+            if device_code is not None and 'deviceCode' in kinds:
+                device_code = [str(i) for i in np.atleast_1d(device_code)]
+                where.append(f'"deviceCode" IN ({", ".join("?" * len(device_code))})')
+                parameter += device_code
+                if columns is not None and 'deviceCode' not in read_columns:
+                    read_columns.append('deviceCode')
+            if (time_from is not None or time_to is not None) and 'dateFrom' in kinds and 'dateTo' in kinds:
+                # a superset of the overlap, the exact selection is done by filter_dataframe. The unary `+`
+                # excludes the term from the index selection, so that each part searches only the range after t_from.
+                t_from = int(np.iinfo(np.int64).min) if time_from is None else pd_timestamp_convert(time_from).value
+                t_to = int(np.iinfo(np.int64).max) if time_to is None else pd_timestamp_convert(time_to).value
+                where.append('(("dateTo" >= ? AND +"dateFrom" <= ?) OR ("dateFrom" >= ? AND +"dateTo" <= ?))')
+                parameter += [t_from, t_to, t_from, t_to]
+
+            query = f'SELECT {", ".join(_quote_(i) for i in read_columns)} FROM "{self._table_}"'
+            if where:
+                query += ' WHERE ' + ' AND '.join(where)
+            dataframe = pandas.read_sql_query(query, con, params=parameter)
+
+        for i in dataframe.columns:
+            dataframe[i] = self.__from_sql__(dataframe[i], kinds[i])
+        dataframe = dataframe.set_index(meta['index'])
+
+        return filter_dataframe(dataframe, columns=columns, device_code=device_code,
+                                time_from=time_from, time_to=time_to)
+
+    def upsert(self, dataframe, columns=None):
+        """Inserts new rows and updates existing rows (same index).
+        PARAMETER
+        ---------
+        dataframe: pandas.DataFrame
+            the rows to write, the index is the primary key
+        columns: list, optional
+            only write these columns, the other columns of existing rows aren't changed. None (default) writes all
+            columns of the dataframe.
+        """
+        if columns is not None:
+            dataframe = dataframe[[i for i in columns if i in dataframe]]
+
+        with self.__transaction__() as con:
+            self.__upsert__(con, dataframe)
+
+    def __upsert__(self, con, dataframe):
+        meta, dataframe = self.__prepare_table__(con, dataframe)
+        index_name = meta['index']
+        names = list(dataframe.columns)
+        values = [self.__to_sql__(dataframe[i], meta['kinds'][i]) for i in names]
+
+        query = f'INSERT INTO "{self._table_}" ({", ".join(_quote_(i) for i in names)}) ' \
+                f'VALUES ({", ".join("?" * len(names))}) ON CONFLICT({_quote_(index_name)}) '
+        update = [f'{_quote_(i)} = excluded.{_quote_(i)}' for i in names if i != index_name]
+        query += f'DO UPDATE SET {", ".join(update)}' if update else 'DO NOTHING'
+        con.executemany(query, zip(*values))
+
+    def append(self, dataframe):
+        """Adds the rows to the DB, rows with the same index are replaced."""
+        self.upsert(dataframe)
+
+    def save(self, dataframe):
+        """Saves the dataframe, overwrites the existing DB in one transaction, i.e. readers see either the old or the
+        new DB."""
+        with self.__transaction__() as con:
+            con.execute(f'DROP TABLE IF EXISTS "{self._table_}"')
+            con.execute(f'DROP TABLE IF EXISTS "{self._meta_table_}"')
+            self.__upsert__(con, dataframe)
+
+
+def _quote_(name):
+    """Quote a column name for SQLite."""
+    return '"' + str(name).replace('"', '""') + '"'
@@ -7,11 +7,12 @@ import numpy as np
 import pandas
 
 from strawb.sync_db_handler.base_db_handler import BaseDBHandler
+from .db_storage import concat_dataframes, set_values
 from ..base_file_handler import BaseFileHandler
 from ..config_parser import Config
-from ..onc_downloader import ONCDownloader
+from ..onc_downloader import ONCDownloader, ListingCache
 from ..sensors import lidar, minispec, module, camera, pmtspec, muontracker
-from ..tools import human_size, ShareJobThreads, pd_timestamp_mask_between
+from ..tools import human_size, ShareJobThreads, pd_timestamp_mask_between, TimeIntervalIndex, scandir_files
 
 
 class SyncDBHandler(BaseDBHandler):
@@ -83,11 +84,24 @@ class SyncDBHandler(BaseDBHandler):
         >>> else:
         >>>     db = strawb.SyncDBHandler(load_db=False)  # doesn't load from disc
         >>> db.load_onc_db_update(output=True, save_db=True)  # get updates
+
+        With a SQLite DB file, e.g. in batch workers, load only the rows and columns needed. `save_db` writes only the
+        loaded rows and columns back (upsert), and other processes can read the DB in the meantime.
+        >>> db = strawb.SyncDBHandler(file_name='strawb_db.sqlite', load_db=False)
+        >>> db.load_db(device_code='TUMPMTSPECTROMETER001', time_from='2021-09-01', time_to='2021-09-08')
+        >>> db.add_new_columns(...)
+        >>> db.save_db()
         """
         self.onc_downloader = ONCDownloader(**kwargs)
+        self._interval_index_ = None  # TimeIntervalIndex over 'dateFrom' and 'dateTo', see `self.interval_index`
+        self.files_not_in_db = None  # files on disk which are not in the DB, see `self.update_sync_state`
 
         BaseDBHandler.__init__(self, file_name=file_name, update=update, load_db=load_db)
 
+        # cache the ONC file listings next to the DB, that updates only query the delta from ONC
+        if self.file_name is not None and self.onc_downloader.listing_cache is None:
+            self.onc_downloader.listing_cache = ListingCache(self._listing_cache_file_name_)
+
         if optimize_dataframe:
             self.optimize_dataframe()
 
@@ -158,6 +172,30 @@ class SyncDBHandler(BaseDBHandler):
                 pass
             # dataframe.sort_index(inplace=True, ignore_index=False)  # and sort it inplace
         self._dataframe = dataframe
+        self._interval_index_ = None  # positions changed, build it again when it is needed
+
+    @property
+    def interval_index(self):
+        """TimeIntervalIndex over 'dateFrom' and 'dateTo' of the dataframe, with one index per
+        ('deviceCode', 'dataProductCode'). It is built when it is used the first time, or loaded with the DB, and
+        answers time range queries by binary search. Set `self._interval_index_ = None` after changing 'dateFrom' or
+        'dateTo' in-place."""
+        if self._interval_index_ is None or len(self._interval_index_) != len(self.dataframe):
+            groups = None
+            if 'deviceCode' in self.dataframe and 'dataProductCode' in self.dataframe:
+                groups = self.dataframe.groupby(['deviceCode', 'dataProductCode'], observed=True, sort=False).indices
+            self._interval_index_ = TimeIntervalIndex(self.dataframe.dateFrom, self.dataframe.dateTo, groups=groups)
+        return self._interval_index_
+
+    @property
+    def _interval_index_file_name_(self):
+        """The file where the interval index is stored next to the DB."""
+        return os.path.splitext(self.file_name)[0] + '_interval_index.npz'
+
+    @property
+    def _listing_cache_file_name_(self):
+        """The file where the ONC listing cache is stored next to the DB."""
+        return os.path.splitext(self.file_name)[0] + '_onc_listing.pkl.gz'
 
     def add_new_db(self, dataframe2add, dataframe=None, ):
         """Updates a pandas.DataFrame to the internal pandas.DataFrame. If there is no internal pandas.DataFrame it set
@@ -183,17 +221,15 @@ class SyncDBHandler(BaseDBHandler):
             to_self = True
             dataframe = self.dataframe
 
-        if self.dataframe is None:
+        if dataframe is None:
             return dataframe2add  # no second dataframe defined -> nothing to add
 
         else:
             self._check_index_(dataframe2add)  # check the to add dataframe
             self._check_index_(dataframe)  # check the existing dataframe
-            # append it
-            self._check_double_indexes_(self.dataframe, dataframe2add, priority_column='h5_attrs')
-            dataframe = dataframe.append(dataframe2add,  # for newer pandas versions: concat = append
-                                         ignore_index=False,
-                                         verify_integrity=True)
+            # append it, in one step and without losing 'category' columns
+            self._check_double_indexes_(dataframe, dataframe2add, priority_column='h5_attrs')
+            dataframe = concat_dataframes([dataframe, dataframe2add], verify_integrity=True)
             if to_self:
                 self.dataframe = dataframe
 
@@ -271,45 +307,33 @@ class SyncDBHandler(BaseDBHandler):
             self._check_index_(dataframe2add)  # check the new dataframe
             self._check_index_(dataframe)  # check the new dataframe
 
-            # convert dtypes == 'category'
-            columns_categories = dataframe.columns[dataframe.dtypes == 'category']
-            for i in columns_categories:
-                dataframe[i] = dataframe[i].astype(object)
-
-            # handle rows with the same indexes
+            # handle rows with the same indexes, per column with boolean masks and one assignment
             intersection = dataframe2add.index.intersection(dataframe.index)
             if intersection.shape[0] != 0:
                 dataframe2add_inter = dataframe2add.loc[intersection]
+                positions = dataframe.index.get_indexer(intersection)
 
                 for col_i in dataframe2add_inter:
                     if col_i not in dataframe:
                         # append the columns at the end: self.dataframe.keys().shape[0]
                         dataframe.insert(dataframe.keys().shape[0], col_i, dataframe2add_inter[col_i])
-                    else:
-                        # handle rows with the same indexes
-                        intersection = dataframe.index.intersection(dataframe2add_inter.index)
-                        mask_null = dataframe.loc[intersection, col_i].isnull()
-
-                        if np.sum(mask_null):
-                            dataframe.loc[intersection[mask_null], col_i] = dataframe2add_inter.loc[
-                                intersection[mask_null], col_i]
-
-                        if overwrite:
-                            dataframe.loc[intersection[~mask_null], col_i] = \
-                                dataframe2add_inter.loc[intersection[~mask_null], col_i]
-                        elif np.sum(~mask_null) and (dataframe.loc[intersection[~mask_null], col_i] !=
-                                                     dataframe2add_inter.loc[intersection[~mask_null], col_i]).any():
+                        continue
+
+                    values = dataframe2add_inter[col_i].to_numpy(dtype=object)
+                    mask_null = dataframe[col_i].iloc[positions].isnull().to_numpy()
+                    if not overwrite and np.any(~mask_null):
+                        values_existing = dataframe[col_i].iloc[positions[~mask_null]].to_numpy(dtype=object)
+                        if np.any(values_existing != values[~mask_null]):
                             print(f'WARNING: duplicate column with different entries "{col_i}"')
 
+                    mask_set = np.ones_like(mask_null) if overwrite else mask_null
+                    if np.any(mask_set):
+                        dataframe[col_i] = set_values(dataframe[col_i], positions[mask_set], values[mask_set])
+
             # handle rows with the new indexes
             difference = dataframe2add.index.difference(dataframe.index)
             if difference.shape[0] != 0:
-                dataframe2add_diff = dataframe2add.loc[difference]
-                dataframe = dataframe.append(dataframe2add_diff)  # for newer pandas versions: concat = append
-
-            # convert it back to 'category'
-            for i in columns_categories:
-                dataframe[i] = dataframe[i].astype('category')
+                dataframe = concat_dataframes([dataframe, dataframe2add.loc[difference]])
 
         if in_place:
             self.dataframe = dataframe
@@ -329,25 +353,23 @@ class SyncDBHandler(BaseDBHandler):
             the column to detect from which dataset (`a` or `b`) to delete the index.
             `a` has a higher priority then `b`. If None, delete all intersections from `b`.
         """
+        intersection = a.index.intersection(b.index)
+        if priority_column is None:
+            b.drop(index=intersection, inplace=True)
+            return
+
         if priority_column not in a:
             a[priority_column] = None
         if priority_column not in b:
             b[priority_column] = None
 
-        # for i, b_i in enumerate(b.index):
-        #     if b_i in a.index:
-        for b_i in a.index.intersection(b.index):
-            if priority_column is None:
-                b.drop(index=b_i, inplace=True)
-
-            # if values in the priority_column are available in `b` but not in `a` -> `a.drop`
-            elif a[priority_column][b_i] is None and not b[priority_column][b_i] is None:
-                a.drop(index=b_i, inplace=True)
-
-            # if values in the priority_column are available in `a` but not in `b` -> `b.drop`
-            # or if values in the priority_column are not available in `a` nor `b` -> `b.drop`
-            else:
-                b.drop(index=b_i, inplace=True)
+        # if values in the priority_column are available in `b` but not in `a` -> `a.drop`
+        # if values in the priority_column are available in `a` but not in `b` -> `b.drop`
+        # or if values in the priority_column are not available in `a` nor `b` -> `b.drop`
+        mask_a = a.loc[intersection, priority_column].isnull().to_numpy() & \
+            b.loc[intersection, priority_column].notnull().to_numpy()
+        a.drop(index=intersection[mask_a], inplace=True)
+        b.drop(index=intersection[~mask_a], inplace=True)
 
     @staticmethod
     def _check_index_(dataframe):
@@ -443,49 +465,80 @@ class SyncDBHandler(BaseDBHandler):
 
         return dictionary_return
 
-    def update_sync_state(self, dataframe=None):
-        """Checks if the sync state of all items in the dataframe.
+    def update_sync_state(self, dataframe=None, stat=True):
+        """Checks if the sync state of all items in the dataframe. Instead of checking every file on its own, it lists
+        each distinct directory of the items once (strawb.tools.scandir_files) and compares the paths vectorized.
+        It also sets the columns 'size_on_disk' and 'mtime' (with stat=True), and files, which are in these
+        directories but not in the dataframe, are stored in `self.files_not_in_db`.
         PARAMETER
         ---------
         dataframe: Union[None, pandas.DataFrame], optional
             If None (default) it checks the internal dataframe. Otherwise, it checks the provided dataframe.
+        stat: bool, optional
+            if 'size_on_disk' and 'mtime' are updated, which costs one stat per file in the directories. Default: True.
+        RETURNS
+        -------
+        synced: pandas.Series
+            the updated 'synced' column
         """
         if dataframe is None:
             dataframe = self.dataframe
         if dataframe is None:  # when self.dataframe is None
             return
+
+        # normalise the paths, as the listing joins them from the directories
+        full_path = dataframe['fullPath'].astype(str).map(os.path.normpath)
+        directories = pandas.unique(full_path.map(os.path.dirname).to_numpy())
+
+        files_list = []
+        for directory_i in directories:
+            files_i = scandir_files(directory_i or os.curdir, recursive=False, stat=stat)
+            if not directory_i:  # files in the working directory, without './'
+                files_i.index = files_i.index.map(os.path.normpath)
+            files_list.append(files_i)
+        files = pandas.concat(files_list or [pandas.DataFrame()])
+
         synced_0 = dataframe['synced'].sum()
-        dataframe['synced'] = np.array([os.path.exists(i) for i in dataframe["fullPath"]], dtype=bool)
+        dataframe['synced'] = full_path.isin(files.index).to_numpy()
         synced_1 = dataframe['synced'].sum()
-        print(f'update synced form {synced_0:10.0f} to {synced_1:10.0f}; delta: {synced_1 - synced_0:10.0f}')
+        if stat:
+            for i in ['size_on_disk', 'mtime']:
+                dataframe[i] = files[i].reindex(full_path.to_numpy()).to_numpy()
+
+        self.files_not_in_db = files[~files.index.isin(full_path)]
+        print(f'update synced form {synced_0:10.0f} to {synced_1:10.0f}; delta: {synced_1 - synced_0:10.0f}; '
+              f'files not in the DB: {len(self.files_not_in_db)}')
         return dataframe['synced']
 
-    def _extract_hdf5_attribute_(self, i, dataframe, entries_converter, keys_converter):
-        full_path = dataframe.fullPath.iloc[i]
-        buffer = None  # must be None for SharedThreadJob
-        try:
-            with h5py.File(full_path, 'r') as f:
-                attrs_dict = dict(f.attrs)
-
-        except OSError as err:  # file not found or can't load it
-            for err_i in err.args:
-                if isinstance(err_i, str) and 'file signature not found' in err_i:  # no hdf5 file
-                    continue
-                if isinstance(err_i, str) and 'No such file or directory' in err_i:  # filed doesn't exist
-                    continue
-            buffer = [full_path, err]
-            # print(f' WARNING: {dataframe.filename.iloc[i]} - {err}')
-
-        except Exception as err:
-            buffer = [full_path, err]
-            # print(f' WARNING: {dataframe.filename.iloc[i]} - {err}')
+    @classmethod
+    def _extract_hdf5_attribute_(cls, item, entries_converter, keys_converter):
+        """Read the hdf5 attributes of a single file. It runs in the workers of `update_hdf5_attributes` and doesn't
+        touch the dataframe, i.e. it must be picklable and only return plain values.
+        PARAMETER
+        ---------
+        item: dict
+            {'fullPath': str, 'size': int or nan, 'mtime': float or nan}, where size and mtime are from the last scan.
+        entries_converter, keys_converter: dict
+            parsed to _convert_dict_entries_() and _convert_dict_keys_()
+        RETURNS
+        -------
+        attrs_dict: dict or None
+            the converted attributes or None if the file size and mtime didn't change since the last scan
+        size: int
+            the file size in bytes
+        mtime: float
+            the file modification time in seconds
+        """
+        stat = os.stat(item['fullPath'])
+        if stat.st_size == item['size'] and stat.st_mtime == item['mtime']:
+            return None, stat.st_size, stat.st_mtime
 
-        else:
-            attrs_dict = self._convert_dict_entries_(attrs_dict, converter=entries_converter)
-            attrs_dict = self._convert_dict_keys_(attrs_dict, converter=keys_converter)
-            dataframe.loc[full_path, 'h5_attrs'] = [attrs_dict]  # [] has to be used to set the dict - (why?)
+        with h5py.File(item['fullPath'], 'r') as f:
+            attrs_dict = dict(f.attrs)
 
-        return buffer
+        attrs_dict = cls._convert_dict_entries_(attrs_dict, converter=entries_converter)
+        attrs_dict = cls._convert_dict_keys_(attrs_dict, converter=keys_converter)
+        return attrs_dict, stat.st_size, stat.st_mtime
 
     def get_mask_h5_attrs(self, dataframe=None):
         """Return a mask which mask all indexes where the column 'h5_attrs' is not 'np.nan' """
@@ -497,9 +550,13 @@ class SyncDBHandler(BaseDBHandler):
         return ~mask
 
     def update_hdf5_attributes(self, dataframe=None, update_existing=False,
-                               entries_converter=None, keys_converter=None, add_hdf5_attributes2dataframe=True):
+                               entries_converter=None, keys_converter=None, add_hdf5_attributes2dataframe=True,
+                               skip_unchanged=False, thread_n=None, backend='process'):
         """Get all hdf5 file attributes from the dataframe and adds it as 'h5_attrs' to it. It can also replace keys or
-        entries of the hdf5 attribute dictionary. This is controlled by entries_converter and keys_converter
+        entries of the hdf5 attribute dictionary. This is controlled by entries_converter and keys_converter.
+        The files are read in parallel by `thread_n` workers which only return the attributes, the results are added
+        to the dataframe at once afterwards. The file size and mtime at the scan are stored in the columns
+        'h5_attrs_size' and 'h5_attrs_mtime'.
         PARAMETER
         ---------
         dataframe: pandas.DataFrame
@@ -516,6 +573,14 @@ class SyncDBHandler(BaseDBHandler):
         add_hdf5_attributes2dataframe: bool, optional
             if the hdf5_attributes should be added to the dataframe as new columns.
             A hdf5_attributes={'file_id'=123} will result in a dataframe column 'file_id'.
+        skip_unchanged: bool, optional
+            only with update_existing=True. If True, files whose size and mtime didn't change since the last scan are
+            skipped. Default: False, read all files again, e.g. when the converters changed.
+        thread_n: int or None, optional
+            the number of workers. Default: None, takes os.cpu_count().
+        backend: str, optional
+            either 'process' (default) or 'thread', see strawb.tools.ShareJobThreads. h5py serialises file access
+            across threads, therefore processes scale better.
         """
 
         if dataframe is None:
@@ -548,15 +613,42 @@ class SyncDBHandler(BaseDBHandler):
             keys_converter = {'mes_typ': 'measurement_type', 'mes_duration': 'measurement_duration',
                               'mes_steps': 'measurement_steps'}
 
-        sjt = ShareJobThreads(thread_n=1, unit='files')  # multi threading isn't faster here, use the progress bar only
-        sjt.do(self._extract_hdf5_attribute_,
-               np.argwhere(items_to_check.to_numpy(dtype=bool)).flatten(),
-               dataframe=dataframe,
-               entries_converter=entries_converter,
-               keys_converter=keys_converter)
-
-        if sjt.return_buffer:
-            print(f'hdf5 attributes failed for {len(sjt.return_buffer)} files')
+        for i in ['h5_attrs_size', 'h5_attrs_mtime']:
+            if i not in dataframe:
+                dataframe.insert(dataframe.columns.shape[0], i, np.nan)
+
+        positions = np.argwhere(items_to_check.to_numpy(dtype=bool)).flatten()
+        items = pandas.DataFrame({'fullPath': dataframe.fullPath.iloc[positions].to_numpy(),
+                                  'size': np.nan, 'mtime': np.nan})
+        if update_existing and skip_unchanged:
+            items['size'] = dataframe['h5_attrs_size'].iloc[positions].to_numpy()
+            items['mtime'] = dataframe['h5_attrs_mtime'].iloc[positions].to_numpy()
+
+        sjt = ShareJobThreads(thread_n=thread_n or os.cpu_count(), unit='files', fmt='{fullPath}', ordered=True,
+                              backend=backend)
+        results = sjt.do(self._extract_hdf5_attribute_,
+                         items.to_dict('records'),
+                         entries_converter=entries_converter,
+                         keys_converter=keys_converter)
+
+        if sjt.errors:
+            print(f'hdf5 attributes failed for {len(sjt.errors)} files')
+
+        # merge the results in one step, failed files are None and unchanged files have attrs_dict=None
+        read = np.array([j is not None for j in results or []], dtype=bool)
+        if read.any():
+            results = [j for j in results if j is not None]
+            attrs_dict = np.empty(len(results), dtype=object)  # object array, to keep the dicts as items
+            attrs_dict[:] = [j[0] for j in results]
+            changed = np.array([j is not None for j in attrs_dict], dtype=bool)
+
+            h5_attrs = dataframe['h5_attrs'].to_numpy(dtype=object, copy=True)
+            h5_attrs[positions[read][changed]] = attrs_dict[changed]
+            dataframe['h5_attrs'] = h5_attrs
+            for i, j in [('h5_attrs_size', 1), ('h5_attrs_mtime', 2)]:
+                column = dataframe[i].to_numpy(dtype=np.float64, copy=True)
+                column[positions[read]] = [k[j] for k in results]
+                dataframe[i] = column
 
         if add_hdf5_attributes2dataframe:
             h5_dataframe = self.dataframe_from_hdf5_attributes(dataframe=dataframe)
@@ -612,7 +704,7 @@ class SyncDBHandler(BaseDBHandler):
         return h5_dataframe
 
     def update_db_and_load_files(self, dataframe=None, output=False, download=False, add_hdf5_attributes=True,
-                                 add_dataframe=True, add_file_version=True, save_db=False):
+                                 add_dataframe=True, add_file_version=True, save_db=False, download_kwargs=None):
         """Depending on which options are set, this function does any combination of the following 4 tasks:
         1. `download=True` -> loads all missing files from the dataframe
         2. `add_hdf5_attributes=True` -> updates the hdf5 attributes from the files which are present on the disc
@@ -636,9 +728,8 @@ class SyncDBHandler(BaseDBHandler):
             if the dataframe should be added to the internal dataframe or not. Default is True.
         save_db: bool, optional
             if it saves the DB on disc. Default: False
-        kwargs: dict, optional
-            parsed to ONCDownloader().get_files_structured(**kwargs) to filter the files. Parameters are e.g.:
-            dev_codes, date_from, date_to, extensions, min_file_size, and max_file_size.
+        download_kwargs: dict or None, optional
+            parsed to ONCDownloader().download_files(**download_kwargs), e.g. product_priority, max_bandwidth.
         """
         # remove the pointer to the original dataframe,
         # i.e. if it is a slice <-> update_db_and_load_files(dataframe[mask])
@@ -656,8 +747,10 @@ class SyncDBHandler(BaseDBHandler):
         if download:
             if output:
                 print('\n-> Download the files from the ONC server')
-            # download the files which passed the filter
-            self.onc_downloader.getDirectFiles(filters_or_result=dataframe[~dataframe['synced']])
+            # download the files which passed the filter, scheduled by priority
+            errors = self.onc_downloader.download_files(dataframe[~dataframe['synced']], **(download_kwargs or {}))
+            if errors:
+                print(f'  Download failed for {len(errors)} files')
             self.update_sync_state(dataframe=dataframe)
 
         if add_hdf5_attributes:
@@ -697,17 +790,23 @@ class SyncDBHandler(BaseDBHandler):
         kwargs.update(dict(date_from='strawb_all'))
         return self.load_onc_db(**kwargs)
 
-    def load_onc_db_update(self, **kwargs):
+    def load_onc_db_update(self, reconcile=False, **kwargs):
         """Load the newest entries of the ONC DB. If the local DB doesn't exist, it loads the entire db
         `date_from='strawb_all'`. If the local DB exists, it takes the time of the latest entry. If this time is
         older than a day, it updated the entries from that date incl. the day before. If it is less than a day, it
         doesn't load something.
         PARAMETER
         ---------
+        reconcile: bool, optional
+            if True, it lists the entire db `date_from='strawb_all'` from ONC and replaces the cached listings, e.g.
+            to catch files which were re-archived or deleted on the server. Default: False.
         kwargs: dict, optional
             parsed to load_onc_db(**kwargs). If 'date_from' is in kwargs, it is overwritten accordingly.
         """
-        if self.dataframe is None:
+        if reconcile:
+            kwargs.update(dict(date_from='strawb_all', reconcile=True))
+            return self.load_onc_db(**kwargs)
+        elif self.dataframe is None:
             kwargs.update(dict(date_from='strawb_all'))
             return self.load_onc_db(**kwargs)
         else:
@@ -723,7 +822,7 @@ class SyncDBHandler(BaseDBHandler):
             return None  # nothing loaded
 
     def load_onc_db(self, output=False, download=False, add_hdf5_attributes=True, add_file_version=True,
-                    add_dataframe=True, save_db=False,
+                    add_dataframe=True, save_db=False, download_kwargs=None,
                     **kwargs):
         """Loads and downloads the db directly from the ONC server.
 
@@ -741,6 +840,8 @@ class SyncDBHandler(BaseDBHandler):
             if the dataframe should be added to the internal dataframe or not. Default is True.
         save_db: bool, optional
             if it saves the DB on disc. Default: False
+        download_kwargs: dict or None, optional
+            parsed to ONCDownloader().download_files(**download_kwargs), e.g. product_priority, max_bandwidth.
         kwargs: dict, optional
             parsed to ONCDownloader().get_files_structured(**kwargs) to filter the files. Parameters are e.g.:
             dev_codes, date_from, date_to, extensions, min_file_size, and max_file_size.
@@ -755,7 +856,8 @@ class SyncDBHandler(BaseDBHandler):
                                                   add_hdf5_attributes=add_hdf5_attributes,
                                                   add_file_version=add_file_version,
                                                   add_dataframe=add_dataframe,
-                                                  save_db=save_db)
+                                                  save_db=save_db,
+                                                  download_kwargs=download_kwargs)
 
         return dataframe
 
@@ -827,28 +929,37 @@ class SyncDBHandler(BaseDBHandler):
         else:
             return sensor.FileHandler(pd_item.fullPath, *args, **kwargs)
 
-    def _update_file_version_(self, i, dataframe=None):
-        """Gets and updates the file version in the dataframe. The dataframe must have the column 'file_version'.
+    @classmethod
+    def _get_file_version_(cls, item):
+        """Gets the file version of a single file. It runs in the workers of `update_file_version` and doesn't touch
+        the dataframe, i.e. it must be picklable and only return plain values. The FileHandler only links the hdf5
+        groups and datasets to detect the version (the layout), no data is read.
         PARAMETER
         ---------
-        i: int or str
-            could an integer or string to select an item from the dataframe. Or directly a pandas.Series.
-            The integer is used as a numeric index and the string as the index (fullPath) of the pandas dataframe.
-        dataframe: pandas.DataFrame ro None, optional
-            the dataframe to which i_or_full_path revers. If None, default, it takes the internal dataframe.
+        item: dict
+            {'fullPath': str, 'dataProductCode': str}
+        RETURNS
+        -------
+        full_path: str
+            the fullPath of the item
+        file_version: int or str
+            the file version, or a negative error code, see BaseFileHandler.error2codes.
         """
-        file_handler = self.open_file(i=i, dataframe=dataframe, raise_error=False)
+        sensor = cls.sensor_mapping[item['dataProductCode']]
+        if sensor is None:
+            return item['fullPath'], BaseFileHandler.error2codes['FileHandler not implemented']
 
-        if file_handler is not None:
-            dataframe.loc[file_handler.file_name, 'file_version'] = file_handler.file_version
-        else:
-            err = BaseFileHandler.error2codes['FileHandler not implemented']
-            dataframe.loc[dataframe.fullPath.iloc[i], 'file_version'] = err
+        try:
+            file_handler = sensor.FileHandler(item['fullPath'], raise_error=False)
+        except FileNotFoundError:
+            return item['fullPath'], BaseFileHandler.error2codes['file not exist']
 
-        # print(i, file_handler, dataframe.loc[dataframe.fullPath.iloc[i], 'file_version'])
-        return dataframe.loc[dataframe.fullPath.iloc[i], 'file_version']
+        try:
+            return item['fullPath'], file_handler.file_version
+        finally:
+            file_handler.close()
 
-    def update_file_version(self, dataframe=None, update_existing=False):
+    def update_file_version(self, dataframe=None, update_existing=False, thread_n=None, backend='process'):
         """Update the file version/state of all items in the dataframe. A negative file version indicate errors.
         The translation of negative file version is located at: strawb.BaseFileHandler.codes2error or
         the inverse strawb.BaseFileHandler.error2codes. The example list all different file version together with the
@@ -868,6 +979,12 @@ class SyncDBHandler(BaseDBHandler):
         ---------
         dataframe: Union[None, pandas.DataFrame], optional
             If None (default) it checks the internal dataframe. Otherwise, it checks the provided dataframe.
+        update_existing: bool, optional
+            if existing file versions should be checked again (True) or not (False, default)
+        thread_n: int or None, optional
+            the number of workers. Default: None, takes os.cpu_count().
+        backend: str, optional
+            either 'process' (default) or 'thread', see strawb.tools.ShareJobThreads.
         """
         if dataframe is None:
             dataframe = self.dataframe
@@ -895,22 +1012,33 @@ class SyncDBHandler(BaseDBHandler):
             items_to_check &= dataframe.file_version.isnull()  # takes all None or np.nan
 
         # mark all file where the FileHandler is not implemented
-        dataframe.file_version.where(~items_not_implemented,  # it sets items with False <-> ~
-                                     other=BaseFileHandler.error2codes['FileHandler not implemented'],
-                                     inplace=True)
-
-        # only 1 thread works here otherwise some files are labeled wrong (why?)
-        # + multi threading isn't faster here, use the progress bar only
-        sjt = ShareJobThreads(thread_n=1, unit='files')
-        sjt.do(self._update_file_version_,
-               np.argwhere(items_to_check.to_numpy(dtype=bool)).flatten(),
-               dataframe=dataframe)
+        dataframe['file_version'] = dataframe.file_version.where(
+            ~items_not_implemented,  # it sets items with False <-> ~
+            other=BaseFileHandler.error2codes['FileHandler not implemented'])
+
+        # the workers only return the versions, the dataframe is updated at once afterwards
+        positions = np.argwhere(items_to_check.to_numpy(dtype=bool)).flatten()
+        items = dataframe[['fullPath', 'dataProductCode']].iloc[positions].astype(str)
+        sjt = ShareJobThreads(thread_n=thread_n or os.cpu_count(), unit='files', fmt='{fullPath}', ordered=True,
+                              backend=backend)
+        results = sjt.do(self._get_file_version_, items.to_dict('records'))
+
+        if results:
+            file_version = np.full(len(results), BaseFileHandler.error2codes['unknown error'], dtype=object)
+            for i, j in enumerate(results):
+                if j is not None:  # None if the worker failed
+                    file_version[i] = j[1]
+
+            column = dataframe['file_version'].to_numpy(dtype=object, copy=True)
+            column[positions] = file_version
+            # infer_objects keeps a float column unless there are str versions, e.g. 'multiple lucifer versions'
+            dataframe['file_version'] = pandas.Series(column, index=dataframe.index).infer_objects()
 
         return dataframe
 
     def date_mask_between(self, time_from, time_to, dataframe=None, tz="UTC", include_time_to=False):
         """Mask files based on 'dateFrom' and 'dateTo' which overlap with a time range: [time_from, time_to].
-        It is based on strawb.tools.pd_timestamp_mask_between.
+        It is based on strawb.tools.pd_timestamp_mask_between, or for the internal dataframe on `self.interval_index`.
         PARAMETER
         ---------
         time_from, time_to: datetime-like, str, int, float
@@ -927,11 +1055,43 @@ class SyncDBHandler(BaseDBHandler):
             masked series of entries which overlap with the time range
         """
         if dataframe is None:
-            dataframe = self.dataframe
+            mask = self.interval_index.mask_between(time_from, time_to, tz=tz, include_time_to=include_time_to)
+            return pandas.Series(mask, index=self.dataframe.index)
 
         return pd_timestamp_mask_between(dataframe.dateFrom, dataframe.dateTo, time_from, time_to,
                                          tz=tz, include_time_to=include_time_to)
 
+    def positions_between(self, time_from, time_to, device_code=None, data_product_code=None, tz="UTC",
+                          include_time_to=False):
+        """Row positions of files based on 'dateFrom' and 'dateTo' which overlap with a time range:
+        [time_from, time_to], i.e. `self.dataframe.iloc[positions]`. Same selection as `date_mask_between` but with
+        a binary search on `self.interval_index`.
+        PARAMETER
+        ---------
+        time_from, time_to: datetime-like, str, int, float
+            Value to be converted to Timestamp (using `strawb.tools.pd_timestamp_convert()`).
+        device_code: str, optional
+            only files of the deviceCode, e.g. 'TUMPMTSPECTROMETER001'. None (default) takes all.
+        data_product_code: str, optional
+            only files of the dataProductCode, e.g. 'PMTSD'. None (default) takes all.
+        tz : str, pytz.timezone, dateutil.tz.tzfile or None, optional
+            Time zone for time_from, time_to. Default: "UTC"
+        include_time_to : bool, optional
+            `True` to include `time_to` (`<=`) or `False`(default) to exclude `time_to` (`<`)
+        RETURNS
+        -------
+        positions: ndarray
+            sorted row positions of the files
+        """
+        key = None
+        if device_code is not None or data_product_code is not None:
+            key = [i for i in self.interval_index.groups if i is not None and
+                   (device_code is None or i[0] == device_code) and
+                   (data_product_code is None or i[1] == data_product_code)]
+
+        return self.interval_index.positions_between(time_from, time_to, key=key, tz=tz,
+                                                     include_time_to=include_time_to)
+
     def optimize_dataframe(self, exclude_columns=None, include_columns=None):
         """function which optimize the dataframe to reduce the size, manly RAM but also on disc.
         It uses converts the columns as defined in this function. Which is manly by introducing pandas dtype "category"
@@ -959,6 +1119,18 @@ class SyncDBHandler(BaseDBHandler):
         # use the super implementation
         BaseDBHandler.optimize_dataframe(self, exclude_columns=exclude_columns, include_columns=include_columns)
 
+    def load_db(self, columns=None, device_code=None, time_from=None, time_to=None):
+        BaseDBHandler.load_db(self, columns=columns, device_code=device_code, time_from=time_from, time_to=time_to)
+
+        # load the interval index, if it exists and matches the DB. A partial DB never matches the saved index.
+        self._interval_index_ = None
+        if self.dataframe is not None and not any(self._partial_db_.values()) \
+                and os.path.exists(self._interval_index_file_name_):
+            fingerprint = TimeIntervalIndex.get_fingerprint(self.dataframe.dateFrom, self.dataframe.dateTo)
+            self._interval_index_ = TimeIntervalIndex.load(self._interval_index_file_name_, fingerprint=fingerprint)
+
     def save_db(self):
         self.optimize_dataframe()
         BaseDBHandler.save_db(self)
+        if self.dataframe is not None and not any(self._partial_db_.values()):
+            self.interval_index.save(self._interval_index_file_name_)
@@ -1,23 +1,97 @@
+import collections
 import os
 import sys
 import threading
-import time
 
 import h5py
 import numpy as np
-import pandas
-import scipy.stats
-import scipy.signal
-from matplotlib import pyplot as plt
-import matplotlib.colors as mcolors
+
 
 #  ---- HDF5 Helper ----
-# add new asdatetime to h5py Dataset similar to asdtype for datetime64 when time is given as float in seconds
-import tqdm
+_unit_dict_ = {'s': 1, 'ms': 1e3, 'us': 1e6, 'ns': 1e9, 'ps': 1e12}
+
+# cache of converted time axes of entire datasets,
+# {(file name, modification time, dataset name, shape, dtype, scale): ndarray}
+_asdatetime_cache_ = collections.OrderedDict()
+_asdatetime_cache_lock_ = threading.Lock()
+asdatetime_cache_size = 32  # maximum number of cached datasets
+asdatetime_cache_bytes = 2 ** 28  # maximum size of all cached datasets in bytes
+
+
+def clear_asdatetime_cache():
+    """Clear the cache of converted time axes of `AsDatetimeWrapper`."""
+    with _asdatetime_cache_lock_:
+        _asdatetime_cache_.clear()
+
+
+def _datetime_dtype_(precision='ns', date_type='datetime'):
+    """Check the parameters and returns the datetime64 or timedelta64 dtype and the scale to the precision."""
+    if precision.lower() not in _unit_dict_:
+        raise ValueError(f'precision not in unit_dict (unit_dict), got: {precision}')
+    if date_type.lower() not in ['datetime', 'timedelta']:
+        raise ValueError(f'date_type has to be out of: `datetime` or `timedelta`. Got: {date_type}')
+
+    return np.dtype(f'{date_type.lower()}64[{precision.lower()}]'), float(_unit_dict_[precision.lower()])
+
+
+def _seconds2int_(array, scale, out=None, chunk_size=2 ** 16):
+    """Converts timestamps (floats or integers) to int64 in units of 1/scale, i.e. the integer representation of
+    datetime64. Floats are split in integer and fractional part, to not lose precision for 'ns' when the timestamp is
+    in seconds since epoch, and non-finite values are set to NaT. The conversion is done in chunks of `chunk_size` to
+    keep the temporary arrays small.
+    PARAMETER
+    ---------
+    array: ndarray
+        the timestamps, e.g. in seconds since epoch
+    scale: float
+        the factor to scale the timestamps to the integer units, e.g. 1e9 for seconds to ns
+    out: ndarray, optional
+        int64 array with the same shape as array to write the result into. It can share the memory with array,
+        e.g. `array.view(np.int64)` for an array with dtype float64, for an in-place conversion.
+    chunk_size: int, optional
+        the number of items which are converted at once.
+    RETURNS
+    -------
+    out: ndarray
+        int64 array with the same shape as array
+    """
+    if out is None:
+        out = np.empty(array.shape, dtype=np.int64)
+
+    array_flat = array.reshape(-1)
+    out_flat = out.reshape(-1)  # a view as out is contiguous
+
+    if np.issubdtype(array.dtype, np.integer) and float(scale).is_integer():
+        for i in range(0, array_flat.shape[0], chunk_size):
+            np.multiply(array_flat[i:i + chunk_size], np.int64(scale), out=out_flat[i:i + chunk_size], casting='unsafe')
+        return out
+
+    if not float(scale).is_integer():
+        # no exact integer scale, i.e. the split doesn't help
+        for i in range(0, array_flat.shape[0], chunk_size):
+            out_flat[i:i + chunk_size] = array_flat[i:i + chunk_size] * scale
+        return out
+
+    scale_int = np.int64(scale)
+    for i in range(0, array_flat.shape[0], chunk_size):
+        chunk = array_flat[i:i + chunk_size].astype(np.float64)  # copy, as out can share the memory with array
+        finite = np.isfinite(chunk)
+        chunk[~finite] = 0.
+        integer = np.trunc(chunk)
+        chunk -= integer  # fractional part, exact for float
+        chunk *= scale
+        np.trunc(chunk, out=chunk)
+
+        out_chunk = out_flat[i:i + chunk_size]
+        np.multiply(integer, scale_int, out=out_chunk, casting='unsafe')
+        out_chunk += chunk.astype(np.int64)
+        out_chunk[~finite] = np.iinfo(np.int64).min  # NaT
+    return out
 
 
+# add new asdatetime to h5py Dataset similar to asdtype for datetime64 when time is given as float in seconds
 class AsDatetimeWrapper(object):
-    def __init__(self, dset, precision='ns', date_type='datetime', scale2seconds=1.):
+    def __init__(self, dset, precision='ns', date_type='datetime', scale2seconds=1., cache=True):
         """Wrapper to convert data on reading from a dataset. 'asdatetime' is similar to asdtype of h5py Datasets for
         and can handle datetime64 when time is given as float in seconds.
         PARAMETER
@@ -33,6 +107,11 @@ class AsDatetimeWrapper(object):
             E.g.: if the input is in units:
             - 'hours' -> scale2seconds=3600. # seconds/hour
             - 'days' -> scale2seconds=24*3600. # seconds/days
+        cache: bool, optional
+            if True (default), reading the entire dataset, i.e. `[:]` or `[()]`, is cached per dataset and file
+            modification time. Reading the same time axis again, e.g. in several `get_pandas_*`, skips the conversion
+            and returns a copy of the cached array. The cache holds up to `asdatetime_cache_size` datasets and
+            `asdatetime_cache_bytes`. See `clear_asdatetime_cache`.
 
         a = np.array([1624751981.4857635], float)  # time in seconds since epoch
         a.asdatetime('us')
@@ -40,22 +119,52 @@ class AsDatetimeWrapper(object):
         """
         self._dset = dset
 
-        self.unit_dict = {'s': 1, 'ms': 1e3, 'us': 1e6, 'ns': 1e9, 'ps': 1e12}
-
-        if precision.lower() not in self.unit_dict:
-            raise ValueError(f'precision not in unit_dict (unit_dict), got: {precision}')
-        if date_type.lower() not in ['datetime', 'timedelta']:
-            raise ValueError(f'date_type has to be out of: `datetime` or `timedelta`. Got: {date_type}')
-
-        self._dtype = np.dtype(f'{date_type.lower()}64[{precision.lower()}]')
-        self.scale = float(self.unit_dict[precision.lower()])
+        self.unit_dict = _unit_dict_
+        self._dtype, self.scale = _datetime_dtype_(precision=precision, date_type=date_type)
         self.scale2seconds = scale2seconds
+        self.cache = cache
+
+    def __cache_key__(self):
+        """The key of the dataset in the cache or None if the dataset can't be cached."""
+        try:
+            file_name = self._dset.file.filename
+            return (file_name, os.stat(file_name).st_mtime_ns, self._dset.name, self._dset.shape, self._dtype,
+                    self.scale2seconds)
+        except (AttributeError, ValueError, OSError):  # no h5py.Dataset, the file is closed or not on disk
+            return None
 
     def __getitem__(self, args):
-        return (self._dset.__getitem__(args, ) * self.scale * self.scale2seconds).astype(self._dtype)
+        is_entire = (isinstance(args, slice) and args == slice(None)) or (isinstance(args, tuple) and args == ()) \
+            or args is Ellipsis
+        key = self.__cache_key__() if self.cache and is_entire else None
+        if key is not None:
+            with _asdatetime_cache_lock_:
+                if key in _asdatetime_cache_:
+                    _asdatetime_cache_.move_to_end(key)
+                    return _asdatetime_cache_[key].copy()
+
+        data = np.asarray(self._dset.__getitem__(args, ))
+        if data.dtype == np.float64 and data.flags.c_contiguous and data.flags.writeable:
+            # convert in-place, float64 and int64 have the same size
+            out = _seconds2int_(data, self.scale * self.scale2seconds, out=data.view(np.int64))
+        else:
+            out = _seconds2int_(data, self.scale * self.scale2seconds)
+        out = out.view(self._dtype)
+        if out.ndim == 0:  # a single item, return the numpy scalar
+            return out[()]
+
+        if key is not None and out.nbytes <= asdatetime_cache_bytes:
+            cached = out.copy()  # the caller can modify out
+            cached.setflags(write=False)
+            with _asdatetime_cache_lock_:
+                _asdatetime_cache_[key] = cached
+                while len(_asdatetime_cache_) > asdatetime_cache_size or \
+                        sum(i.nbytes for i in _asdatetime_cache_.values()) > asdatetime_cache_bytes:
+                    _asdatetime_cache_.popitem(last=False)
+        return out
 
     # @staticmethod
-    def asdatetime(self, unit=None, precision='ns', date_type='datetime', scale2seconds=1.):
+    def asdatetime(self, unit=None, precision='ns', date_type='datetime', scale2seconds=1., cache=True):
         """Converts timestamps of floats with precision seconds to numpy.datetime of the defined precision.
         PARAMETER
         ---------
@@ -70,6 +179,8 @@ class AsDatetimeWrapper(object):
             E.g.: if the input is in units:
             - 'hours' -> scale2seconds=3600. # seconds/hour
             - 'days' -> scale2seconds=24*3600. # seconds/days
+        cache: bool, optional
+            if True (default), the converted entire dataset is cached, see AsDatetimeWrapper.
         RETURNS
         -------
         array: ndarray
@@ -77,10 +188,11 @@ class AsDatetimeWrapper(object):
         """
         if unit is not None:
             precision = unit
-        return AsDatetimeWrapper(dset=self, precision=precision, date_type=date_type, scale2seconds=scale2seconds)
+        return AsDatetimeWrapper(dset=self, precision=precision, date_type=date_type, scale2seconds=scale2seconds,
+                                 cache=cache)
 
 
-def asdatetime(array, precision='ns', date_type='datetime', scale2seconds=1.):
+def asdatetime(array, precision='ns', date_type='datetime', scale2seconds=1., out=None):
     """Converts timestamps of floats with precision seconds to numpy.datetime of the defined precision.
     PARAMETER
     ---------
@@ -95,25 +207,26 @@ def asdatetime(array, precision='ns', date_type='datetime', scale2seconds=1.):
         E.g.: if the input is in units:
         - 'hours' -> scale2seconds=3600. # seconds/hour
         - 'days' -> scale2seconds=24*3600. # seconds/days
+    out: ndarray, optional
+        int64 or datetime64 array with the same shape to write the result into, e.g. `array.view(np.int64)` to convert
+        a float64 array in-place.
     RETURNS
     -------
     array: ndarray
         numpy array with as dtype=datetime64 and the defined precision
     """
-    unit_dict = {'s': 1, 'ms': 1e3, 'us': 1e6, 'ns': 1e9, 'ps': 1e12}
-    if precision.lower() not in unit_dict:
-        raise ValueError(f'precision not in unit_dict (unit_dict), got: {precision}')
-    if date_type.lower() not in ['datetime', 'timedelta']:
-        raise ValueError(f'date_type has to be out of: `datetime` or `timedelta`. Got: {date_type}')
+    dtype, scale = _datetime_dtype_(precision=precision, date_type=date_type)
 
     if not isinstance(array, np.ndarray):
         # try to convert it to a numpy array
         array = np.array(array)
 
-    dtype = np.dtype(f'{date_type.lower()}64[{precision.lower()}]')
-    scale = float(unit_dict[precision.lower()])
-
-    return (array * scale * scale2seconds).astype(dtype)
+    if out is not None:
+        out = out.view(np.int64)
+    out = _seconds2int_(array, scale * scale2seconds, out=out).view(dtype)
+    if out.ndim == 0:  # a single item, return the numpy scalar
+        return out[()]
+    return out
 
 
 def datetime2float(array):
@@ -130,7 +243,8 @@ def datetime2float(array):
 
 
 class ShareJobThreads:
-    def __init__(self, thread_n=3, fmt=None, unit='items', buffer_type=list):
+    def __init__(self, thread_n=3, fmt=None, unit='items', buffer_type=list, ordered=False, backend='thread',
+                 queue_size=None, progress_bar=True):
         """ A Class which spreads a iterable job defined by a function f to n threads. It is basically a Wrapper for:
         for i in iterable:
             f(i)
@@ -139,12 +253,13 @@ class ShareJobThreads:
         sjt = ShareJobThreads(4)  # for 4 threads
         sjt.do(f, iterable)
 
-        In addition it provides a progress bar.
+        In addition it provides a progress bar. It is based on concurrent.futures and submits only `queue_size` items
+        at once. Exceptions are captured per item in `errors` as {index: exception}.
 
         PARAMETER
         ---------
         thread_n: int, optional
-            the number of threads which will be used to execute the functions
+            the number of threads (or processes) which will be used to execute the functions
         fmt: str, optional
             formatter for the bar, if not None, the iterable has to be a dict, i.e. iterable=[{'a':1, 'b':2},...], and
             the fmt: '{a}-{b}'.
@@ -152,21 +267,38 @@ class ShareJobThreads:
             the unit shows up in the progress bar as '<unit>/s'. Default: 'items'
         buffer_type: type, optional
             defines the buffer type which stores the return of f(iterable[i]). Either a list (default) or a dict. The
-            dict stores in the format: {iterable[i]: f(iterable[i])}.
+            dict stores in the format: {iterable[i]: f(iterable[i])}, or {i: f(iterable[i])} if iterable[i] isn't
+            hashable. Failed items aren't part of the dict.
+        ordered: bool, optional
+            only for buffer_type=list. If True, the list matches the iterable, i.e. buffer[i] = f(iterable[i]) and
+            failed items are None. If False (default), the list holds all results which are not None in the order of
+            completion.
+        backend: str, optional
+            either 'thread' (default) or 'process'. With 'process', f, the items and the kwargs must be picklable.
+        queue_size: int, optional
+            maximum number of submitted but not finished items. Default: None, takes 2*thread_n.
+        progress_bar: bool, optional
+            if a tqdm progress bar is shown. Default: True
         """
         self.thread_n = thread_n
         self.lock = threading.Lock()
-        self.thread_bar = None
         self.active = False
-        self.event = threading.Event()
 
         if buffer_type in [list, dict]:
             self.buffer_type = buffer_type
         else:
             raise TypeError(f"buffer_type must be 'list' or 'dict'. Got: {buffer_type}")
+        if backend not in ['thread', 'process']:
+            raise ValueError(f"backend must be 'thread' or 'process'. Got: {backend}")
+
+        self.ordered = ordered
+        self.backend = backend
+        self.queue_size = queue_size
+        self.progress_bar = progress_bar
+
         self.return_buffer = None  # to store all returns from the functions
+        self.errors = {}  # to store all exceptions {index: exception}
 
-        self.threads = None  # the _worker_ threads
         self.iterable = None  # the iterable
         self.kwargs = {}  # kwargs for the f -> f(i, **self.kwargs)
         self.i = None  # the actual index of the next item
@@ -193,7 +325,14 @@ class ShareJobThreads:
         unit: str, optional
             the unit shows up in the progress bar as '<unit>/s'. Default: None, takes the value from the class
             initialisation.
+        RETURNS
+        -------
+        return_buffer: list or dict
+            the results, see `buffer_type` and `ordered` at the initialisation. None if there is no result.
         """
+        import concurrent.futures
+        import tqdm
+
         self.active = True
         self.iterable = iterable
         self.kwargs = kwargs
@@ -201,87 +340,430 @@ class ShareJobThreads:
         self.i_bar = 0
         self.f = f
 
-        self.return_buffer = self.buffer_type()
+        self.errors = {}
+        if self.buffer_type is list and self.ordered:
+            self.return_buffer = [None] * len(iterable)
+        else:
+            self.return_buffer = self.buffer_type()
 
         if unit is not None:
             self.unit = unit
 
-        self.threads = []
-
-        for i in range(self.thread_n):
-            thread_i = threading.Thread(target=self._worker_)
-            thread_i.start()
-            self.threads.append(thread_i)
+        queue_size = self.queue_size if self.queue_size is not None else 2 * self.thread_n
+        executor_type = {'thread': concurrent.futures.ThreadPoolExecutor,
+                         'process': concurrent.futures.ProcessPoolExecutor}[self.backend]
+
+        with executor_type(max_workers=self.thread_n) as executor, \
+                tqdm.tqdm(total=len(iterable), file=sys.stdout, unit=self.unit, smoothing=0,
+                          disable=not self.progress_bar) as bar:
+            pending = {}  # {future: index}
+            iterator = enumerate(iterable)
+            while self.active or pending:
+                # keep the queue filled
+                while self.active and len(pending) < queue_size:
+                    index, item = next(iterator, (None, None))
+                    if index is None:
+                        self.active = False
+                        break
+                    pending[executor.submit(f, item, **kwargs)] = index
+                    self.i = index + 1
+
+                if not pending:
+                    break
+
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    index = pending.pop(future)
+                    self._add_result_(index, future)
+
+                    bar.set_postfix({'i': self._item_str_(index)})
+                    bar.update()
 
-        self.thread_bar = threading.Thread(target=self._update_bar_)
-        self.thread_bar.start()
-        self.thread_bar.join()
+        self.active = False
+        if self.errors:
+            print(f'Errors occurred at {len(self.errors)} of {len(iterable)} {self.unit}')
 
         if self.return_buffer not in [list(), dict()]:
             return self.return_buffer
 
-    def _update_bar_(self, ):
-        """The function for the thread 'thread_bar' which takes care of the bar updates."""
-        last_i = 0
-
-        with tqdm.tqdm(self.iterable,
-                       file=sys.stdout,
-                       unit=self.unit, smoothing=0) as bar:
-            while any([thread_i.is_alive() for thread_i in self.threads]) or last_i != self.i_bar:
-                with self.lock:
-                    # print(self.i, self.active)
-                    if last_i != self.i_bar:
-                        for i in range(self.i_bar - last_i):
-                            str_i = self.iterable[self.i - 1 - i]
-                            if self.fmt is not None and isinstance(self.iterable[self.i - 1 - i], dict):
-                                str_i = self.fmt.format(**self.iterable[self.i - 1 - i])
+    def _item_str_(self, index):
+        """The string of the item with `index` for the progress bar."""
+        item = self.iterable[index]
+        if self.fmt is not None and isinstance(item, dict):
+            return self.fmt.format(**item)
+        return item
 
-                            bar.set_postfix({'i': str_i})
-                            bar.update()
-
-                        last_i = self.i_bar
-                time.sleep(0.1)  # delay a bit
+    def _add_result_(self, index, future):
+        """Add the result or the exception of the finished future to the buffers."""
+        with self.lock:
+            self.i_bar += 1
+            try:
+                buffer = future.result()
+            except Exception as err:
+                self.errors[index] = err
+                return
+
+            if self.buffer_type is dict:
+                key = self.iterable[index]
+                try:
+                    hash(key)
+                except TypeError:
+                    key = index
+                self.return_buffer[key] = buffer
+            elif self.ordered:
+                self.return_buffer[index] = buffer
+            elif buffer is not None:
+                self.return_buffer.append(buffer)
 
     def stop(self, ):
-        """Stop the Job."""
+        """Stop the Job. Already submitted items are finished."""
         self.active = False
 
-    def _worker_(self, ):
-        """The worker function for the worker threads. It takes care of executing the target function 'f' with the next
-        item of the iterable list and the kwargs. """
-        active = True
-        while self.active and active:
-            iterable_i, active = self._get_next_()
-            if active:
-                try:
-                    buffer = self.f(iterable_i, **self.kwargs)
-                except (RuntimeError, Exception) as err:
-                    print(f'Error occurred at {iterable_i}: {err}')
-                    buffer = None
-                with self.lock:
-                    if buffer is not None:
-                        self.return_buffer.append(buffer)
-                    self.i_bar += 1
-
-    def _get_next_(self, ):
-        """ Get the next item of the iterable with a lock."""
-        with self.lock:
-            if len(self.iterable) > self.i:
-                iterable_i = self.iterable[self.i]
-                self.i += 1
-                return iterable_i, True
-            else:
-                return None, False
-
 
-def hdf5_getunsorted(self, index):
+def hdf5_getunsorted(self, index, out=None, max_gap=None):
     """Access a items of hdf5 dataset in an unsorted way. Indexes can also occur multiple times.
-    If 'dset' is a dataset with the data [.1,.2]; dset.getunsorted([0,1,0]) -> [.1,.2,.1]"""
-    unique, inv_index = np.unique(index, return_inverse=True)
-    return self[unique][inv_index]
+    If 'dset' is a dataset with the data [.1,.2]; dset.getunsorted([0,1,0]) -> [.1,.2,.1]
+    Instead of a h5py fancy-index read, which is executed as a slow point selection, the requested indexes are grouped
+    into blocks of nearby indexes (gaps up to `max_gap`). Each block is read with a slice and the items are scattered
+    into the output in the requested order.
+    PARAMETER
+    ---------
+    index: int, list, ndarray
+        the indexes along the first axis of the dataset. Negative indexes count from the end.
+    out: ndarray, optional
+        a buffer with the shape (len(index), *dset.shape[1:]) to write the items into. If None (default), a new array
+        is allocated.
+    max_gap: int, optional
+        the maximum gap between two indexes which are read in the same block. None (default) takes the chunk length of
+        the dataset along the first axis, or 1 if the dataset isn't chunked, i.e. blocks of contiguous indexes.
+    RETURNS
+    -------
+    out: ndarray
+        the items in the requested order
+    """
+    index = np.atleast_1d(np.asarray(index, dtype=np.int64))
+    index = np.where(index < 0, index + self.shape[0], index)
+    if np.any(index < 0) or np.any(index >= self.shape[0]):
+        raise IndexError(f'Index out of range for dataset with length {self.shape[0]}.')
+
+    if out is None:
+        out = np.empty((len(index), *self.shape[1:]), dtype=self.dtype)
+    elif out.shape != (len(index), *self.shape[1:]):
+        raise ValueError(f'out must have the shape {(len(index), *self.shape[1:])} and not {out.shape}.')
+
+    if len(index) == 0:
+        return out
+
+    if max_gap is None:
+        max_gap = self.chunks[0] if self.chunks is not None else 1
+
+    order = np.argsort(index, kind='stable')
+    index_sorted = index[order]
+    # start of a new block, where the gap to the previous index is bigger than max_gap
+    block_start = np.flatnonzero(np.diff(index_sorted) > max_gap) + 1
+    block_start = np.concatenate(([0], block_start, [len(index_sorted)]))
+
+    for start, stop in zip(block_start[:-1], block_start[1:]):
+        first, last = index_sorted[start], index_sorted[stop - 1]
+        block = self[first:last + 1]
+        out[order[start:stop]] = block[index_sorted[start:stop] - first]
+
+    return out
 
 
 # ---- statistic and plotting ----
+class BinnedStatistic:
+    statistics_all = ('sum', 'mean', 'var', 'std', 'min', 'max')
+
+    def __init__(self, bins=100, bin_range=None, statistics=None):
+        """Binned statistics (count, sum, mean, std, min, max) for one or many value arrays in a single pass.
+        The bin assignment is calculated once per chunk, with np.searchsorted for sorted x and np.digitize otherwise.
+        The statistics are accumulated, i.e. `add` can be called for several chunks (streaming), and the variance is
+        merged with Chan's parallel algorithm. The binning follows scipy.stats.binned_statistic, i.e.
+        all bins are half-open [a, b) except the last one which is [a, b]. Values outside the bins are ignored.
+
+        PARAMETER
+        ---------
+        bins: int or sequence of scalars, optional
+            either the bin edges or the number of equal-width bins. With a number, `bin_range` defines the bins, or if
+            bin_range is None, the min and max of x of the first call of `add`.
+        bin_range: (float, float), optional
+            the lower and upper edge of the bins, if bins is an int.
+        statistics: list[str], optional
+            the statistics of the values which are accumulated, any of 'sum', 'mean', 'var', 'std', 'min', 'max'.
+            The count is always accumulated. None (default) takes all. The properties of statistics which aren't
+            accumulated return None. Only 'sum' and 'mean' are much faster than all, as var, std, min and max need
+            additional passes over the values.
+
+        EXAMPLE
+        -------
+        >>> bs = BinnedStatistic(bins=np.linspace(0, 10, 11))
+        >>> for x_i, y_i in chunks:
+        >>>     bs.add(x_i, y_i)
+        >>> bs.mean, bs.std, bs.count
+        """
+        if statistics is None:
+            statistics = self.statistics_all
+        unknown = set(statistics) - set(self.statistics_all)
+        if unknown:
+            raise ValueError(f'Unknown statistics: {sorted(unknown)}. Supports: {self.statistics_all}')
+        self.statistics = set(statistics)
+
+        self._bins_ = bins
+        self._bin_range_ = bin_range
+        self.bin_edges = None
+
+        self._count_ = None  # number of x in each bin, shape: [bins]
+        self._value_count_ = None  # number of values in each bin, i.e. without adds with values=None, shape: [bins]
+        self._sum_ = None  # shape: [n_values, bins]
+        self._m2_ = None  # sum of squares of differences from the mean, shape: [n_values, bins]
+        self._min_ = None  # shape: [n_values, bins]
+        self._max_ = None  # shape: [n_values, bins]
+        self._ndim_ = None  # dimension of the values, to return the same shape
+
+        if not np.isscalar(bins):
+            self.__init_bins__(np.asarray(bins, dtype=float))
+        elif bin_range is not None:
+            self.__init_bins__(np.linspace(*bin_range, int(bins) + 1))
+
+    def __init_bins__(self, bin_edges):
+        """Set the bin edges."""
+        if bin_edges.ndim != 1 or len(bin_edges) < 2 or np.any(np.diff(bin_edges) < 0):
+            raise ValueError('bins must be monotonically increasing with at least 2 edges.')
+        self.bin_edges = bin_edges
+
+    @property
+    def n_bins(self):
+        """Number of bins."""
+        return len(self.bin_edges) - 1
+
+    @property
+    def bin_centers(self):
+        """The middle of each bin."""
+        return (self.bin_edges[1:] + self.bin_edges[:-1]) * .5
+
+    def __edge_positions__(self, x):
+        """The positions of the bin edges in sorted x, only len(bin_edges) binary searches."""
+        positions = np.searchsorted(x, self.bin_edges, side='left')
+        positions[-1] = np.searchsorted(x, self.bin_edges[-1], side='right')  # last bin includes the last edge
+        return positions
+
+    def bin_number(self, x, assume_sorted=None):
+        """The index of the bin for each x. Values outside the bins are -1.
+        PARAMETER
+        ---------
+        x: ndarray
+            the data to bin
+        assume_sorted: bool, optional
+            if x is sorted in ascending order. Default: None, checks if x is sorted.
+        """
+        if assume_sorted is None:
+            assume_sorted = len(x) < 2 or bool(np.all(x[1:] >= x[:-1]))
+
+        if assume_sorted:
+            positions = self.__edge_positions__(x)
+            index = np.full(len(x), -1, dtype=np.int64)
+            index[positions[0]:positions[-1]] = np.repeat(np.arange(self.n_bins), np.diff(positions))
+        else:
+            index = np.digitize(x, self.bin_edges) - 1
+            index[x == self.bin_edges[-1]] = self.n_bins - 1  # last bin includes the last edge
+            index[index >= self.n_bins] = -1
+        return index
+
+    def add(self, x, values=None, assume_sorted=None):
+        """Add a chunk of data to the statistics.
+        PARAMETER
+        ---------
+        x: ndarray, list
+            input data which is binned, as dtype float or int but not datetime64
+        values: ndarray, list, optional
+            one (shape: [n]) or many (shape: [n_values, n]) value arrays, with len(x) == n. If None, only the count
+            is calculated.
+        assume_sorted: bool, optional
+            if x is sorted in ascending order. Default: None, checks if x is sorted.
+        RETURNS
+        -------
+        self: BinnedStatistic
+        """
+        x = np.asarray(x)
+        if self.bin_edges is None:
+            x_min, x_max = (float(np.min(x)), float(np.max(x))) if len(x) else (0., 1.)
+            if x_min == x_max:  # same as scipy.stats.binned_statistic
+                x_min, x_max = x_min - .5, x_max + .5
+            self.__init_bins__(np.linspace(x_min, x_max, int(self._bins_) + 1))
+
+        if assume_sorted is None:
+            assume_sorted = len(x) < 2 or bool(np.all(x[1:] >= x[:-1]))
+
+        if assume_sorted:
+            # the x within the bins are contiguous, i.e. each bin is a slice of x
+            positions = self.__edge_positions__(x)
+            count = np.diff(positions).astype(np.int64)
+            index, mask = None, slice(positions[0], positions[-1])
+        else:
+            index = self.bin_number(x, assume_sorted=False)
+            mask = index >= 0
+            index = index[mask]
+            count = np.bincount(index, minlength=self.n_bins).astype(np.int64)
+
+        self._count_ = count if self._count_ is None else self._count_ + count
+        if values is None:
+            return self
+
+        values = np.asarray(values)
+        if self._ndim_ is None:
+            self._ndim_ = values.ndim
+        values = values.reshape(-1, len(x))[:, mask].astype(float, copy=False)
+
+        if index is None:
+            starts = (positions[:-1] - positions[0])[count > 0]  # start of each non-empty bin in values
+
+            def reduce(ufunc, array, fill):
+                return self.__reduceat__(ufunc, array, starts, count > 0, fill)
+        else:
+            def reduce(ufunc, array, fill):
+                return self.__reduce_index__(ufunc, array, index, fill)
+
+        sum_ = reduce(np.add, values, 0.)
+        m2, min_, max_ = None, None, None
+        if {'var', 'std'} & self.statistics:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = sum_ / count
+            mean = np.repeat(mean, count, axis=1) if index is None else mean[:, index]
+            m2 = reduce(np.add, (values - mean) ** 2, 0.)
+        if 'min' in self.statistics:
+            min_ = reduce(np.minimum, values, np.inf)
+        if 'max' in self.statistics:
+            max_ = reduce(np.maximum, values, -np.inf)
+
+        self.__merge__(count, sum_, m2, min_, max_)
+        return self
+
+    def __reduceat__(self, ufunc, values, starts, mask_bins, fill):
+        """Reduce the values of sorted x per bin with a ufunc, e.g. np.add. starts are the positions of the non-empty
+        bins, mask_bins, in the values."""
+        out = np.full((values.shape[0], self.n_bins), fill)
+        if len(starts):
+            out[:, mask_bins] = ufunc.reduceat(values, starts, axis=1)
+        return out
+
+    def __reduce_index__(self, ufunc, values, index, fill):
+        """Reduce the values per bin with a ufunc, e.g. np.add, with the bin index of each value."""
+        n_values = values.shape[0]
+        if ufunc is np.add:
+            # one bincount for all value arrays, the index is shifted by n_bins for each value array
+            index_flat = (index + np.arange(n_values).reshape(-1, 1) * self.n_bins).ravel()
+            return np.bincount(index_flat, weights=values.ravel(),
+                               minlength=n_values * self.n_bins).reshape(n_values, self.n_bins)
+
+        out = np.full((n_values, self.n_bins), fill)
+        for i in range(n_values):
+            ufunc.at(out[i], index, values[i])
+        return out
+
+    def __merge__(self, count, sum_, m2, min_, max_):
+        """Merge the statistics of values with `count` values per bin."""
+        if self._value_count_ is None:
+            self._value_count_, self._sum_, self._m2_, self._min_, self._max_ = count, sum_, m2, min_, max_
+            return
+
+        if m2 is not None:
+            count_a = self._value_count_  # count before the merge
+            with np.errstate(invalid='ignore', divide='ignore'):
+                delta = sum_ / count - self._sum_ / count_a
+                m2_new = self._m2_ + m2 + delta ** 2 * count_a * count / (count_a + count)
+            # take the values of the chunk or the old one, if one of both is empty
+            self._m2_ = np.where(count_a == 0, m2, np.where(count == 0, self._m2_, m2_new))
+
+        self._value_count_ = self._value_count_ + count
+        self._sum_ = self._sum_ + sum_
+        if min_ is not None:
+            np.minimum(self._min_, min_, out=self._min_)
+        if max_ is not None:
+            np.maximum(self._max_, max_, out=self._max_)
+
+    def merge(self, other):
+        """Merge the statistics of another BinnedStatistic with the same bins and statistics, e.g. from a parallel
+        job."""
+        if other._count_ is None:
+            return self
+        if self.bin_edges is None:
+            self.__init_bins__(other.bin_edges)
+        elif not np.array_equal(self.bin_edges, other.bin_edges):
+            raise ValueError('Both BinnedStatistic must have the same bins.')
+        if self.statistics != other.statistics:
+            raise ValueError(f'Both BinnedStatistic must have the same statistics. Got: {sorted(self.statistics)} '
+                             f'and {sorted(other.statistics)}')
+
+        self._count_ = other._count_.copy() if self._count_ is None else self._count_ + other._count_
+        if other._value_count_ is not None:
+            self._ndim_ = other._ndim_
+            self.__merge__(*[None if i is None else i.copy() for i in [other._value_count_, other._sum_, other._m2_,
+                                                                       other._min_, other._max_]])
+        return self
+
+    def __shape__(self, array):
+        """Return the statistic in the shape of the values, i.e. 1d array for 1d values."""
+        if array is None:
+            return None
+        if self._ndim_ == 1:
+            return array[0]
+        return array
+
+    def __per_value__(self, statistic, array):
+        """Return the accumulated array of the statistic in the shape of the values, np.nan for bins without values,
+        or None if the statistic isn't accumulated."""
+        if array is None or statistic not in self.statistics:
+            return None
+        return self.__shape__(np.where(self._value_count_ > 0, array, np.nan))
+
+    @property
+    def count(self):
+        """Number of entries in each bin."""
+        return self._count_
+
+    @property
+    def sum(self):
+        """Sum of the values in each bin."""
+        if 'sum' not in self.statistics:
+            return None
+        return self.__shape__(self._sum_)
+
+    @property
+    def mean(self):
+        """Mean of the values in each bin, np.nan for empty bins."""
+        if self._sum_ is None:
+            return None
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.__per_value__('mean', self._sum_ / self._value_count_)
+
+    @property
+    def var(self):
+        """Variance (ddof=0) of the values in each bin, np.nan for empty bins."""
+        if self._m2_ is None:
+            return None
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.__per_value__('var', self._m2_ / self._value_count_)
+
+    @property
+    def std(self):
+        """Standard deviation (ddof=0) of the values in each bin, np.nan for empty bins."""
+        if self._m2_ is None:
+            return None
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.__per_value__('std', np.sqrt(self._m2_ / self._value_count_))
+
+    @property
+    def min(self):
+        """Minimum of the values in each bin, np.nan for empty bins."""
+        return self.__per_value__('min', self._min_)
+
+    @property
+    def max(self):
+        """Maximum of the values in each bin, np.nan for empty bins."""
+        return self.__per_value__('max', self._max_)
+
+
 def binned_mean_std(x, y, bins=100, min_count=.1):
     """Calculate the binned mean and std (standard deviation) for the given data.
     PARAMETER
@@ -289,13 +771,13 @@ def binned_mean_std(x, y, bins=100, min_count=.1):
     x, y: ndarray, list
         input data in x and y as dtype float or int but not datetime64
     bins: int or sequence of scalars, optional
-        parsed to scipy.stats.binned_statistic
+        parsed to BinnedStatistic, same as scipy.stats.binned_statistic
     min_count: float, optional
         set the minimum count threshold as percentage of the max(bin_counts)
     """
-    bin_means, bin_edges, binnumber = scipy.stats.binned_statistic(x, y, statistic='mean', bins=bins)
-    bin_std, bin_edges, binnumber = scipy.stats.binned_statistic(x, y, statistic='std', bins=bins)
-    bin_counts, bin_edges, binnumber = scipy.stats.binned_statistic(x, y, statistic='count', bins=bins)
+    binned_statistic = BinnedStatistic(bins=bins, statistics=['mean', 'std']).add(x, y)
+    bin_means, bin_std, bin_counts = binned_statistic.mean, binned_statistic.std, binned_statistic.count
+    bin_edges = binned_statistic.bin_edges
 
     # cal. bin middle points
     bin_centers = bin_edges[:-1] + (bin_edges[1] - bin_edges[0]) / 2.
@@ -318,7 +800,7 @@ def plot_binned_mean(x, y, bins=10000, ax=None, x_asdatetime=True, *args, **kwar
     x, y: ndarray, list
         input data in x and y as dtype float or int but not datetime64
     bins: int or sequence of scalars, optional
-        parsed to scipy.stats.binned_statistic
+        parsed to BinnedStatistic, same as scipy.stats.binned_statistic
     ax: None or plt.Axes, optional
         the axes to add the plot. If None, default it takes plt.plot
     x_asdatetime: bool, optional
@@ -326,6 +808,8 @@ def plot_binned_mean(x, y, bins=10000, ax=None, x_asdatetime=True, *args, **kwar
     *args, **kwargs: list or dict, optional
         parsed to ax.plot(..., *args, **kwargs)
     """
+    from matplotlib import pyplot as plt
+
     # cal. moving average with std
     bin_means, bin_std, bin_mid = binned_mean_std(x, y, bins=bins)
 
@@ -378,6 +862,73 @@ def human_size(size_bytes, precision=2):
     return si_prefix(size_bytes, base=1024, unit='B', precision=precision)
 
 
+def scandir_files(directory, recursive=True, stat=True, thread_n=8):
+    """Walk a directory tree once with os.scandir and collect all files. Other than os.path.exists per file, it needs
+    one directory listing per directory, which matters for many files on network file systems (NFS).
+    The paths are os.path.join(<directory>, ...), i.e. they keep the format of `directory`.
+    PARAMETER
+    ---------
+    directory: str
+        the root directory. If it doesn't exist, the result is empty.
+    recursive: bool, optional
+        if subdirectories are included (True, default) or not
+    stat: bool, optional
+        if the file size and mtime are collected (True, default). This costs one stat per file, which runs on
+        `thread_n` threads.
+    thread_n: int, optional
+        the number of threads for the stat calls. Default: 8.
+    RETURNS
+    -------
+    dataframe: pandas.DataFrame
+        the index are the file paths and with stat=True, the columns are 'size_on_disk' in bytes and 'mtime' in
+        seconds.
+    EXAMPLE
+    -------
+    >>> files = scandir_files(Config.raw_data_dir)
+    >>> dataframe.fullPath.isin(files.index)  # mask of existing files
+    """
+    import concurrent.futures
+    import pandas
+
+    entries_list = []  # list of lists of os.DirEntry, one per directory
+    directories = [directory]
+    while directories:
+        try:
+            iterator = os.scandir(directories.pop())
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+
+        entries = []
+        with iterator:
+            for entry in iterator:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        directories.append(entry.path)
+                elif entry.is_file():
+                    entries.append(entry)
+        entries_list.append(entries)
+
+    index = pandas.Index([entry.path for entries in entries_list for entry in entries], name='fullPath')
+    if not stat:
+        return pandas.DataFrame(index=index)
+
+    def stat_entries(entries):
+        stat_list = []
+        for entry in entries:
+            try:
+                stat_i = entry.stat()
+                stat_list.append((stat_i.st_size, stat_i.st_mtime))
+            except FileNotFoundError:  # removed in the meantime
+                stat_list.append((np.nan, np.nan))
+        return stat_list
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=thread_n) as executor:
+        stat_array = [j for i in executor.map(stat_entries, entries_list) for j in i]
+    stat_array = np.array(stat_array, dtype=np.float64).reshape(-1, 2)
+
+    return pandas.DataFrame({'size_on_disk': stat_array[:, 0], 'mtime': stat_array[:, 1]}, index=index)
+
+
 def si_prefix(value, unit=None, precision=2, significant=False, base=1000, prefix_type='short',
               fmt='{value} {prefix}{unit}'):
     """ Returns a human-readable string representation of value with SI prefix notation
@@ -536,6 +1087,8 @@ def unique_steps(t, state, ratio_steps_len_1=.75, plot=False):
     t_steps[step_len_1[:-1], 1] += (t_steps[step_len_1[:-1] + 1, 0] - t_steps[step_len_1[:-1], 0]) * ratio_steps_len_1
 
     if plot:
+        from matplotlib import pyplot as plt
+
         plt.figure()
         plt.plot(t, state, 'o-', label='raw')
         plt.plot(t[mask_changes], state[mask_changes], 'o-', label='mask changes')
@@ -605,6 +1158,145 @@ def append_hdf5(file, dataset_name, data, axis=0, **kwargs):
         #     d[:, :, :, :, :, :, -len_append_items:] = data
 
 
+class HDF5Appender:
+    def __init__(self, file, buffer_size=2 ** 16, chunk_bytes=2 ** 20, **kwargs):
+        """Buffered (write-behind) appender for hdf5 datasets. In contrast to `append_hdf5`, the data is collected in
+        memory per dataset and written in batches, which are aligned to the chunk size of the dataset. This avoids many
+        small resizes and poorly filled chunks, when the data is appended in a loop, e.g. over files or images.
+        Datasets are created resizable along the append axis and, if not specified, with a chunk size of about
+        `chunk_bytes`. The buffers are flushed at `close` and the exit of the context manager.
+
+        PARAMETER
+        ---------
+        file: h5py.File, h5py.Group
+            must be open in a writable mode, as long as the appender is used
+        buffer_size: int, optional
+            number of elements along the append axis, which are buffered per dataset before they are written
+        chunk_bytes: int, optional
+            the target size of a chunk in bytes, if the chunks of a new dataset aren't specified
+        **kwargs: optional
+            default options parsed to h5py.create_dataset for all new datasets, e.g. compression='gzip'
+
+        EXAMPLE
+        -------
+        >>> with h5py.File('test.h5', 'a') as f, HDF5Appender(f, compression='gzip') as appender:
+        >>>     for rate_i, time_i in data:
+        >>>         appender.append('/rate', rate_i, axis=1)
+        >>>         appender.append('/time', time_i)
+        """
+        self.file = file
+        self.buffer_size = int(buffer_size)
+        self.chunk_bytes = int(chunk_bytes)
+        self.dataset_kwargs = kwargs
+
+        # {dataset_name: {'axis': int, 'kwargs': dict, 'buffer': list, 'length': int, 'write_length': int}}
+        self._buffer_dict_ = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def append(self, dataset_name, data, axis=0, **kwargs):
+        """Buffer data to append to a dataset. The data is written, when the buffer exceeds `buffer_size`.
+        PARAMETER
+        ---------
+        dataset_name: str
+            the name of the dataset including the path
+        data: ndarray
+            the data to append
+        axis: int, optional
+            the axis which should be extended
+        **kwargs: optional
+            parsed to h5py.create_dataset, if the dataset doesn't exist. Overwrites the defaults of the appender.
+        """
+        data = np.asarray(data)
+        if axis < 0:
+            axis += data.ndim
+
+        buffer = self._buffer_dict_.get(dataset_name)
+        if buffer is None:
+            buffer = {'axis': axis, 'kwargs': kwargs, 'buffer': [], 'length': 0, 'write_length': self.buffer_size}
+            self._buffer_dict_[dataset_name] = buffer
+        elif buffer['axis'] != axis:
+            raise ValueError(f'{dataset_name} is appended along axis {buffer["axis"]} and not {axis}.')
+
+        if data.shape[axis] == 0:
+            return
+
+        buffer['buffer'].append(data)
+        buffer['length'] += data.shape[axis]
+
+        if buffer['length'] >= buffer['write_length']:
+            self.__write__(dataset_name, force=False)
+
+    def __create_dataset__(self, dataset_name, data, axis, **kwargs):
+        """Create a resizeable dataset with shape 0 along axis and chunks of about `chunk_bytes`."""
+        kwargs = {**self.dataset_kwargs, **kwargs}
+
+        shape = list(data.shape)
+        shape[axis] = 0
+        max_shape = list(data.shape)
+        max_shape[axis] = None
+
+        if kwargs.get('chunks') in [None, True]:
+            chunks = list(data.shape)
+            item_bytes = data.dtype.itemsize * int(np.prod(chunks)) // max(data.shape[axis], 1)
+            chunks[axis] = int(max(1, min(self.buffer_size, self.chunk_bytes // max(item_bytes, 1))))
+            kwargs['chunks'] = tuple(chunks)
+
+        return self.file.create_dataset(dataset_name, shape=shape, maxshape=max_shape, dtype=data.dtype, **kwargs)
+
+    def __write__(self, dataset_name, force=True):
+        """Write the buffer of a dataset. With force=False, only entire chunks are written and the rest stays in the
+        buffer."""
+        buffer = self._buffer_dict_[dataset_name]
+        if buffer['length'] == 0:
+            return
+
+        axis = buffer['axis']
+        data = np.concatenate(buffer['buffer'], axis=axis)
+
+        dataset = self.file.get(dataset_name)
+        if dataset is None:
+            dataset = self.__create_dataset__(dataset_name, data, axis, **buffer['kwargs'])
+
+        length = data.shape[axis]
+        if not force and dataset.chunks is not None:
+            # write only entire chunks, where the dataset size is aligned to the chunks
+            chunk_len = dataset.chunks[axis]
+            # defer the next write until at least one chunk is buffered, if the chunks are larger than the buffer
+            buffer['write_length'] = max(self.buffer_size, chunk_len)
+            length = (dataset.shape[axis] + length) // chunk_len * chunk_len - dataset.shape[axis]
+            if length <= 0:
+                buffer['buffer'] = [data]
+                return
+
+        slicer = (*(axis * [slice(None)]), slice(dataset.shape[axis], dataset.shape[axis] + length))
+        dataset.resize(dataset.shape[axis] + length, axis=axis)
+        dataset[slicer] = data[(*(axis * [slice(None)]), slice(None, length))]
+
+        rest = data[(*(axis * [slice(None)]), slice(length, None))]
+        buffer['buffer'] = [rest] if rest.shape[axis] > 0 else []
+        buffer['length'] = rest.shape[axis]
+
+    def flush(self, dataset_name=None):
+        """Write the buffer of one (dataset_name) or all (None, default) datasets to the file."""
+        if dataset_name is None:
+            dataset_name = list(self._buffer_dict_)
+        elif isinstance(dataset_name, str):
+            dataset_name = [dataset_name]
+
+        for i in dataset_name:
+            self.__write__(i, force=True)
+
+    def close(self):
+        """Flush all buffers. The file isn't closed."""
+        self.flush()
+        self._buffer_dict_ = {}
+
+
 def periodic2plot(x, y, period=(0., np.pi * 2.)):
     """A function to prepare periodic y-data for a plot. Everytime the y-data is crossing the boundary's 3 data-points
     are added to x and y. They represent the position when the data is crossing the boundary. For the y-data this means,
@@ -682,13 +1374,19 @@ def periodic2plot(x, y, period=(0., np.pi * 2.)):
     return x, y
 
 
-def masked_convolve2d(in1, in2, correct_missing=True, norm=True, valid_ratio=1. / 3, *args, **kwargs):
+fft_min_kernel_size = 64  # kernels with at least this number of items use the FFT in masked_convolve2d
+
+
+def masked_convolve2d(in1, in2, correct_missing=True, norm=True, valid_ratio=1. / 3, *args, method='auto',
+                      **kwargs):
     """A workaround for np.ma.MaskedArray in scipy.signal.convolve2d.
     It converts the masked values to complex values=1j. The complex space allows to set a limit
     for the imaginary convolution. The function use a ratio `valid_ratio` of np.sum(in2) to set a lower limit
     on the imaginary part to mask the values.
     I.e. in1=[[1.,1.,--,--]] in2=[[1.,1.]] -> imaginary_part/sum(in2): [[1., 1., .5, 0.]]
     -> valid_ratio=.5 -> out:[[1., 1., .5, --]].
+    For large kernels, the FFT (overlap-add) method convolves the data and the mask as two real float32 convolutions,
+    which is the same as the real and imaginary part of the complex convolution.
     PARAMETERS
     ---------
     in1 : array_like
@@ -702,31 +1400,69 @@ def masked_convolve2d(in1, in2, correct_missing=True, norm=True, valid_ratio=1.
         if the output should be normalized to np.sum(in2).
     valid_ratio: float, optional
         the upper limit of the imaginary convolution to mask values. Defined by the ratio of np.sum(in2).
+    method: str, optional
+        'direct' for scipy.signal.convolve2d with complex128, 'fft' for scipy.signal.oaconvolve with float32, or
+        'auto' (default) which takes 'fft' for kernels with at least `fft_min_kernel_size` items. The 'fft' method
+        supports only boundary='fill' with fillvalue=0 (default of convolve2d), otherwise 'direct' is used.
     *args, **kwargs: optional
-        parsed to scipy.signal.convolve(..., *args, **kwargs)
+        parsed to scipy.signal.convolve2d(..., *args, **kwargs), i.e. mode, boundary and fillvalue
     """
+    import scipy.signal
+
     if not isinstance(in1, np.ma.MaskedArray):
         in1 = np.ma.array(in1)
+    in2 = np.asarray(in2)
+    in2_sum = np.sum(in2)
+
+    if method not in ['auto', 'direct', 'fft']:
+        raise ValueError(f'method must be one of: auto, direct, fft. Got: {method}')
+
+    # the parameters of convolve2d(in1, in2, mode='full', boundary='fill', fillvalue=0)
+    conv_kwargs = dict(zip(['mode', 'boundary', 'fillvalue'], args))
+    conv_kwargs.update(kwargs)
+    fft_supported = conv_kwargs.get('boundary', 'fill') == 'fill' and conv_kwargs.get('fillvalue', 0) == 0
+
+    if method == 'auto':
+        method = 'fft' if fft_supported and in2.size >= fft_min_kernel_size else 'direct'
+
+    if method == 'fft':
+        if not fft_supported:
+            raise ValueError("method='fft' supports only boundary='fill' with fillvalue=0.")
+        mode = conv_kwargs.get('mode', 'full')
+        tolerance = 1e-5  # relative rounding error of the float32 FFT
+        kernel = in2.astype(np.float32)
+        invalid = np.ma.getmaskarray(in1)
+
+        con = scipy.signal.oaconvolve(in1.filled(fill_value=0).astype(np.float32), kernel, mode=mode)
+        if np.any(invalid):
+            con_imag = scipy.signal.oaconvolve(invalid.astype(np.float32), kernel, mode=mode)
+            # remove the FFT rounding noise, the convolution of the mask is 0 where all values are valid
+            con_imag[np.abs(con_imag) < np.abs(in2_sum) * tolerance] = 0.
+        else:
+            con_imag = np.zeros_like(con)
+        con = con.astype(np.result_type(in1.dtype, np.float32), copy=False)
+    else:
+        tolerance = 0.
+        # np.complex128 -> stores real as np.float64
+        con = scipy.signal.convolve2d(in1.astype(np.complex128).filled(fill_value=1j),
+                                      in2.astype(np.complex128),
+                                      *args, **kwargs
+                                      )
 
-    # np.complex128 -> stores real as np.float64
-    con = scipy.signal.convolve2d(in1.astype(np.complex128).filled(fill_value=1j),
-                                  in2.astype(np.complex128),
-                                  *args, **kwargs
-                                  )
+        # split complex128 to two float64s
+        con_imag = con.imag
+        con = con.real
 
-    # split complex128 to two float64s
-    con_imag = con.imag
-    con = con.real
-    mask = np.abs(con_imag / np.sum(in2)) > valid_ratio
+    mask = np.abs(con_imag / in2_sum) > valid_ratio + tolerance
 
     # con_east.real / (1. - con_east.imag): correction, to get the mean over all valid values
     # con_east.imag > percent: how many percent of the single convolution value have to be from valid values
     if correct_missing:
-        correction = np.sum(in2) - con_imag
-        con[correction != 0] *= np.sum(in2) / correction[correction != 0]
+        correction = in2_sum - con_imag
+        con[correction != 0] *= in2_sum / correction[correction != 0]
 
     if norm:
-        con /= np.sum(in2)
+        con /= in2_sum
 
     return np.ma.array(con, mask=mask)
 
@@ -755,6 +1491,8 @@ def pd_timestamp_convert(time_0, tz='UTC'):
     ------
     pandas.Timestamp with tz
     """
+    import pandas
+
     if not isinstance(time_0, pandas.Timestamp):
         time_0 = pandas.Timestamp(time_0, tz=tz)
 
@@ -804,6 +1542,209 @@ def pd_timestamp_mask_between(series_start, series_stop, time_from, time_to, tz=
     return mask
 
 
+def _pd_datetime2int_(series):
+    """Converts a datetime-like pandas.Series, with or without timezone, to int64 in ns since epoch (UTC). NaT is
+    np.iinfo(np.int64).min."""
+    import pandas
+
+    index = pandas.DatetimeIndex(series)
+    if index.tz is not None:
+        index = index.tz_convert('UTC').tz_localize(None)
+    return index.values.astype('datetime64[ns]').view(np.int64)
+
+
+class TimeIntervalIndex:
+    def __init__(self, series_start, series_stop, groups=None):
+        """Sorted interval index over time-extended entries, to select the entries which overlap with a time range
+        by binary search instead of comparing all entries, like `pd_timestamp_mask_between`. The index is built once
+        and returns the row positions of the matching entries, i.e. `dataframe.iloc[positions]`.
+        Entries where start or stop is NaT never match, like in `pd_timestamp_mask_between`.
+        PARAMETER
+        ---------
+        series_start, series_stop: pandas.Series
+            two series with the same length indicating the start and stop time of each entry
+        groups: dict, optional
+            {key: positions}, an index is built per group additional to the index of all entries, e.g. from
+            `dataframe.groupby(['deviceCode', 'dataProductCode']).indices`
+        EXAMPLE
+        -------
+        >>> index = TimeIntervalIndex(df.dateFrom, df.dateTo,
+        >>>                           groups=df.groupby(['deviceCode', 'dataProductCode'], observed=True).indices)
+        >>> df.iloc[index.positions_between('2021-09-04', '2021-09-05', key=('TUMPMTSPECTROMETER001', 'PMTSD'))]
+        """
+        self.start = _pd_datetime2int_(series_start)
+        self.stop = _pd_datetime2int_(series_stop)
+        if len(self.start) != len(self.stop):
+            raise ValueError('series_start and series_stop must have the same length.')
+
+        self.fingerprint = self.get_fingerprint(self.start, self.stop)
+
+        # {key: positions}, key None is all entries
+        self.groups = {None: np.arange(len(self.start))}
+        if groups is not None:
+            for key, positions in groups.items():
+                self.groups[tuple(np.atleast_1d(key).tolist())] = np.asarray(positions, dtype=np.int64)
+
+        # {key: (positions sorted by start, start, stop, cumulative max of stop, positions of irregular entries)}
+        self._index_dict_ = {}
+
+    def __len__(self):
+        return len(self.start)
+
+    @staticmethod
+    def get_fingerprint(start, stop):
+        """A hash of the start and stop times to check if an index belongs to the data.
+        PARAMETER
+        ---------
+        start, stop: pandas.Series, ndarray
+            the start and stop times as datetime-like pandas.Series or as int64 ndarray in ns
+        """
+        import hashlib
+
+        if not (isinstance(start, np.ndarray) and start.dtype == np.int64):
+            start = _pd_datetime2int_(start)
+        if not (isinstance(stop, np.ndarray) and stop.dtype == np.int64):
+            stop = _pd_datetime2int_(stop)
+
+        hash_obj = hashlib.blake2b(digest_size=16)
+        hash_obj.update(np.ascontiguousarray(start, dtype=np.int64).tobytes())
+        hash_obj.update(np.ascontiguousarray(stop, dtype=np.int64).tobytes())
+        return hash_obj.hexdigest()
+
+    def __get_index__(self, key=None):
+        """Build the index of a group when it is used for the first time."""
+        index = self._index_dict_.get(key)
+        if index is None:
+            positions = self.groups[key]
+            start, stop = self.start[positions], self.stop[positions]
+            nat = np.iinfo(np.int64).min
+            valid = (start != nat) & (stop != nat)
+
+            # entries with stop < start can't be searched with the sorted start, check them one by one
+            irregular = valid & (stop < start)
+            regular = valid & ~irregular
+
+            positions = positions[regular]
+            order = np.argsort(start[regular], kind='stable')
+            positions = positions[order]
+            start = self.start[positions]
+            stop = self.stop[positions]
+            index = (positions, start, stop, np.maximum.accumulate(stop), self.groups[key][irregular])
+            self._index_dict_[key] = index
+        return index
+
+    def build(self):
+        """Build the index of all groups at once, otherwise it is built when a group is queried the first time."""
+        for key in self.groups:
+            self.__get_index__(key)
+        return self
+
+    def positions_between(self, time_from, time_to, key=None, tz="UTC", include_time_to=False):
+        """Row positions of entries which overlap with a time range: [time_from, time_to]. Same selection as
+        `pd_timestamp_mask_between`.
+        PARAMETER
+        ---------
+        time_from, time_to: datetime-like, str, int, float
+            Value to be converted to Timestamp (using strawb.tools.pd_timestamp_convert())
+        key: optional
+            the key of the group, e.g. (deviceCode, dataProductCode). None (default) takes all entries.
+            A list of keys combines several groups.
+        tz : str, pytz.timezone, dateutil.tz.tzfile or None, optional
+            Time zone for time_from, time_to. Default: "UTC"
+        include_time_to : bool, optional
+            `True` to include `time_to` (`<=`) or `False`(default) to exclude `time_to` (`<`)
+        RETURNS
+        -------
+        positions: ndarray
+            sorted row positions of entries which overlap with the time range
+        """
+        if isinstance(key, list):
+            positions = [self.positions_between(time_from, time_to, key=i, tz=tz, include_time_to=include_time_to)
+                         for i in key]
+            return np.unique(np.concatenate(positions)) if positions else np.array([], dtype=np.int64)
+
+        if key is not None:
+            key = tuple(np.atleast_1d(key).tolist())
+        positions, start, stop, stop_cummax, irregular = self.__get_index__(key)
+
+        time_from = pd_timestamp_convert(time_from, tz=tz).value
+        time_to = pd_timestamp_convert(time_to, tz=tz).value
+        side_to = 'right' if include_time_to else 'left'
+
+        def start_before_stop_after(start_side, start_value, stop_value):
+            """Entries with `start < start_value` (or `<=` for side='right') and `stop >= stop_value`."""
+            i_stop = np.searchsorted(start, start_value, side=start_side)
+            # stop_cummax is sorted, entries before i_start have all stop < stop_value
+            i_start = np.searchsorted(stop_cummax[:i_stop], stop_value, side='left')
+            return positions[i_start:i_stop][stop[i_start:i_stop] >= stop_value]
+
+        # files which cover the start time
+        result = [start_before_stop_after('right', time_from, time_from)]
+
+        # files in-between start and end time, as stop >= start, start has to be <= time_to
+        i_start = np.searchsorted(start, time_from, side='left')
+        i_stop = np.searchsorted(start, time_to, side='right')
+        result.append(positions[i_start:i_stop][stop[i_start:i_stop] <= time_to])
+
+        # files which cover the end time
+        result.append(start_before_stop_after(side_to, time_to, time_to))
+
+        # irregular entries (stop < start)
+        if len(irregular) > 0:
+            start_irr, stop_irr = self.start[irregular], self.stop[irregular]
+            mask = (start_irr <= time_from) & (stop_irr >= time_from)
+            mask |= (start_irr >= time_from) & (stop_irr <= time_to)
+            if include_time_to:
+                mask |= (start_irr <= time_to) & (stop_irr >= time_to)
+            else:
+                mask |= (start_irr < time_to) & (stop_irr >= time_to)
+            result.append(irregular[mask])
+
+        return np.unique(np.concatenate(result))
+
+    def mask_between(self, time_from, time_to, key=None, tz="UTC", include_time_to=False):
+        """Same as `positions_between` but returns a bool ndarray with the length of the index."""
+        mask = np.zeros(len(self), dtype=bool)
+        mask[self.positions_between(time_from, time_to, key=key, tz=tz, include_time_to=include_time_to)] = True
+        return mask
+
+    def save(self, file_name):
+        """Save the index to a npz file."""
+        keys = [i for i in self.groups if i is not None]
+        positions = [self.groups[i] for i in keys]
+        np.savez(file_name,
+                 start=self.start,
+                 stop=self.stop,
+                 keys=np.array([[str(j) for j in i] for i in keys], dtype=str).reshape(len(keys), -1),
+                 group_positions=np.concatenate(positions) if positions else np.array([], dtype=np.int64),
+                 group_length=np.array([len(i) for i in positions], dtype=np.int64))
+
+    @classmethod
+    def load(cls, file_name, fingerprint=None):
+        """Load an index from a npz file.
+        PARAMETER
+        ---------
+        file_name: str
+            the npz file
+        fingerprint: str, optional
+            if provided, it returns None if the index doesn't match, see `TimeIntervalIndex.get_fingerprint`
+        """
+        with np.load(file_name) as f:
+            start, stop = f['start'], f['stop']
+            if fingerprint is not None and cls.get_fingerprint(start, stop) != fingerprint:
+                return None
+            group_positions = np.split(f['group_positions'], np.cumsum(f['group_length'])[:-1])
+            groups = {tuple(key): positions for key, positions in zip(f['keys'].tolist(), group_positions)
+                      if len(f['group_length']) > 0}
+
+        index = cls.__new__(cls)
+        index.start, index.stop = start, stop
+        index.fingerprint = cls.get_fingerprint(start, stop)
+        index.groups = {None: np.arange(len(start)), **groups}
+        index._index_dict_ = {}
+        return index
+
+
 def cmap_manipulator(cmap, alpha_min=1., alpha_max=1., v_min=0., v_max=1., invert_alpha=False, bg_color='white'):
     """
     PARAMETER
@@ -821,6 +1762,9 @@ def cmap_manipulator(cmap, alpha_min=1., alpha_max=1., v_min=0., v_max=1., inver
         the color of the background as a matplotlib color string (matplotlib.colors.to_rgb(bg_color)).
         Default is 'white'.
     """
+    from matplotlib import pyplot as plt
+    import matplotlib.colors as mcolors
+
     # Choose colormap which will be mixed with the alpha values
     if isinstance(cmap, str):
         cmap = plt.cm.get_cmap(cmap)
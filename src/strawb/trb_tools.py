@@ -2,7 +2,6 @@ import os
 
 import h5py
 import numpy as np
-import scipy.stats
 
 from strawb import tools
 
@@ -449,15 +448,9 @@ class TRBTools:
         if len(time_probe) == 0:
             raise ValueError('File has corrupt time data in `file_handler.counts_ch0` and `file_handler.counts_time`.')
 
-        active, b, n = scipy.stats.binned_statistic(timestamps,
-                                                    self.active_read,
-                                                    statistic='sum',
-                                                    bins=time_probe)
-
-        reads, b, n = scipy.stats.binned_statistic(timestamps,
-                                                   None,
-                                                   statistic='count',
-                                                   bins=time_probe)
+        # sum of active reads and number of reads per bin in one pass
+        binned_statistic = tools.BinnedStatistic(bins=time_probe, statistics=['sum']).add(timestamps, self.active_read)
+        active, reads = binned_statistic.sum, binned_statistic.count
         # transform active to active read ratio, active is np.nan when there is no data (counter read) in the interval
         mask = reads != 0
         active = active.astype(float)
@@ -666,22 +659,15 @@ class InterpolatedRatesFile:
             for i in set(group_attrs).difference(group.attrs):
                 group.attrs.update({i: group_attrs[i]})
 
-            tools.append_hdf5(f, '/rates_interpolated/rate',
-                              data=interp_rate,
-                              axis=1,
-                              **h5py_dataset_options)
-
+            # dataset options are set when the datasets are created, the chunks fit to the shape of each dataset
             h5py_opt_1d = h5py_dataset_options.copy()
             if 'chunks' in h5py_opt_1d:
                 h5py_opt_1d['chunks'] = (h5py_opt_1d['chunks'][1],)
 
-            tools.append_hdf5(f, '/rates_interpolated/time',
-                              data=tools.datetime2float(interp_time),
-                              **h5py_opt_1d)
-
-            tools.append_hdf5(f, '/rates_interpolated/mask',
-                              data=interp_mask,
-                              **h5py_opt_1d)
+            with tools.HDF5Appender(f) as appender:
+                appender.append('/rates_interpolated/rate', data=interp_rate, axis=1, **h5py_dataset_options)
+                appender.append('/rates_interpolated/time', data=tools.datetime2float(interp_time), **h5py_opt_1d)
+                appender.append('/rates_interpolated/mask', data=interp_mask, **h5py_opt_1d)
 
     def write_to_file(self, trb_tools, file_attrs=None, group_attrs=None, h5_mode='a'):
         """Write interpolated data of PMT to the file. It generates a hdf5 file and adds the data as follows:
@@ -1,10 +1,16 @@
 import os
 import random
+import shutil
+import tempfile
+import warnings
 from unittest import TestCase
+
+import cv2
+import h5py
 import numpy as np
 
 from src.strawb.sensors.camera.file_handler import FileHandler
-from src.strawb.sensors.camera import Images
+from src.strawb.sensors.camera import Images, PixelStatistic
 from src.strawb import SyncDBHandler
 
 
@@ -25,6 +31,221 @@ def get_files():
     return file_list, mask, db
 
 
+def create_camera_file(directory, n=24, shape=(24, 32), seed=0):
+    """Create a small camera file with random raw frames, with the layout of the SDAQ camera files."""
+    rng = np.random.default_rng(seed)
+    file_name = os.path.join(directory, 'TUMPMTSPECTROMETER001_20211001T000000.000Z-SDAQ-CAMERA.hdf5')
+    with h5py.File(file_name, 'w') as f:
+        group = f.create_group('camera')
+        group.create_dataset('time', data=1.633e9 + 60. * np.arange(n))
+        group.create_dataset('exposure_time', data=np.full(n, 60.))
+        group.create_dataset('gain', data=np.full(n, 30.))
+        group.create_dataset('raw', data=rng.integers(2 ** 10, 2 ** 14, (n, *shape), dtype=np.uint16),
+                             chunks=(1, *shape))
+        lucifer_options = np.full((n, 4), -125)
+        lucifer_options[::6] = [2, 0, 15, 7]  # flash
+        group.create_dataset('lucifer_options', data=lucifer_options)
+        for i in ['exposure_time_cmd_setting', 'measured_capture_time']:
+            group.create_dataset(i, data=np.zeros(n))
+        group.create_dataset('reported_resolution', data=np.tile(shape, (n, 1)))
+        group.attrs.update({'EffMargins': [2, 2, 4, 2], 'ExposureTimeScaleFactor': 1.,
+                            'ApproxPictureDownloadTime': 1., 'IgnoredMargins': [0, 0, 0, 0], 'MODE': 0,
+                            'RAW_Resolution': shape, 'Resolution': shape})
+    return file_name
+
+
+class TestCameraPixelStatistic(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_name = create_camera_file(self.directory)
+        self.file_handler = FileHandler(self.file_name)
+        self.raw = self.file_handler.raw[:].astype(float)
+
+    def tearDown(self):
+        self.file_handler.close()
+        shutil.rmtree(self.directory)
+
+    def test_add(self):
+        pixel_statistic = PixelStatistic().add(self.raw, chunk_size=5)
+        self.assertEqual(len(self.raw), pixel_statistic.count)
+        self.assertTrue(np.allclose(np.mean(self.raw, axis=0), pixel_statistic.mean))
+        self.assertTrue(np.allclose(np.std(self.raw, axis=0), pixel_statistic.std, rtol=1e-5))
+
+    def test_merge_save_load(self):
+        pixel_statistic = PixelStatistic(device_code='TUMPMTSPECTROMETER001', period='2021_10')
+        pixel_statistic.merge(PixelStatistic().add(self.raw[:7]))
+        pixel_statistic.merge(PixelStatistic().add(self.raw[7:]))
+
+        file_name = PixelStatistic.get_file_name('TUMPMTSPECTROMETER001', '2021_10', directory=self.directory)
+        pixel_statistic.save(file_name)
+        pixel_statistic = PixelStatistic.load(file_name)
+        self.assertEqual('2021_10', pixel_statistic.period)
+        self.assertTrue(np.allclose(np.mean(self.raw, axis=0), pixel_statistic.mean))
+        self.assertTrue(np.allclose(np.std(self.raw, axis=0), pixel_statistic.std, rtol=1e-5))
+
+    def test_cal_pixel_statistic(self):
+        images = Images(self.file_handler)
+        raw = images.cut2effective_pixel(self.raw, axis=1)
+
+        pixel_statistic = images.cal_pixel_statistic(eff_margin=True, chunk_size=5)
+        self.assertEqual(raw.shape[1:], pixel_statistic.mean.shape)
+        self.assertTrue(np.allclose(np.mean(raw, axis=0), pixel_statistic.mean))
+        self.assertTrue(np.allclose(np.std(raw, axis=0), pixel_statistic.std, rtol=1e-5))
+
+        # the files in parallel, here twice the same file
+        pixel_statistic = PixelStatistic.from_files([self.file_name] * 2, thread_n=2, backend='thread')
+        self.assertEqual(2 * len(raw), pixel_statistic.count)
+        self.assertTrue(np.allclose(np.std(raw, axis=0), pixel_statistic.std, rtol=1e-5))
+
+
+class TestCameraRawStatistic(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_name = create_camera_file(self.directory)
+        with h5py.File(self.file_name, 'r+') as f:
+            f['camera/raw'][::5] += np.uint16(5 * 10 ** 4)  # some bright frames above the noise cut
+        self.file_handler = FileHandler(self.file_name)
+        self.raw = self.file_handler.raw[:].astype(float)
+
+        self.integrated_raw = np.sum(self.raw, axis=(1, 2))
+        self.limit = np.median(self.integrated_raw)
+
+    def tearDown(self):
+        self.file_handler.close()
+        shutil.rmtree(self.directory)
+
+    def test_cal_raw_statistic(self):
+        images = Images(self.file_handler)
+        images.cal_raw_statistic(n=4, limit=self.limit, chunk_size=5)
+
+        valid_mask = self.integrated_raw > self.limit
+        np.testing.assert_array_equal(images.integrated_raw, self.integrated_raw)
+        np.testing.assert_array_equal(images.valid_mask, valid_mask)
+
+        index = np.argsort(np.ma.array(self.integrated_raw, mask=~valid_mask))[:4]
+        np.testing.assert_allclose(images.raw_dark_frame, np.average(self.raw[index], axis=0))
+
+        # the dark frame from the known integrated_raw and valid_mask matches the streamed one
+        raw_dark_frame = images.raw_dark_frame
+        images.cal_raw_dark_frame(n=4)
+        np.testing.assert_allclose(images.raw_dark_frame, raw_dark_frame)
+
+    def test_cal_raw_statistic_few_valid(self):
+        # less than n valid frames, the dark frame is filled up with the most dim invalid frames
+        for limit in [np.sort(self.integrated_raw)[-3], np.max(self.integrated_raw)]:
+            images = Images(self.file_handler)
+            with warnings.catch_warnings():
+                warnings.simplefilter('error')
+                images.cal_raw_statistic(n=4, limit=limit, chunk_size=5)
+
+            valid_mask = self.integrated_raw > limit
+            index = np.lexsort((self.integrated_raw, ~valid_mask))[:4]
+            self.assertLess(np.sum(valid_mask[index]), 4)
+            np.testing.assert_allclose(images.raw_dark_frame, np.average(self.raw[index], axis=0))
+
+            images.cal_raw_dark_frame(n=4)
+            np.testing.assert_allclose(images.raw_dark_frame, np.average(self.raw[index], axis=0))
+
+    def test_cal_integrated_minus_dark(self):
+        images = Images(self.file_handler)
+        images.cal_raw_statistic(limit=self.limit, chunk_size=7)
+
+        raw = images.cut2effective_pixel(self.raw - images.raw_dark_frame, axis=1)
+        raw[raw < 4e4] = 0
+        integrated_minus_dark = np.average(raw.reshape((raw.shape[0], -1)) ** 2, axis=-1)
+
+        self.assertTrue(np.any(integrated_minus_dark > 0))
+        np.testing.assert_allclose(images.cal_integrated_minus_dark(chunk_size=7), integrated_minus_dark, rtol=1e-5)
+        np.testing.assert_allclose(images.integrated_minus_dark, integrated_minus_dark, rtol=1e-5)
+
+    def test_create_valid_mask_resets_dark_frame(self):
+        images = Images(self.file_handler)
+        images.cal_raw_statistic(limit=self.limit)
+        self.assertIsNotNone(images._raw_dark_frame)
+
+        images.create_valid_mask(limit=np.min(self.integrated_raw) - 1)
+        self.assertIsNone(images._raw_dark_frame)
+        self.assertTrue(np.all(images.valid_mask))
+
+
+class TestCameraRGB(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_handler = FileHandler(create_camera_file(self.directory, n=10))
+        self.images = Images(self.file_handler)
+        self.images.cal_raw_statistic(n=3, limit=0)
+
+    def tearDown(self):
+        self.file_handler.close()
+        shutil.rmtree(self.directory)
+
+    def test_cut2effective_pixel_view(self):
+        arr = np.zeros((2, 24, 32, 3))
+        cut = self.images.cut2effective_pixel(arr, axis=1)
+        self.assertEqual(cut.shape, (2, 20, 26, 3))
+        self.assertTrue(np.shares_memory(cut, arr))
+
+    def test_load_rgb(self):
+        index = np.array([7, 1, 4, 2, 9])
+        for subtract_dark in [True, False]:
+            raw = self.file_handler.raw[:][index]
+            if subtract_dark:
+                raw = raw - self.images.raw_dark_frame
+            rgb = [self.images.frame_raw_to_rgb(i) for i in raw]
+            rgb = self.images.cut2effective_pixel(rgb, axis=1)
+
+            image_arr = self.images.load_rgb(index, subtract_dark=subtract_dark, chunk_size=2, thread_n=2,
+                                             exclude_invalid=False)
+            self.assertEqual(image_arr.dtype, np.uint16)
+            np.testing.assert_array_equal(image_arr, rgb)
+
+
+class TestCameraPNG(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_handler = FileHandler(create_camera_file(self.directory, n=12))
+        self.images = Images(self.file_handler)
+        self.images.cal_raw_statistic(n=3, limit=0)
+
+    def tearDown(self):
+        self.file_handler.close()
+        shutil.rmtree(self.directory)
+
+    def test_image2png(self):
+        index = np.array([3, 0, 7])
+        directory = os.path.join(self.directory, 'png')
+        file_name_list = self.images.image2png(directory=directory, index=index, f_name_formatter='{index}',
+                                               chunk_size=2, thread_n=2)
+        self.assertEqual(file_name_list, [os.path.join(directory, f'{i}.png') for i in index])
+        self.assertEqual(sorted(os.listdir(directory)), ['0.png', '3.png', '7.png'])  # no temporary files left
+
+        rgb = np.right_shift(self.images.load_rgb(index), 8).astype(np.uint8)
+        for rgb_i, file_name_i in zip(rgb, file_name_list):
+            np.testing.assert_array_equal(cv2.imread(file_name_i, cv2.IMREAD_UNCHANGED)[:, :, ::-1], rgb_i)
+
+        # existing files are skipped, unless overwrite
+        with open(file_name_list[0], 'wb') as f:
+            f.write(b'')
+        self.images.image2png(directory=directory, index=index, f_name_formatter='{index}')
+        self.assertEqual(os.path.getsize(file_name_list[0]), 0)
+        self.images.image2png(directory=directory, index=index, f_name_formatter='{index}', overwrite=True, bit=16)
+        self.assertEqual(cv2.imread(file_name_list[0], cv2.IMREAD_UNCHANGED).dtype, np.uint16)
+
+    def test_image2png_lucifer(self):
+        process_dict = self.images.image2png_lucifer(directory=self.directory, f_name_formatter='{index}')
+        self.assertEqual(list(process_dict), [str(np.array([2, 0, 15, 7]))])
+        directory = os.path.join(self.directory, 'flash_0_15_7')
+        self.assertEqual(process_dict[str(np.array([2, 0, 15, 7]))],
+                         [os.path.join(directory, '0.png'), os.path.join(directory, '6.png')])
+        self.assertEqual(sorted(os.listdir(directory)), ['0.png', '6.png'])
+
+        # kwargs are parsed to get_index
+        process_dict = self.images.image2png_lucifer(directory=self.directory, f_name_formatter='{index}',
+                                                     exclude_invalid=False, chunk_size=1, thread_n=1)
+        self.assertEqual(process_dict[str(np.array([2, 0, 15, 7]))],
+                         [os.path.join(directory, '0.png'), os.path.join(directory, '6.png')])
+
+
 class TestCameraFileHandlerInit(TestCase):
     def setUp(self):
         file_list, mask, db = get_files()
@@ -2,6 +2,8 @@ import time
 from unittest import TestCase
 
 import numpy as np
+import pandas as pd
+import scipy.ndimage
 
 from src.strawb import SyncDBHandler
 from strawb.sensors.camera import Camera
@@ -159,3 +161,59 @@ class TestCameraClusterBase(TestCase):
         df = find_cluster.df_all(mask_mounting=False)
         n_rgb = np.sum([df.n_pixel_blue, df.n_pixel_red, df.n_pixel_green], axis=0)
         self.assertFalse(np.sum(df.n_pixel - n_rgb))
+
+    def test_pixel_statistic(self):
+        images = np.random.default_rng(0).integers(0, 2 ** 12, (10, 4, 8)).astype(np.uint16)
+        find_cluster = FindCluster(Camera(), images=images, eff_margin=False)
+
+        self.assertTrue(np.allclose(np.mean(images, axis=0), find_cluster.pixel_mean))
+        self.assertTrue(np.allclose(np.std(images, axis=0), find_cluster.pixel_std, rtol=1e-5))
+
+    def test_df_batch(self):
+        class Dummy:
+            def __init__(self):
+                pass
+
+        rng = np.random.default_rng(0)
+        images = rng.normal(100, 10, (5, 32, 48))
+        for image_i in images:  # add some bright clusters
+            for x, y in rng.integers(2, 28, (6, 2)):
+                image_i[x:x + 3, y:y + 4] += 200
+
+        dummy = Dummy()
+        dummy.time = time.time() + np.arange(len(images))
+        cam = Camera()
+        cam.file_handler = dummy
+
+        find_cluster = FindCluster(cam, pixel_mean=np.full(images.shape[1:], 100.),
+                                   pixel_std=np.full(images.shape[1:], 10.), images=images, eff_margin=False)
+
+        df = find_cluster.df_batch(batch_size=2, thread_n=2, progressbar=False)
+        df_probe = pd.concat([find_cluster.df_picture(i) for i in range(len(images))], ignore_index=True)
+        self.assertGreater(len(df), len(images))
+        pd.testing.assert_frame_equal(df_probe, df, check_dtype=False)
+
+    def test_get_features(self):
+        rng = np.random.default_rng(1)
+        image = rng.normal(100, 10, (40, 60))
+        for x, y in rng.integers(2, 35, (20, 2)):
+            image[x:x + 3, y:y + 4] += 200
+        pixel_mean = np.full(image.shape, 100.)
+
+        find_cluster = FindCluster(Camera(), pixel_mean=pixel_mean, pixel_std=np.full(image.shape, 10.),
+                                   images=image[None], eff_margin=False)
+        labels = find_cluster.get_cluster(0, mask_mounting=False)
+        features = find_cluster.get_features(image, labels)
+
+        # compare with the per label calculation
+        index = np.unique(labels)
+        self.assertListEqual(list(index), list(features['label']))
+        center_of_mass = np.array(scipy.ndimage.center_of_mass(image - pixel_mean, labels=labels, index=index))
+        self.assertTrue(np.allclose(center_of_mass[:, 0], features['center_of_mass_x']))
+        self.assertTrue(np.allclose(center_of_mass[:, 1], features['center_of_mass_y']))
+        for i, label_i in enumerate(index):
+            box = FindCluster.get_box(labels == label_i)
+            for key_i in box:
+                self.assertAlmostEqual(box[key_i], features[key_i][i], places=4)
+            self.assertEqual(np.sum(labels == label_i), features['n_pixel'][i])
+            self.assertAlmostEqual(np.sum(image[labels == label_i]), features['charge_with_noise'][i])
@@ -0,0 +1,107 @@
+import os
+import shutil
+from unittest import TestCase
+
+import numpy as np
+import pandas
+
+from src.strawb.sync_db_handler.db_storage import ParquetDBStorage, PickleDBStorage, SQLiteDBStorage, \
+    get_db_storage
+
+
+class TestDBStorage(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        n = 1000
+        date_from = pandas.Timestamp('2021-01-01', tz='UTC') + pandas.to_timedelta(
+            np.sort(rng.integers(0, 365 * 24 * 3600, n)), 's')
+        self.dataframe = pandas.DataFrame({
+            'fullPath': [f'/raw/file_{i}.hdf5' for i in range(n)],
+            'dateFrom': date_from,
+            'dateTo': date_from + pandas.Timedelta('1h'),
+            'deviceCode': rng.choice(['TUMPMTSPECTROMETER001', 'TUMLIDAR001'], n),
+            'dataProductCode': pandas.Categorical(rng.choice(['PMTSD', 'LIDARSD'], n)),
+            'synced': rng.random(n) < .5,
+            'h5_attrs': [{'file_version': i % 3, 'list': [1, 2]} if i % 2 else None for i in range(n)],
+        }).set_index('fullPath')
+
+        self.file_name = os.path.abspath('test_db_storage.parquet')
+        self.file_name_sqlite = os.path.abspath('test_db_storage.sqlite')
+        self.file_name_pickle = os.path.abspath('test_db_storage.gz')
+
+    def tearDown(self):
+        for i in [self.file_name, self.file_name_pickle, self.file_name_sqlite,
+                  self.file_name_sqlite + '-wal', self.file_name_sqlite + '-shm']:
+            if os.path.isdir(i):
+                shutil.rmtree(i)
+            elif os.path.exists(i):
+                os.remove(i)
+
+    def test_get_db_storage(self):
+        self.assertIsInstance(get_db_storage('db.parquet'), ParquetDBStorage)
+        self.assertIsInstance(get_db_storage('db.gz'), PickleDBStorage)
+        self.assertIsInstance(get_db_storage('db.sqlite'), SQLiteDBStorage)
+
+    def test_load(self):
+        for storage in [ParquetDBStorage(self.file_name), PickleDBStorage(self.file_name_pickle),
+                        SQLiteDBStorage(self.file_name_sqlite)]:
+            storage.save(self.dataframe)
+
+            dataframe = storage.load().loc[self.dataframe.index]
+            for i in ['dateFrom', 'dateTo', 'synced']:
+                self.assertTrue((dataframe[i] == self.dataframe[i]).all(), i)
+            self.assertEqual(self.dataframe.h5_attrs.iloc[1], dataframe.h5_attrs.iloc[1])
+            self.assertIsNone(dataframe.h5_attrs.iloc[0])
+
+            # partition pruning and column projection
+            dataframe = storage.load(columns=['synced'], device_code='TUMLIDAR001',
+                                     time_from='2021-08-01', time_to='2021-08-15')
+            mask = (self.dataframe.deviceCode == 'TUMLIDAR001')
+            mask &= self.dataframe.dateTo >= pandas.Timestamp('2021-08-01', tz='UTC')
+            mask &= self.dataframe.dateFrom < pandas.Timestamp('2021-08-15', tz='UTC')
+            self.assertEqual(['synced'], dataframe.columns.tolist())
+            self.assertEqual(sorted(self.dataframe.index[mask]), sorted(dataframe.index))
+
+    def test_append(self):
+        storage = ParquetDBStorage(self.file_name)
+        storage.save(self.dataframe.iloc[:500])
+
+        # update existing rows, add rows and a new column
+        dataframe_new = self.dataframe.iloc[490:].copy()
+        dataframe_new['synced'] = ~dataframe_new['synced']
+        dataframe_new['file_version'] = 2
+        storage.append(dataframe_new)
+
+        dataframe = storage.load()
+        self.assertEqual(len(self.dataframe), len(dataframe))
+        self.assertTrue(dataframe.loc[dataframe_new.index, 'synced'].equals(dataframe_new.synced))
+        self.assertEqual(len(dataframe_new), dataframe.file_version.notna().sum())
+
+    def test_upsert_columns(self):
+        for storage in [ParquetDBStorage(self.file_name), PickleDBStorage(self.file_name_pickle),
+                        SQLiteDBStorage(self.file_name_sqlite)]:
+            storage.save(self.dataframe)
+
+            # update only 'synced' of existing rows
+            dataframe_new = self.dataframe.iloc[:10].copy()
+            dataframe_new['synced'] = ~dataframe_new['synced']
+            dataframe_new['h5_attrs'] = None
+            storage.upsert(dataframe_new, columns=['synced'])
+
+            dataframe = storage.load()
+            self.assertEqual(len(self.dataframe), len(dataframe))
+            self.assertTrue(dataframe.loc[dataframe_new.index, 'synced'].equals(dataframe_new.synced))
+            self.assertEqual(self.dataframe.h5_attrs.iloc[1], dataframe.loc[self.dataframe.index[1], 'h5_attrs'])
+
+    def test_sqlite_wal(self):
+        import sqlite3
+
+        storage = SQLiteDBStorage(self.file_name_sqlite)
+        storage.save(self.dataframe)
+        con = sqlite3.connect(self.file_name_sqlite)
+        try:
+            self.assertEqual('wal', con.execute('PRAGMA journal_mode').fetchone()[0])
+            index_list = [i[0] for i in con.execute("SELECT name FROM sqlite_master WHERE type='index'")]
+            self.assertIn('idx_deviceCode_dateTo', index_list)
+        finally:
+            con.close()
@@ -0,0 +1,41 @@
+import subprocess
+import sys
+from unittest import TestCase
+
+
+def imported_modules(module, modules):
+    """Import the module in a fresh python process and return which of the modules got imported."""
+    code = f"import sys; import {module}; print(*[i for i in {modules} if i in sys.modules])"
+    return subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.split()
+
+
+class TestLazyImport(TestCase):
+    def test_import_strawb(self):
+        heavy_packages = ['cv2', 'onc', 'shapely', 'healpy', 'scipy', 'matplotlib', 'tqdm', 'pandas']
+        self.assertEqual([], imported_modules('strawb', heavy_packages))
+
+    def test_lazy_attributes(self):
+        import strawb
+        self.assertIn('SyncDBHandler', dir(strawb))
+        self.assertIs(strawb.MProcessIterator, strawb.multi_processing.MProcessIterator)
+        self.assertRaises(AttributeError, getattr, strawb, 'not_existing_attribute')
+
+    def test_sensor_submodules(self):
+        import strawb
+        self.assertIs(strawb.camera, strawb.sensors.camera)
+        self.assertIsNotNone(strawb.camera.Config().mask_mounting)
+
+    def test_lazy_csv(self):
+        # in a fresh python process, as other tests could already have accessed Laser
+        code = ("import pandas; "
+                "from strawb.calibration import Laser; "
+                "from strawb.calibration.base_dataset_handler import LazyClassAttribute; "
+                "print(type(Laser.__dict__['config_parameters']) is LazyClassAttribute, "
+                "type(Laser.__dict__['available_labels']) is LazyClassAttribute, "
+                "len(Laser.available_labels) > 0, "
+                "isinstance(Laser.__dict__['config_parameters'], pandas.DataFrame), "
+                "isinstance(Laser.__dict__['available_labels'], list))")
+        stdout = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+
+        # the csv is loaded at the first access
+        self.assertEqual(stdout.split(), ['True'] * 5)
@@ -1,6 +1,7 @@
 import multiprocessing
 import os
 import time
+import uuid
 from unittest import TestCase
 
 import logging
@@ -9,7 +10,7 @@ import numpy as np
 import psutil
 import tqdm.notebook
 
-from strawb.multi_processing import MProcessIterator
+from strawb.multi_processing import MProcessIterator, get_worker_cache
 
 formatter_list = ['%(asctime)s',
                   '%(levelname)s',
@@ -51,6 +52,16 @@ def test_worker(i, sleep=.01, modulo_error=None):
     return i * 2
 
 
+def cache_factory_test(offset=0):
+    # the token is unique for each call of the factory
+    return {'pid': os.getpid(), 'offset': offset, 'token': uuid.uuid4().hex}
+
+
+def worker_cache_test(i):
+    cache = get_worker_cache('test')
+    return i + cache['offset'], cache['pid'], cache['token']
+
+
 class TestMultiProcessing(TestCase):
     def setUp(self) -> None:
         self.mpi = MProcessIterator()
@@ -163,3 +174,36 @@ class TestMultiProcessing(TestCase):
         self.assertEqual(int(length/modulo_error), len(self.mpi.error_dict))
         self.assertEqual(length-int(length/modulo_error), len(self.mpi.success_dict))
 
+    def test_run_chunks(self):
+        length = 23
+        successes, errors = [], []
+        self.mpi = MProcessIterator(processes=2, chunk_size=5)
+        self.mpi.run(test_worker, range(length), sleep=0., modulo_error=4,
+                     callback=successes.append, error_callback=errors.append)
+
+        self.assertEqual(list(range(length)), sorted(self.mpi.result_dict))
+        self.assertEqual(int(length / 4), len(self.mpi.error_dict))
+        self.assertEqual(length, self.mpi.number_total_jobs)
+        self.assertEqual(length, self.mpi.number_finished_jobs)
+
+        # callbacks are executed per item
+        self.assertEqual(length - int(length / 4), len(successes))
+        self.assertEqual(int(length / 4), len(errors))
+        for i, res_i in self.mpi.success_dict.items():
+            self.assertEqual(i * 2, res_i)
+
+    def test_run_worker_cache(self):
+        length = 20
+        self.mpi = MProcessIterator(processes=2, chunk_size=4,
+                                    cache_factories={'test': (cache_factory_test, (), {'offset': 10})})
+        self.mpi.run(worker_cache_test, range(length))
+
+        self.assertEqual(length, len(self.mpi.success_dict))
+        tokens_per_pid = {}
+        for i, (res_i, pid_i, token_i) in self.mpi.success_dict.items():
+            self.assertEqual(i + 10, res_i)
+            tokens_per_pid.setdefault(pid_i, set()).add(token_i)
+
+        # the cache is created once per process, i.e. exactly one token per process
+        for pid_i, tokens_i in tokens_per_pid.items():
+            self.assertEqual(1, len(tokens_i))
@@ -1,13 +1,346 @@
+import http.server
 import os
+import shutil
+import threading
+import time
 from unittest import TestCase
 
 import numpy as np
 import pandas
 
 from src.strawb.onc_downloader import ONCDownloader
+from src.strawb.onc_downloader.file_downloader import FileDownloader, DownloadScheduler
+from src.strawb.onc_downloader.listing_cache import ListingCache
+from src.strawb.onc_downloader.download_sensor_data import ONCDevice
 from src.strawb import dev_codes_deployed
 
 
+class RangeRequestHandler(http.server.BaseHTTPRequestHandler):
+    """A stand-in for the ONC file server, which supports range requests and can drop the connection."""
+    files = {}  # {path: bytes}
+    drop_after = None  # if set, send only this number of bytes once and close the connection
+    range_list = []  # the received range headers
+
+    def do_GET(self):
+        data = self.files.get(self.path.split('?')[0])
+        if data is None:
+            self.send_error(404)
+            return
+
+        start = 0
+        range_header = self.headers.get('Range')
+        self.range_list.append(range_header)
+        if range_header is not None:
+            start = int(range_header.split('=')[1].split('-')[0])
+            if start >= len(data):
+                self.send_error(416)
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{len(data) - 1}/{len(data)}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(data) - start))
+        self.end_headers()
+
+        body = data[start:]
+        if RangeRequestHandler.drop_after is not None:
+            body = body[:RangeRequestHandler.drop_after]
+            RangeRequestHandler.drop_after = None
+            self.close_connection = True
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class LocalServerTestCase(TestCase):
+    """Runs the RangeRequestHandler on a local port with three fixture files."""
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        RangeRequestHandler.files = {f'/file_{i}.hdf5': rng.bytes(50000 * (i + 1)) for i in range(3)}
+        RangeRequestHandler.drop_after = None
+        RangeRequestHandler.range_list = []
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), RangeRequestHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.directory = os.path.abspath('test_file_downloader')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if os.path.exists(self.directory):
+            shutil.rmtree(self.directory)
+
+
+class TestFileDownloader(LocalServerTestCase):
+    def test_resume(self):
+        RangeRequestHandler.drop_after = 12345  # drop the connection
+        file_name = os.path.join(self.directory, 'file_0.hdf5')
+        FileDownloader(backoff=0, chunk_size=1024).download(f'{self.url}/file_0.hdf5', file_name, file_size=50000)
+
+        with open(file_name, 'rb') as f:
+            self.assertEqual(RangeRequestHandler.files['/file_0.hdf5'], f.read())
+        # resumed, a dropped connection loses at most the last chunk
+        self.assertEqual(2, len(RangeRequestHandler.range_list))
+        self.assertIsNone(RangeRequestHandler.range_list[0])
+        self.assertIn(RangeRequestHandler.range_list[1], [f'bytes={i}-' for i in range(12345 - 1024, 12346)])
+        self.assertFalse(os.path.exists(file_name + FileDownloader.part_suffix))
+
+        # resume an existing '.part' file
+        os.remove(file_name)
+        with open(file_name + FileDownloader.part_suffix, 'wb') as f:
+            f.write(RangeRequestHandler.files['/file_0.hdf5'][:100])
+        FileDownloader(backoff=0).download(f'{self.url}/file_0.hdf5', file_name, file_size=[50000, 1])
+        with open(file_name, 'rb') as f:
+            self.assertEqual(RangeRequestHandler.files['/file_0.hdf5'], f.read())
+        self.assertEqual('bytes=100-', RangeRequestHandler.range_list[-1])
+
+    def test_size_mismatch(self):
+        file_name = os.path.join(self.directory, 'file_0.hdf5')
+        self.assertRaises(IOError, FileDownloader(max_retries=1, backoff=0).download,
+                          f'{self.url}/file_0.hdf5', file_name, file_size=1234)
+        self.assertFalse(os.path.exists(file_name))
+        self.assertFalse(os.path.exists(file_name + FileDownloader.part_suffix))
+
+    def test_download_list(self):
+        items = [{'url': f'{self.url}{i}', 'file_name': os.path.join(self.directory, i.lstrip('/')),
+                  'file_size': len(j)} for i, j in RangeRequestHandler.files.items()]
+        items.append({'url': f'{self.url}/not_existing.hdf5',
+                      'file_name': os.path.join(self.directory, 'not_existing.hdf5')})
+
+        time_0 = time.monotonic()
+        errors = FileDownloader(thread_n=2, max_bandwidth=1e6, max_retries=0, chunk_size=2 ** 14).download_list(
+            items, progress_bar=False)
+        # 300kB with 1MB/s
+        self.assertGreater(time.monotonic() - time_0, .2)
+
+        self.assertEqual([items[-1]['file_name']], list(errors))
+        for i in items[:-1]:
+            self.assertEqual(i['file_size'], os.path.getsize(i['file_name']))
+
+
+class TestDownloadScheduler(LocalServerTestCase):
+    def test_order(self):
+        pending = pandas.DataFrame({'dataProductCode': ['MSSCD', 'PMTSD', 'LIDARSD', 'PMTSD', 'MTSD'],
+                                    'dateFrom': pandas.to_datetime(['2021-01-01', '2021-01-01', '2021-01-02',
+                                                                    '2021-01-02', '2021-01-03']),
+                                    'fileSize': [5, 4, 3, 2, 1]})
+
+        scheduler = DownloadScheduler(product_priority=['PMTSD', 'LIDARSD'])
+        self.assertEqual([3, 1, 2, 4, 0], scheduler.order(pending).index.tolist())
+
+        scheduler = DownloadScheduler(sort_by=('size',))
+        self.assertEqual([4, 3, 2, 1, 0], scheduler.order(pending).index.tolist())
+
+        self.assertRaises(ValueError, DownloadScheduler, sort_by=('name',))
+
+    def test_download(self):
+        pending = pandas.DataFrame({'url': [f'{self.url}{i}' for i in RangeRequestHandler.files],
+                                    'file_name': [os.path.join(self.directory, i.lstrip('/'))
+                                                  for i in RangeRequestHandler.files],
+                                    'fileSize': [len(i) for i in RangeRequestHandler.files.values()]})
+
+        scheduler = DownloadScheduler(small_file_size=100000, fast_lane_n=2, slow_lane_n=1)
+        errors = scheduler.download(pending, progress_bar=False)
+        self.assertEqual({}, errors)
+
+        progress = scheduler.progress()
+        self.assertEqual(2, progress['fast']['files_done'])  # 50kB and 100kB
+        self.assertEqual(1, progress['slow']['files_done'])  # 150kB
+        self.assertEqual(pending.fileSize.sum(), progress['total']['bytes_done'])
+        self.assertGreater(progress['total']['throughput'], 0)
+        for i in pending.file_name:
+            self.assertTrue(os.path.exists(i))
+
+
+class StubONCDownloader(ONCDownloader):
+    """An ONCDownloader without a connection to ONC. `getListByDevice` lists hourly files and records the queries."""
+    def __init__(self, listing_cache=None):
+        self.listing_cache = listing_cache
+        self.download_threads = 1
+        self.files = {}  # {deviceCode: [file dict]}, the files on the 'server'
+        self.queries = []  # [(deviceCode, dateFrom, dateTo, dateArchivedFrom)]
+
+    def add_files(self, dev_code, date_from, n, archive_delay='2h'):
+        for i in pandas.date_range(date_from, periods=n, freq='h', tz='UTC'):
+            archived_date = i + pandas.Timedelta(archive_delay)
+            self.files.setdefault(dev_code, []).append({
+                'filename': f'{dev_code}_{i:%Y%m%dT%H%M%S}.000Z.txt',
+                'deviceCode': dev_code,
+                'dateFrom': f'{i:%Y-%m-%dT%H:%M:%S}.000Z',
+                'dateTo': f'{i + pandas.Timedelta("1h"):%Y-%m-%dT%H:%M:%S}.000Z',
+                'archivedDate': f'{archived_date:%Y-%m-%dT%H:%M:%S}.000Z',
+                'modifyDate': f'{archived_date:%Y-%m-%dT%H:%M:%S}.000Z',
+                'fileSize': 1000})
+
+    def getListByDevice(self, filters, allPages=False):
+        date_from = pandas.Timestamp(filters['dateFrom'])
+        date_to = pandas.Timestamp(filters['dateTo'])
+        archived_from = pandas.Timestamp(filters['dateArchivedFrom']) if 'dateArchivedFrom' in filters else None
+        self.queries.append((filters['deviceCode'], date_from, date_to, archived_from))
+        files = [i for i in self.files.get(filters['deviceCode'], [])
+                 if date_from <= pandas.Timestamp(i['dateFrom']) <= date_to
+                 and (archived_from is None or archived_from <= pandas.Timestamp(i['archivedDate']))]
+        return {'files': files}
+
+
+class TestDownloadStructured(TestCase):
+    def test_download_kwargs(self):
+        onc_downloader = StubONCDownloader()
+        calls = []
+        onc_downloader.download_files = lambda pd_result, **kwargs: calls.append(kwargs) or {}
+
+        pd_result = pandas.DataFrame({'fullPath': ['a.txt', 'b.txt'], 'fileSize': [10, 20], 'synced': [False, True]})
+        onc_downloader.download_structured(pd_result=pd_result, max_bandwidth=1e6)
+        onc_downloader.download_structured(pd_result=pd_result, download_kwargs={'max_bandwidth': 2e6})
+        self.assertEqual([{'max_bandwidth': 1e6}, {'max_bandwidth': 2e6}], calls)
+
+
+class TestListingCache(TestCase):
+    def setUp(self):
+        self.file_name = os.path.abspath('test_onc_listing.pkl.gz')
+        self.onc_downloader = StubONCDownloader(listing_cache=ListingCache(self.file_name))
+        self.onc_downloader.add_files('TUMLIDAR001', '2021-08-01', 24 * 10)
+        self.onc_downloader.add_files('TUMPMTSPECTROMETER001', '2021-08-01', 24 * 10)
+        self.dev_codes = ['TUMLIDAR001', 'TUMPMTSPECTROMETER001']
+
+    def tearDown(self):
+        if os.path.exists(self.file_name):
+            os.remove(self.file_name)
+
+    def get_files(self, date_to='2021-08-20', **kwargs):
+        return self.onc_downloader.get_files_for_dev_codes(
+            self.dev_codes, date_from=pandas.Timestamp('2021-08-01', tz='UTC'),
+            date_to=pandas.Timestamp(date_to, tz='UTC'), print_stats=False, **kwargs)['files']
+
+    def test_delta_query(self):
+        files = self.get_files()
+        self.assertEqual(2 * 24 * 10, len(files))
+
+        # new files on the server, a second listing queries only the delta (high-water mark - 1 day)
+        self.onc_downloader.add_files('TUMLIDAR001', '2021-08-11', 24)
+        self.onc_downloader.queries = []
+        files = self.get_files(date_to='2021-08-21')
+        self.assertEqual(2 * 24 * 10 + 24, len(files))
+        for dev_code, date_from, date_to, archived_from in self.onc_downloader.queries:
+            if archived_from is None:
+                self.assertEqual(pandas.Timestamp('2021-08-10', tz='UTC'), date_from, dev_code)
+            else:  # the window before only for files archived since the high-water mark - 1 day
+                self.assertEqual(pandas.Timestamp('2021-08-01', tz='UTC'), date_from, dev_code)
+                self.assertEqual(pandas.Timestamp('2021-08-10T01:00', tz='UTC'), archived_from, dev_code)
+
+        # the cache persists next to the sync DB and a new instance continues with the delta
+        self.onc_downloader.listing_cache = ListingCache(self.file_name)
+        self.onc_downloader.queries = []
+        self.assertEqual(2 * 24 * 10 + 24, len(self.get_files(date_to='2021-08-21')))
+        queries = {dev_code: date_from for dev_code, date_from, date_to, archived_from in self.onc_downloader.queries
+                   if archived_from is None}
+        self.assertEqual(pandas.Timestamp('2021-08-11', tz='UTC'), queries['TUMLIDAR001'])
+        self.assertEqual(pandas.Timestamp('2021-08-10', tz='UTC'), queries['TUMPMTSPECTROMETER001'])
+
+    def test_reconcile(self):
+        self.get_files()
+
+        # a file removed on the server stays in the cache until a full reconcile
+        del self.onc_downloader.files['TUMLIDAR001'][0]
+        self.assertEqual(2 * 24 * 10, len(self.get_files()))
+
+        self.onc_downloader.queries = []
+        self.assertEqual(2 * 24 * 10 - 1, len(self.get_files(reconcile=True)))
+        for dev_code, date_from, date_to, archived_from in self.onc_downloader.queries:
+            self.assertEqual(pandas.Timestamp('2021-08-01', tz='UTC'), date_from, dev_code)
+            self.assertIsNone(archived_from, dev_code)
+
+    def test_late_archived(self):
+        self.get_files()
+
+        # a file archived late, which ends before the delta window, is listed by its archive date
+        self.onc_downloader.add_files('TUMLIDAR001', '2021-08-01T00:30', 1, archive_delay='15d')
+        self.onc_downloader.queries = []
+        files = self.get_files()
+        self.assertEqual(2 * 24 * 10 + 1, len(files))
+        self.assertIn('TUMLIDAR001_20210801T003000.000Z.txt', [i['filename'] for i in files])
+        self.assertEqual(4, len(self.onc_downloader.queries))
+
+    def test_window(self):
+        self.get_files()
+        files = self.onc_downloader.get_files_for_dev_codes(
+            ['TUMLIDAR001'], date_from=pandas.Timestamp('2021-08-02', tz='UTC'),
+            date_to=pandas.Timestamp('2021-08-02T23:00', tz='UTC'), print_stats=False)['files']
+        # all files which overlap with the window
+        self.assertEqual(25, len(files))
+
+
+def get_sensor_data_page(sensors, date_from, n, date_to='2021-10-02T00:00:00.000Z', next_date_from=None):
+    """A result page of getDirectByDevice for ONCMJB016 as recorded from ONC, with n samples per second."""
+    sample_times = [f'{i:%Y-%m-%dT%H:%M:%S.%f}'[:-3] + 'Z'
+                    for i in pandas.date_range(date_from, periods=n, freq='s')]
+    parameters = {'deviceCode': 'ONCMJB016', 'dateFrom': sample_times[0], 'dateTo': date_to,
+                  'method': 'getByDevice', 'token': 'x'}
+    next_page = None
+    if next_date_from is not None:
+        next_page = {'parameters': {**parameters, 'dateFrom': next_date_from}, 'url': ''}
+    return {'parameters': parameters,
+            'next': next_page,
+            'sensorData': [{'sensorCode': sensor_i,
+                            'sensorName': sensor_i.split('_', 1)[-1],
+                            'unitOfMeasure': 'V',
+                            'actualSamples': n,
+                            'data': {'sampleTimes': sample_times,
+                                     'values': [float(j) + k if k != 1 else None for k in range(n)],
+                                     'qaqcFlags': [0] * n}}
+                           for j, sensor_i in enumerate(sensors)]}
+
+
+class TestONCDeviceStream(TestCase):
+    def setUp(self):
+        self.file_name = os.path.abspath('test_onc_device_stream.hdf5')
+        # the second page has a new sensor 'p4t_temperature' and misses 'p4v_voltage'
+        self.pages = [get_sensor_data_page(['p4c_current', 'p4v_voltage', 'p10c_current'],
+                                           '2021-10-01T00:00:00', 10, next_date_from='2021-10-01T00:00:10.000Z'),
+                      get_sensor_data_page(['p4c_current', 'p4t_temperature'], '2021-10-01T00:00:10', 5)]
+
+    def tearDown(self):
+        if os.path.exists(self.file_name):
+            os.remove(self.file_name)
+
+    def test_stream_to_hdf5(self):
+        import h5py
+
+        ONCDevice.stream_to_hdf5(pages=self.pages, file_name=self.file_name, buffer_size=4)
+
+        with h5py.File(self.file_name, 'r') as f:
+            self.assertEqual('ONCMJB016', f.attrs['deviceCode'])
+            self.assertEqual(['p10', 'p4'], sorted(f))
+            self.assertEqual(['current', 'time'], sorted(f['p10']))  # p10 only in the first page
+            self.assertEqual(['current', 'temperature', 'time', 'voltage'], sorted(f['p4']))
+            self.assertEqual('gzip', f['p4/time'].compression)
+
+            # the second sample is None in all sensors and is dropped
+            time = pandas.Timestamp('2021-10-01', tz='UTC').timestamp() + np.delete(np.arange(15), [1, 11])
+            self.assertTrue(np.allclose(time, f['p4/time'][:]))
+            self.assertEqual(13, f['p4/current'].shape[0])
+            self.assertTrue(np.isnan(f['p4/voltage'][-4:]).all())  # not in the second page
+            self.assertTrue(np.isnan(f['p4/temperature'][:9]).all())  # not in the first page
+            self.assertTrue(np.allclose(np.delete(np.arange(5), 1), f['p4/temperature'][9:] - 1))
+            self.assertEqual('V', f['p4/current'].attrs['unitOfMeasure'])
+
+    def test_iter_pages(self):
+        class StubONC:
+            def __init__(self, pages):
+                self.pages = pages
+                self.filters = []
+
+            def getDirectByDevice(self, filters, allPages=False):
+                self.filters.append(filters)
+                return self.pages[len(self.filters) - 1]
+
+        stub = StubONC(self.pages)
+        self.assertEqual(self.pages, list(ONCDevice.iter_pages(stub, {'deviceCode': 'ONCMJB016'})))
+        self.assertEqual('2021-10-01T00:00:10.000Z', stub.filters[1]['dateFrom'])
+
+
 class TestONCDownload(TestCase):
     def test_basic(self):
         onc_downloader = ONCDownloader(showInfo=False)
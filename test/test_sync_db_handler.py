@@ -1,6 +1,8 @@
 import datetime
 import glob
 import os
+import shutil
+import tempfile
 from unittest import TestCase
 
 import h5py
@@ -90,9 +92,59 @@ class TestSyncDBHandler(TestCase):
         self.assertTrue('TEST_4.txt' not in pd_result_1.index)  # 'TEST_2.hdf5' is not in pd_result_1
         self.assertTrue('TEST_5.txt' not in pd_result_1.index)  # 'TEST_2.hdf5' is not in pd_result_1
 
-    # def test_update_sync_state(self):
-    #     self.fail()
-    #
+    def test_update_sync_state(self):
+        directory = os.path.abspath('test_update_sync_state')
+        for i in ['dev_a/2021_01/a_0.txt', 'dev_a/2021_01/a_2.txt', 'dev_a/2021_02/a_1.txt',
+                  'dev_b/2021_01/b_0.txt']:
+            os.makedirs(os.path.dirname(os.path.join(directory, i)), exist_ok=True)
+            with open(os.path.join(directory, i), 'w') as f:
+                f.write('1234')
+
+        pd_result = pandas.DataFrame({'fullPath': [f'{directory}/dev_a/2021_01/a_0.txt',
+                                                   f'{directory}/dev_b/2021_01/b_0.txt',
+                                                   f'{directory}/dev_b/2021_01/b_1.txt'],  # doesn't exist
+                                      'deviceCode': ['A', 'B', 'B'],
+                                      'synced': [False, False, True]})
+        SyncDBHandler._check_index_(pd_result)
+
+        db_handler = SyncDBHandler(file_name=None, load_db=False)
+        db_handler.dataframe = pd_result
+        self.assertEqual(db_handler.update_sync_state().tolist(), [True, True, False])
+        self.assertEqual(db_handler.dataframe.size_on_disk.tolist()[:2], [4, 4])
+        self.assertTrue(db_handler.dataframe.mtime.isnull().tolist()[2])
+        # only the directories of the items are listed, i.e. not 'dev_a/2021_02'
+        self.assertEqual(db_handler.files_not_in_db.index.tolist(), [f'{directory}/dev_a/2021_01/a_2.txt'])
+
+        import shutil
+        shutil.rmtree(directory)
+
+    def test_load_db_interval_index(self):
+        directory = tempfile.mkdtemp()
+        try:
+            pd_result = pandas.DataFrame({'fullPath': [f'{directory}/a_{i}.txt' for i in range(4)],
+                                          'deviceCode': ['A', 'A', 'B', 'B'],
+                                          'dataProductCode': ['X'] * 4,
+                                          'dateFrom': pandas.date_range('2021-09-01', periods=4, freq='D', tz='UTC'),
+                                          'dateTo': pandas.date_range('2021-09-02', periods=4, freq='D', tz='UTC'),
+                                          'synced': [False] * 4})
+            SyncDBHandler._check_index_(pd_result)
+
+            db_handler = SyncDBHandler(file_name=os.path.join(directory, 'db.pkl.gz'), load_db=False)
+            db_handler.dataframe = pd_result
+            db_handler.save_db()
+            self.assertTrue(os.path.exists(db_handler._interval_index_file_name_))
+
+            # the saved index is loaded only with all columns and rows
+            db_handler.load_db()
+            self.assertIsNotNone(db_handler._interval_index_)
+            db_handler.load_db(columns=['deviceCode'])
+            self.assertIsNone(db_handler._interval_index_)
+            db_handler.load_db(device_code='A')
+            self.assertIsNone(db_handler._interval_index_)
+            self.assertEqual(len(db_handler.interval_index), 2)
+        finally:
+            shutil.rmtree(directory)
+
     def test_update_hdf5_attributes(self):
         pd_result_0 = pandas.DataFrame([{'fullPath': 'TEST_0.hdf5', 'h5_attrs': {'previous_file_id': np.nan},
                                          'synced': True},  # take
@@ -159,6 +211,47 @@ class TestSyncDBHandler(TestCase):
         assert_equal(db_handler.dataframe.loc['TEST_2.hdf5', 'h5_attrs'], {})  # take 'file' value
         assert_equal(db_handler.dataframe.loc['TEST_5.hdf5', 'h5_attrs'], {'a': 2})  # take 'old' value
 
+    def test_update_hdf5_attributes_skip_unchanged(self):
+        pd_result = pandas.DataFrame([{'fullPath': f'TEST_SKIP_{i}.hdf5', 'synced': True} for i in range(3)])
+        SyncDBHandler._check_index_(pd_result)
+        for i in pd_result.index:
+            with h5py.File(i, 'w') as f:
+                f.attrs['a'] = 1
+
+        db_handler = SyncDBHandler(file_name=None, load_db=False)
+        db_handler.dataframe = pd_result
+        db_handler.update_hdf5_attributes(add_hdf5_attributes2dataframe=False, backend='thread')
+        self.assertTrue(db_handler.dataframe.h5_attrs_size.notnull().all())
+
+        # file 0 is unchanged and skipped, file 1 is modified and read again
+        db_handler.dataframe['h5_attrs'] = [{'a': 2}] * 3
+        with h5py.File('TEST_SKIP_1.hdf5', 'a') as f:
+            f.attrs['b'] = np.arange(100)
+        db_handler.update_hdf5_attributes(add_hdf5_attributes2dataframe=False, backend='thread',
+                                          update_existing=True, skip_unchanged=True)
+        self.assertEqual(db_handler.dataframe.loc['TEST_SKIP_0.hdf5', 'h5_attrs'], {'a': 2})
+        self.assertEqual(db_handler.dataframe.loc['TEST_SKIP_1.hdf5', 'h5_attrs'].keys(), {'a', 'b'})
+
+        for i in pd_result.index:
+            os.remove(i)
+
+    def test_update_file_version(self):
+        with h5py.File('TEST_VERSION_0.hdf5', 'w'):
+            pass  # empty file
+
+        pd_result = pandas.DataFrame({'fullPath': ['TEST_VERSION_0.hdf5', 'TEST_VERSION_1.txt'],
+                                      'dataProductCode': ['MSSCD', 'LF'],
+                                      'synced': [True, False]})
+        SyncDBHandler._check_index_(pd_result)
+
+        db_handler = SyncDBHandler(file_name=None, load_db=False)
+        db_handler.dataframe = pd_result
+        db_handler.update_file_version(backend='thread')
+        self.assertEqual(db_handler.dataframe.file_version.tolist(),
+                         [strawb.BaseFileHandler.error2codes['empty file'],
+                          strawb.BaseFileHandler.error2codes['FileHandler not implemented']])
+        os.remove('TEST_VERSION_0.hdf5')
+
     def test_load_db_from_onc(self):
         # ---- Version 1 ----
         db_handler = SyncDBHandler(file_name=None, load_db=False)
@@ -266,6 +359,23 @@ class TestSyncDBHandler(TestCase):
         self.assertEqual(pd_result_0.loc['TEST_3.hdf5', 'synced'], True)
         self.assertEqual(pd_result_0.loc['TEST_5.hdf5', 'col_2'], pd_result_1.loc['TEST_5.hdf5', 'col_2'])  # added row
 
+    def test_add_new_columns_category(self):
+        pd_result_0 = pandas.DataFrame({'fullPath': ['TEST_0.hdf5', 'TEST_1.hdf5'],
+                                        'deviceCode': pandas.Categorical(['A', None])})
+        pd_result_1 = pandas.DataFrame({'fullPath': ['TEST_1.hdf5', 'TEST_2.hdf5'],
+                                        'deviceCode': pandas.Categorical(['B', 'C']),
+                                        'synced': [True, False]})
+
+        db_handler = SyncDBHandler(file_name=None, load_db=False)
+        pd_result_0 = db_handler.add_new_columns(dataframe2add=pd_result_1, dataframe=pd_result_0)
+        self.assertIsInstance(pd_result_0.deviceCode.dtype, pandas.CategoricalDtype)
+        self.assertEqual(pd_result_0.deviceCode.tolist(), ['A', 'B', 'C'])
+
+        pd_result_2 = pandas.DataFrame({'fullPath': ['TEST_3.hdf5'], 'deviceCode': pandas.Categorical(['D'])})
+        pd_result_0 = db_handler.add_new_db(dataframe2add=pd_result_2, dataframe=pd_result_0)
+        self.assertIsInstance(pd_result_0.deviceCode.dtype, pandas.CategoricalDtype)
+        self.assertEqual(pd_result_0.deviceCode.tolist(), ['A', 'B', 'C', 'D'])
+
     def test_get_files_from_names(self):
         db_handler = SyncDBHandler()  # load db with default file
 
@@ -2,11 +2,15 @@ import os
 import random
 from unittest import TestCase
 
+import h5py
 import numpy as np
 
 from src.strawb.config_parser import Config
 from src.strawb.base_file_handler import BaseFileHandler
-from src.strawb.tools import unique_steps
+from src.strawb import tools as tools_module
+from src.strawb.tools import unique_steps, ShareJobThreads, BinnedStatistic, HDF5Appender, \
+    hdf5_getunsorted, asdatetime, AsDatetimeWrapper, clear_asdatetime_cache, \
+    masked_convolve2d, TimeIntervalIndex, pd_timestamp_mask_between, scandir_files
 
 
 class TestTools(TestCase):
@@ -48,3 +52,333 @@ class TestTools(TestCase):
 
         self.assertTrue(np.all(res_s.reshape((-1, 2)) == state_steps))
         self.assertTrue(np.all(res_t.reshape((-1, 2)) == t_steps))
+
+
+def share_job_test(i, fail_modulo=3):
+    if i % fail_modulo == 0:
+        raise ValueError(i)
+    return i * 2
+
+
+class TestShareJobThreads(TestCase):
+    def test_ordered(self):
+        sjt = ShareJobThreads(thread_n=4, ordered=True, progress_bar=False)
+        result = sjt.do(share_job_test, list(range(10)))
+
+        self.assertEqual([None if i % 3 == 0 else i * 2 for i in range(10)], result)
+        self.assertEqual([0, 3, 6, 9], sorted(sjt.errors))
+        self.assertIsInstance(sjt.errors[3], ValueError)
+
+    def test_dict(self):
+        sjt = ShareJobThreads(thread_n=2, buffer_type=dict, queue_size=1, progress_bar=False)
+        result = sjt.do(share_job_test, list(range(10)), fail_modulo=20)
+        self.assertEqual({i: i * 2 for i in range(1, 10)}, result)
+
+    def test_process(self):
+        sjt = ShareJobThreads(thread_n=2, backend='process', progress_bar=False)
+        result = sjt.do(share_job_test, list(range(10)))
+        self.assertEqual(sorted(i * 2 for i in range(10) if i % 3 != 0), sorted(result))
+
+
+class TestBinnedStatistic(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        self.x = rng.uniform(0, 10, 5000)
+        self.y = rng.normal(size=(2, 5000))
+        self.bins = np.linspace(1, 9, 17)
+
+    def test_scipy(self):
+        import scipy.stats
+
+        for x in [self.x, np.sort(self.x)]:  # unsorted -> np.digitize, sorted -> np.searchsorted
+            bs = BinnedStatistic(bins=self.bins).add(x, self.y)
+            for statistic in ['count', 'sum', 'mean', 'std', 'min', 'max']:
+                res = scipy.stats.binned_statistic(x, list(self.y), statistic=statistic, bins=self.bins)[0]
+                if statistic == 'count':
+                    res = res[0]
+                self.assertTrue(np.allclose(res, getattr(bs, statistic), equal_nan=True), statistic)
+
+    def test_streaming(self):
+        import scipy.stats
+
+        bs = BinnedStatistic(bins=self.bins)
+        for i in range(0, len(self.x), 333):
+            bs.add(self.x[i:i + 333], self.y[0, i:i + 333])
+
+        bs_merged = BinnedStatistic(bins=self.bins).add(self.x[:1000], self.y[0, :1000])
+        bs_merged.merge(BinnedStatistic(bins=self.bins).add(self.x[1000:], self.y[0, 1000:]))
+
+        for statistic in ['mean', 'std']:
+            res = scipy.stats.binned_statistic(self.x, self.y[0], statistic=statistic, bins=self.bins)[0]
+            self.assertTrue(np.allclose(res, getattr(bs, statistic)), statistic)
+            self.assertTrue(np.allclose(res, getattr(bs_merged, statistic)), statistic)
+
+    def test_last_edge(self):
+        bs = BinnedStatistic(bins=[0, 1, 2]).add([-1, 0, 1, 2, 2.5])
+        self.assertEqual([1, 2], list(bs.count))
+
+    def test_statistics(self):
+        x = np.sort(self.x)
+        bs = BinnedStatistic(bins=self.bins, statistics=['sum']).add(x, self.y)
+        bs_all = BinnedStatistic(bins=self.bins).add(x, self.y)
+        self.assertTrue(np.allclose(bs.sum, bs_all.sum))
+        self.assertTrue(np.array_equal(bs.count, bs_all.count))
+        for statistic in ['mean', 'var', 'std', 'min', 'max']:
+            self.assertIsNone(getattr(bs, statistic), statistic)
+        self.assertIsNone(bs._m2_)
+
+        self.assertRaises(ValueError, BinnedStatistic, statistics=['median'])
+        self.assertRaises(ValueError, BinnedStatistic(bins=self.bins).merge, bs)
+
+    def test_count_only(self):
+        import scipy.stats
+
+        # adds without values count the entries, but don't change the statistics of the values
+        bs = BinnedStatistic(bins=self.bins).add(self.x[:1000])
+        bs.add(self.x[1000:], self.y[0, 1000:])
+        bs_merged = BinnedStatistic(bins=self.bins).add(self.x[1000:], self.y[0, 1000:])
+        bs_merged.merge(BinnedStatistic(bins=self.bins).add(self.x[:1000]))
+
+        for statistic in ['mean', 'std']:
+            res = scipy.stats.binned_statistic(self.x[1000:], self.y[0, 1000:], statistic=statistic,
+                                               bins=self.bins)[0]
+            self.assertTrue(np.allclose(res, getattr(bs, statistic)), statistic)
+            self.assertTrue(np.allclose(res, getattr(bs_merged, statistic)), statistic)
+        self.assertTrue(np.array_equal(bs.count, np.histogram(self.x, bins=self.bins)[0]))
+        self.assertTrue(np.array_equal(bs_merged.count, bs.count))
+
+
+class TestHDF5Appender(TestCase):
+    def setUp(self):
+        self.file_name = os.path.abspath('test_hdf5_appender.hdf5')
+
+    def tearDown(self):
+        if os.path.exists(self.file_name):
+            os.remove(self.file_name)
+
+    def test_append(self):
+        with h5py.File(self.file_name, 'w') as f:
+            with HDF5Appender(f, buffer_size=100) as appender:
+                for i in range(50):
+                    appender.append('/group/rate', np.full((3, 7), i), axis=1)
+                    appender.append('/group/time', np.arange(7) + 7 * i)
+
+                # only entire chunks are written before the flush
+                self.assertEqual((100,), f['/group/time'].chunks)
+                self.assertEqual(0, f['/group/time'].shape[0] % 100)
+
+            self.assertEqual((3, 350), f['/group/rate'].shape)
+            self.assertTrue(np.all(f['/group/time'][:] == np.arange(350)))
+            self.assertTrue(np.all(f['/group/rate'][:, ::7] == np.arange(50)))
+
+        # append to an existing dataset
+        with h5py.File(self.file_name, 'a') as f, HDF5Appender(f) as appender:
+            appender.append('/group/time', np.arange(350, 400))
+        with h5py.File(self.file_name, 'r') as f:
+            self.assertTrue(np.all(f['/group/time'][:] == np.arange(400)))
+
+    def test_large_chunks(self):
+        # chunks larger than the buffer, the buffer is written once per chunk and not at every append
+        with h5py.File(self.file_name, 'w') as f, HDF5Appender(f, buffer_size=10) as appender:
+            f.create_dataset('time', shape=(0,), maxshape=(None,), chunks=(1000,), dtype=int)
+            writes = []
+            write = appender.__write__
+            appender.__write__ = lambda *args, **kwargs: writes.append(args) or write(*args, **kwargs)
+
+            for i in range(500):
+                appender.append('time', np.arange(5) + 5 * i)
+            self.assertLessEqual(len(writes), 4)
+            self.assertEqual((2000,), f['time'].shape)
+            appender.flush()
+            self.assertTrue(np.all(f['time'][:] == np.arange(2500)))
+
+
+class TestHDF5GetUnsorted(TestCase):
+    def setUp(self):
+        self.file_name = os.path.abspath('test_hdf5_getunsorted.hdf5')
+        self.data = np.arange(1000 * 4).reshape((1000, 4))
+        with h5py.File(self.file_name, 'w') as f:
+            f.create_dataset('chunked', data=self.data, chunks=(16, 4))
+            f.create_dataset('contiguous', data=self.data)
+
+    def tearDown(self):
+        if os.path.exists(self.file_name):
+            os.remove(self.file_name)
+
+    def test_getunsorted(self):
+        index = np.random.default_rng(1).integers(-1000, 1000, 300)
+        with h5py.File(self.file_name, 'r') as f:
+            for dataset_name in ['chunked', 'contiguous']:
+                self.assertTrue(np.array_equal(self.data[index], hdf5_getunsorted(f[dataset_name], index)))
+
+            self.assertTrue(np.array_equal(self.data[[5, 2, 5]], hdf5_getunsorted(f['chunked'], [5, 2, 5])))
+
+            out = np.zeros((3, 4), dtype=self.data.dtype)
+            self.assertIs(out, hdf5_getunsorted(f['chunked'], [999, 0, 1], out=out))
+            self.assertTrue(np.array_equal(self.data[[999, 0, 1]], out))
+
+            with self.assertRaises(IndexError):
+                hdf5_getunsorted(f['chunked'], [1000])
+
+            self.assertEqual((0, 4), hdf5_getunsorted(f['chunked'], []).shape)
+
+
+class TestAsDatetime(TestCase):
+    def setUp(self):
+        self.file_name = os.path.abspath('test_asdatetime.hdf5')
+        with h5py.File(self.file_name, 'w') as f:
+            f.create_dataset('time', data=np.arange(1624751981., 1624751991., .25))
+
+    def tearDown(self):
+        clear_asdatetime_cache()
+        if os.path.exists(self.file_name):
+            os.remove(self.file_name)
+
+    def test_precision(self):
+        # float64 has ~240ns resolution at this timestamp, the value is 1624751981.485763549804...
+        time = asdatetime(np.array([1624751981.4857635]))
+        self.assertEqual(np.datetime64('2021-06-26T23:59:41.485763549', 'ns'), time[0])
+        self.assertEqual(np.datetime64('2021-06-26T23:59:41.485763', 'us'), asdatetime([1624751981.4857635], 'us')[0])
+        self.assertTrue(np.isnat(asdatetime([np.nan])[0]))
+        self.assertEqual(np.timedelta64(5400, 's'), asdatetime(1.5, 's', date_type='timedelta', scale2seconds=3600.))
+
+    def test_in_place(self):
+        array = np.array([1., 2.5])
+        out = asdatetime(array, out=array.view(np.int64))
+        self.assertTrue(np.shares_memory(array, out))
+        self.assertEqual(np.datetime64('1970-01-01T00:00:02.5', 'ns'), out[1])
+
+    def test_dataset(self):
+        with h5py.File(self.file_name, 'r') as f:
+            wrapper = AsDatetimeWrapper(f['time'])
+            time = wrapper[:]
+            self.assertEqual(np.dtype('datetime64[ns]'), time.dtype)
+            self.assertTrue(np.array_equal(asdatetime(f['time'][:]), time))
+            self.assertTrue(np.array_equal(time[3:7], wrapper[3:7]))
+
+            # fancy indexes
+            self.assertTrue(np.array_equal(time[[1, 2]], wrapper[np.array([1, 2])]))
+            self.assertTrue(np.array_equal(time[time > time[30]], wrapper[np.arange(40) > 30]))
+
+            # the entire dataset is cached, a hit returns a writable copy
+            self.assertEqual(1, len(tools_module._asdatetime_cache_))
+            time_cached = AsDatetimeWrapper(f['time'])[:]
+            self.assertTrue(np.array_equal(time, time_cached))
+            self.assertTrue(time_cached.flags.writeable)
+            time_cached[0] = time_cached[1]
+            self.assertTrue(np.array_equal(time, AsDatetimeWrapper(f['time'])[:]))
+
+        # a rewritten file isn't served from the cache
+        with h5py.File(self.file_name, 'w') as f:
+            f.create_dataset('time', data=np.arange(1624751991., 1624752001., .25))
+        os.utime(self.file_name, ns=(0, 0))
+        with h5py.File(self.file_name, 'r') as f:
+            self.assertTrue(np.array_equal(asdatetime(f['time'][:]), AsDatetimeWrapper(f['time'])[:]))
+
+    def test_cache_bytes(self):
+        with h5py.File(self.file_name, 'r') as f:
+            asdatetime_cache_bytes = tools_module.asdatetime_cache_bytes
+            try:
+                tools_module.asdatetime_cache_bytes = 8
+                AsDatetimeWrapper(f['time'])[:]
+                self.assertEqual(0, len(tools_module._asdatetime_cache_))
+            finally:
+                tools_module.asdatetime_cache_bytes = asdatetime_cache_bytes
+
+
+class TestMaskedConvolve2d(TestCase):
+    def test_fft(self):
+        rng = np.random.default_rng(0)
+        in1 = np.ma.array(rng.normal(size=(60, 80)), mask=rng.random((60, 80)) < .2)
+        in1[10:20, 20:40] = np.ma.masked
+        in2 = np.ones((9, 9))
+
+        for mode in ['full', 'same', 'valid']:
+            con_direct = masked_convolve2d(in1, in2, True, True, 1. / 3, mode, method='direct')
+            con_fft = masked_convolve2d(in1, in2, True, True, 1. / 3, mode, method='fft')
+            self.assertEqual(con_direct.shape, con_fft.shape)
+            self.assertTrue(np.array_equal(con_direct.mask, con_fft.mask), mode)
+            self.assertTrue(np.allclose(con_direct, con_fft, atol=1e-5), mode)
+
+    def test_example(self):
+        in1 = np.ma.array([[1., 1., 0., 0.]], mask=[[0, 0, 1, 1]])
+        for method in ['direct', 'fft']:
+            con = masked_convolve2d(in1, np.array([[1., 1.]]), valid_ratio=.5, method=method)
+            self.assertTrue(np.array_equal([False, False, False, True, False], con.mask[0]))
+            self.assertTrue(np.allclose([.5, 1., 1.], con[0, :3], atol=1e-6))
+
+
+class TestTimeIntervalIndex(TestCase):
+    def setUp(self):
+        import pandas
+
+        rng = np.random.default_rng(0)
+        n = 2000
+        date_from = pandas.Timestamp('2021-09-01', tz='UTC') + pandas.to_timedelta(
+            np.sort(rng.integers(0, 30 * 24 * 3600, n)), 's')
+        self.df = pandas.DataFrame({'dateFrom': date_from,
+                                    'dateTo': date_from + pandas.to_timedelta(rng.integers(0, 7200, n), 's'),
+                                    'deviceCode': rng.choice(['A', 'B'], n),
+                                    'dataProductCode': rng.choice(['X', 'Y'], n)})
+        self.df.loc[5:10, 'dateTo'] = pandas.NaT
+        self.df.loc[20:30, 'dateTo'] = self.df.loc[20:30, 'dateFrom'] - pandas.Timedelta('1h')  # stop < start
+
+        self.groups = self.df.groupby(['deviceCode', 'dataProductCode']).indices
+        self.index = TimeIntervalIndex(self.df.dateFrom, self.df.dateTo, groups=self.groups)
+
+        # time ranges, also with the edges of the entries
+        self.time_ranges = [(self.df.dateFrom.iloc[i], self.df.dateFrom.iloc[i] + np.timedelta64(j, 'h'))
+                            for i, j in zip(rng.integers(0, n, 30), rng.integers(0, 12, 30))]
+        self.time_ranges += [('2021-09-01', '2021-09-02'), (self.df.dateFrom.iloc[15], self.df.dateTo.iloc[40])]
+
+    def test_positions_between(self):
+        for time_from, time_to in self.time_ranges:
+            for include_time_to in [False, True]:
+                mask = pd_timestamp_mask_between(self.df.dateFrom, self.df.dateTo, time_from, time_to,
+                                                 include_time_to=include_time_to).to_numpy(copy=True)
+                positions = self.index.positions_between(time_from, time_to, include_time_to=include_time_to)
+                self.assertTrue(np.array_equal(np.flatnonzero(mask), positions))
+
+                mask &= (self.df.deviceCode == 'A').values & (self.df.dataProductCode == 'Y').values
+                positions = self.index.positions_between(time_from, time_to, key=('A', 'Y'),
+                                                         include_time_to=include_time_to)
+                self.assertTrue(np.array_equal(np.flatnonzero(mask), positions))
+
+    def test_save_load(self):
+        file_name = os.path.abspath('test_interval_index.npz')
+        try:
+            self.index.save(file_name)
+            index = TimeIntervalIndex.load(file_name, fingerprint=self.index.fingerprint)
+            time_from, time_to = self.time_ranges[0]
+            self.assertTrue(np.array_equal(self.index.positions_between(time_from, time_to, key=('B', 'X')),
+                                           index.positions_between(time_from, time_to, key=('B', 'X'))))
+            self.assertIsNone(TimeIntervalIndex.load(file_name, fingerprint='no match'))
+        finally:
+            if os.path.exists(file_name):
+                os.remove(file_name)
+
+
+class TestScandirFiles(TestCase):
+    def setUp(self):
+        self.directory = os.path.abspath('test_scandir_files')
+        self.file_list = [os.path.join(self.directory, i) for i in ['a.txt', 'sub_1/b.txt', 'sub_1/sub_2/c.txt']]
+        for i in self.file_list:
+            os.makedirs(os.path.dirname(i), exist_ok=True)
+            with open(i, 'w') as f:
+                f.write('1234')
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.directory)
+
+    def test_scandir_files(self):
+        files = scandir_files(self.directory)
+        self.assertEqual(sorted(self.file_list), sorted(files.index))
+        self.assertTrue((files.size_on_disk == 4).all())
+        self.assertTrue(np.allclose(files.mtime, [os.path.getmtime(i) for i in files.index]))
+
+        files = scandir_files(self.directory, recursive=False, stat=False)
+        self.assertEqual(self.file_list[:1], files.index.tolist())
+        self.assertEqual(0, files.shape[1])
+
+        self.assertEqual(0, len(scandir_files(os.path.join(self.directory, 'not_existing'))))